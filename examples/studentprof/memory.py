@@ -0,0 +1,80 @@
+'''
+Memory benchmark of the Ground Bayesian Network
+
+Unrolls the GBN of the query below for every studentprof dataset in './data/sqlite' and
+reports the number of bytes per vertex and per edge (see analytics.memory). The event
+contains the funding of every professor, whose fame is a parent, and the success of every
+student, which is connected to a professor through the uncertain advisor relationship. The
+number of edges therefore grows with the number of professors of the dataset. Run this script
+in the 'examples/studentprof' folder.
+'''
+import sys
+import os
+import glob
+import logging
+
+# if the the current folder is a sub folder or the root Probrem foler, otherwise supply the full path to the 'Probrem/src' folder
+sys.path.append("./../../src")
+
+
+import probrem
+
+from ui import config
+from analytics import memory
+from network.vertices import registry
+from data.datainterface import datasetinterfaceFactory
+
+
+''' PRM '''
+prmSpec = "./model/studentprofPRM.xml"
+config.loadPRM(prmSpec)
+
+
+''' DATA INTERFACE '''
+diSpec = "./model/studentprofDI.xml"
+config.loadDI(diSpec)
+
+
+from inference.query import *
+
+event = [createQvar(attrName='Student.success', objsConstraint='excl', objsPkValues=[]),
+         createQvar(attrName='Professor.funding', objsConstraint='excl', objsPkValues=[]),
+         ]
+evidence = [createQvar(attrName='Professor.fame', objsConstraint='excl', objsPkValues=[]),
+            ]
+
+query = Query(event,evidence)
+
+
+''' INFERENCE ENGINE '''
+# the references of the reference vertices (i.e. the edges through the uncertain relationship) are
+# only added when the markov chain is initialized
+config.loadInferenceAlgorithm('MH')
+mcmcInference = probrem.engine.inferenceAlgo
+
+
+# the empty files are skipped
+datasets = sorted([path for path in glob.glob('./data/sqlite/studentprof*.sqlite') if os.path.getsize(path) > 0])
+
+for path in datasets:
+
+    # the data interface uses one dataset at a time
+    probrem.DI.DSI = [datasetinterfaceFactory(path,'SQLite')]
+    probrem.DI.computeTrainingSets()
+    probrem.DI.configure(probrem.PRM)
+
+    logging.info('====================================================================================')
+    logging.info('Dataset: %s'%path)
+
+    # the registry is global, only the IDs interned for this dataset are reported
+    firstID = len(registry) + 1
+
+    probrem.engine.query = query
+    probrem.engine.reset()
+    probrem.engine.unrollGBN()
+    if mcmcInference.COMPILED:
+        probrem.engine.compileGBN()
+    mcmcInference.initializeVertices()
+
+    logging.info(probrem.engine.GBN)
+    memory.displayMemoryAnalysis(probrem.engine.GBN,firstID)
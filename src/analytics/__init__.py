@@ -2,11 +2,15 @@
 The analytics package :mod:`!analytics` implements methods that can be used to analyse/configure/debug the code and the model.
 
 * Measure the running time of any method, e.g. how much time is spent executing individual methods
+* Estimate the memory used by the Ground Bayesian Network, e.g. the number of bytes per vertex and per edge
 * Display graphs, e.g. the Ground Bayesian Network, using either `GraphViz <http://www.graphviz.org/>`_ or `NetworkX <http://networkx.lanl.gov/>`_ - both of which have to be installed seperately.
 
 .. automodule:: analytics.performance
    :members:
 
+.. automodule:: analytics.memory
+   :members:
+
 .. automodule:: analytics.visualization
   :members:
 
@@ -0,0 +1,130 @@
+"""
+Memory Module :mod:`analytics.memory`
+------------------------------------------------
+
+Estimates the memory used by a Ground Bayesian Network, e.g. to compare the number of bytes per vertex and per edge of different datasets. The sizes are computed with `sys.getsizeof()`, i.e. they include the Python object overhead but not the memory shared by many vertices (e.g. the :class:`.Attribute` instances or the primary key tuples, which are kept by the :attr:`network.vertices.registry`).
+
+* The vertex size is the size of the :class:`.GBNvertex` instance (and of its `__dict__` if it has one) and of its parent assignment lists. For a :class:`.ReferenceVertex` it includes the dictionaries of references and exist parents, which grow with the number of objects of the `k`-side entity. The reference vertices are reported separately, they would dominate the number of bytes per vertex of small GBNs.
+* The edge size is the size of the `parents` and `children` dictionaries of all vertices divided by the number of edges. Note that every edge is stored in both directions.
+* The graph size is the size of the :class:`.GBNGraph` dictionary and of its helper dictionaries and lists.
+* The registry is global and never shrinks (see :class:`.IDRegistry`), the IDs interned since a given ID are reported, e.g. the growth of the registry for one query.
+"""
+
+import logging
+import sys
+
+from network.vertices import NOEDGES,ReferenceVertex,registry
+
+
+def dictSize(d):
+    '''
+    Returns the size of a dictionary of dictionaries, e.g. the `parents` of a vertex. The shared :attr:`.NOEDGES` dictionary has size `0`.
+
+    :arg d: Dictionary whose values are dictionaries
+    :returns: Number of bytes
+    '''
+    if d is NOEDGES:
+        return 0
+    return sys.getsizeof(d) + sum([sys.getsizeof(v) for v in d.itervalues()])
+
+def vertexSize(gbnV):
+    '''
+    Returns the size of a vertex, without the edges (see :meth:`.edgeSize`)
+
+    :arg gbnV: :class:`.GBNvertex` instance
+    :returns: Number of bytes
+    '''
+    size = sys.getsizeof(gbnV) + sys.getsizeof(gbnV.parentAss)
+    if hasattr(gbnV,'__dict__'):
+        size += sys.getsizeof(gbnV.__dict__)
+    if gbnV.aggState is not None:
+        size += sys.getsizeof(gbnV.aggState) + sum([sys.getsizeof(state) for state in gbnV.aggState if state is not None])
+    if isinstance(gbnV,ReferenceVertex):
+        size += sys.getsizeof(gbnV.references)
+        size += sys.getsizeof(gbnV.existParents) + sum([dictSize(existParents) for existParents in gbnV.existParents.itervalues()])
+    return size
+
+def edgeSize(gbnV):
+    '''
+    Returns the size of the `parents` and `children` dictionaries of a vertex
+
+    :arg gbnV: :class:`.GBNvertex` instance
+    :returns: Number of bytes
+    '''
+    return dictSize(gbnV.parents) + dictSize(gbnV.children)
+
+def graphSize(GBN):
+    '''
+    Returns the size of the dictionaries and lists of a :class:`.GBNGraph`, without the vertices
+
+    :arg GBN: :class:`.GBNGraph` instance
+    :returns: Number of bytes
+    '''
+    size = sys.getsizeof(GBN) + sys.getsizeof(GBN.samplingVertices) + sys.getsizeof(GBN.eventVertices)
+    for byAttribute in [GBN.allByAttribute,GBN.samplingVerticesByAttribute]:
+        size += sys.getsizeof(byAttribute) + sum([sys.getsizeof(gbnVs) for gbnVs in byAttribute.itervalues()])
+    return size
+
+def registrySize(firstID=1):
+    '''
+    Returns the size of the keys of the :attr:`network.vertices.registry` that have been interned since `firstID`. The dictionary and the list of the registry are only included for `firstID=1`.
+
+    :arg firstID: Optional, the first ID that is included (default `1`, i.e. the whole registry)
+    :returns: Number of bytes
+    '''
+    size = 0
+    if firstID <= 1:
+        size += sys.getsizeof(registry.ids) + sys.getsizeof(registry.keys)
+    for key in registry.keys[max(firstID,1):]:
+        size += sys.getsizeof(key) + sys.getsizeof(key[1])
+    return size
+
+def gbnMemory(GBN):
+    '''
+    Estimates the memory used by a Ground Bayesian Network
+
+    :arg GBN: :class:`.GBNGraph` instance
+    :returns: Dictionary with the number of `vertices`, :class:`.ReferenceVertex` instances (`referenceVertices`) and `edges`, the number of bytes used by the vertices (`vertexBytes`), the reference vertices (`referenceBytes`), the edges (`edgeBytes`) and the graph (`graphBytes`), and the number of bytes `perVertex`, `perReferenceVertex` and `perEdge`. The reference vertices are not included in `vertices`, `vertexBytes` and `perVertex`.
+    '''
+    nVertices = 0
+    nReferenceVertices = 0
+    nEdges = 0
+    vertexBytes = 0
+    referenceBytes = 0
+    edgeBytes = 0
+    for gbnV in GBN.itervalues():
+        nEdges += sum([len(parentVs) for parentVs in gbnV.parents.itervalues()])
+        if isinstance(gbnV,ReferenceVertex):
+            nReferenceVertices += 1
+            referenceBytes += vertexSize(gbnV)
+        else:
+            nVertices += 1
+            vertexBytes += vertexSize(gbnV)
+        edgeBytes += edgeSize(gbnV)
+
+    return {'vertices':nVertices,
+            'referenceVertices':nReferenceVertices,
+            'edges':nEdges,
+            'vertexBytes':vertexBytes,
+            'referenceBytes':referenceBytes,
+            'edgeBytes':edgeBytes,
+            'graphBytes':graphSize(GBN),
+            'perVertex':float(vertexBytes)/max(nVertices,1),
+            'perReferenceVertex':float(referenceBytes)/max(nReferenceVertices,1),
+            'perEdge':float(edgeBytes)/max(nEdges,1)}
+
+def displayMemoryAnalysis(GBN, firstID=1):
+    '''
+    Displays the memory statistics of a Ground Bayesian Network, see :meth:`.gbnMemory`
+
+    :arg GBN: :class:`.GBNGraph` instance
+    :arg firstID: Optional, the IDs of the registry interned since `firstID` are reported, e.g. `len(registry)+1` before the GBN was unrolled (default `1`, i.e. the whole registry)
+    '''
+    m = gbnMemory(GBN)
+    logging.info('GBN memory usage:')
+    logging.info('\tVertices = %s \n\tReference vertices = %s \n\tEdges = %s'%(m['vertices'],m['referenceVertices'],m['edges']))
+    logging.info('\tVertices = %.2f MB (%.0f bytes per vertex)'%(m['vertexBytes']/2.**20,m['perVertex']))
+    logging.info('\tReference vertices = %.2f MB (%.0f bytes per reference vertex)'%(m['referenceBytes']/2.**20,m['perReferenceVertex']))
+    logging.info('\tEdges = %.2f MB (%.0f bytes per edge)'%(m['edgeBytes']/2.**20,m['perEdge']))
+    logging.info('\tGraph = %.2f MB'%(m['graphBytes']/2.**20))
+    logging.info('\tID registry = %.2f MB (%s new IDs, %s IDs in total)'%(registrySize(firstID)/2.**20,len(registry) - max(firstID,1) + 1,len(registry)))
@@ -11,6 +11,7 @@ The :mod:`!analytics.visualization` module can be used to create desciption file
 
 import numpy as N
 from analytics.gvgen import GvGen
+from network.vertices import registry
 
 def createGraphvizFile(GBNgraph):
     """Generates a description file `reports/gbn.dot` for the `GraphViz <http://www.graphviz.org/>`_ software. It makes use of `GvGen` written by Sebastien Tricaud.
@@ -38,7 +39,7 @@ def createGraphvizFile(GBNgraph):
     for (attr,gbnVs) in GBNgraph.allByAttribute.items():
         attNodes[attr] = graph.newItem(attr.name)
         for gbnV in gbnVs:
-            nodes[gbnV] = graph.newItem(gbnV.ID,attNodes[attr])
+            nodes[gbnV] = graph.newItem(registry.name(gbnV.ID),attNodes[attr])
             
             if gbnV.ID in GBNgraph.eventVertices: 
                 graph.styleApply("event", nodes[gbnV])
@@ -122,7 +123,7 @@ def displayGraph(graph):
     for v in graph.values():
         for ps in v.parents.values():
             for p in ps.keys():
-                G.add_edge(p, v.ID)
+                G.add_edge(registry.name(p), registry.name(v.ID))
                 
     # for v in graph.values():
     #     for p in v.parents:
@@ -2,6 +2,10 @@
 The package :mod:`!data` handles the interaction between the ProbReM instance and the relational database. 
 
 * The package :mod:`data.datainterface` contains the methods that construct the queries that are used to retrieve data
+* :mod:`data.memoryinterface` keeps the tables of a SQLite database in memory to unroll Ground Bayesian Networks without SQL queries
+* :mod:`data.npyinterface` reads datasets stored as memory mapped `NumPy` column files, exported from SQLite
+* :mod:`data.prefetch` executes queries on a background thread while the Ground Bayesian Network is unrolled
+* :mod:`data.cache` caches the neighbourhoods of attribute objects across queries
 * :mod:`data.aggregation` implements the methods that aggregate multiple attribute object values, if necessary.
 * :mod:`data.utils` is for useful tools, e.g. :class:`data.utils.Discretizer`
 
@@ -19,6 +23,34 @@ The package :mod:`!data` handles the interaction between the ProbReM instance an
     :members:
     
 
+:mod:`~!data.memoryinterface` module
+---------------------------------------------
+
+.. automodule:: data.memoryinterface
+    :members:
+
+
+:mod:`~!data.npyinterface` module
+---------------------------------------------
+
+.. automodule:: data.npyinterface
+    :members:
+
+
+:mod:`~!data.prefetch` module
+---------------------------------------------
+
+.. automodule:: data.prefetch
+    :members:
+
+
+:mod:`~!data.cache` module
+---------------------------------------------
+
+.. automodule:: data.cache
+    :members:
+
+
 :mod:`~!data.aggregation` module
 ---------------------------------------------
 
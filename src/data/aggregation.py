@@ -11,10 +11,12 @@ returns the method :meth:`data.aggregation.runtime_avg`. Or ::
     
     aggr = data.aggregation.aggregators['MAX']['SQLite']   
     
-simply returns the SQL keyword `AVG`. 
+simply returns the SQL keyword `AVG`. The `Numpy` aggregators (e.g. :meth:`data.aggregation.numpy_avg`) aggregate the parent values of many attribute objects at once, they are used by :class:`data.npyinterface.NumpyDI`.
     
 '''
 
+import numpy as N
+
 '''
 ########################################################################################################################
 WEIGHTED EXPECTATION AGGREGATOR
@@ -41,8 +43,20 @@ def runtime_avg(values):
 SQLite_keyword = 'AVG'
 """ SQLite keyword for average, `AVG` """
 
+def numpy_avg(values, starts):
+    '''
+    Computes the average of every group of values, rounded to the nearest integer as SQL `ROUND()` (halves are rounded away from zero).
+
+    :arg values: :class:`numpy.array` of attribute object values, the values of a group are consecutive
+    :arg starts: :class:`numpy.array` with the index of the first value of every group
+    :returns: :class:`numpy.array` with the average of every group
+    '''
+    sizes = N.diff(N.append(starts,len(values)))
+    means = N.add.reduceat(values.astype(float),starts) / sizes
+    return N.sign(means) * N.floor(N.abs(means) + 0.5)
+
 # The average dictionary maps the different ways to do aggregation to keywords/methods 
-avg_dict = {'SQLite':SQLite_keyword,'runtime':runtime_avg}
+avg_dict = {'SQLite':SQLite_keyword,'runtime':runtime_avg,'Numpy':numpy_avg}
 
 def agg_avg(aggOrigin):
     return avg_dict[aggOrigin]
@@ -65,7 +79,13 @@ SQLite_keyword = "MAX"
 """ SQLite keyword for maximum, `MAX` """
 
     
-max_dict = {'SQLite':SQLite_keyword,'runtime':runtime_max}
+def numpy_max(values, starts):
+    '''
+    Computes the maximum of every group of values, see :meth:`.numpy_avg`
+    '''
+    return N.maximum.reduceat(values,starts)
+
+max_dict = {'SQLite':SQLite_keyword,'runtime':runtime_max,'Numpy':numpy_max}
 
 def agg_max(aggOrigin):
     return max_dict[aggOrigin]
@@ -87,7 +107,13 @@ SQLite_keyword = "MIN"
 """ SQLite keyword for maximum, `MIN` """    
     
     
-min_dict = {'SQLite':SQLite_keyword,'runtime':runtime_min}
+def numpy_min(values, starts):
+    '''
+    Computes the minimum of every group of values, see :meth:`.numpy_avg`
+    '''
+    return N.minimum.reduceat(values,starts)
+
+min_dict = {'SQLite':SQLite_keyword,'runtime':runtime_min,'Numpy':numpy_min}
 
 def agg_min(aggOrigin):
     return min_dict[aggOrigin]
@@ -99,13 +125,31 @@ MODE AGGREGATOR
 def runtime_mode(values):
     '''
     Compute mode of all values
+    
+    :arg values: List of attribute object values
+    :returns: Most frequent value (the smallest one in case of a tie)
     '''
-    raise Exception("Implement It!")
-    return None
+    counts = {}
+    for v in values:
+        counts[v] = counts.get(v,0) + 1
+    return running_mode(counts)
     
 SQLite_keyword = "N/A"
 
-mode_dict = {'SQLite':SQLite_keyword,'runtime':runtime_mode}
+def numpy_mode(values, starts):
+    '''
+    Computes the mode of every group of values (the smallest one in case of a tie), see :meth:`.numpy_avg`
+    '''
+    groups = N.repeat(N.arange(len(starts)),N.diff(N.append(starts,len(values))))
+    # the distinct values of every group and their counts
+    (pairs,counts) = N.unique(N.rec.fromarrays([groups,values]),return_counts=True)
+    # per group, the most frequent value comes first
+    order = N.lexsort((pairs.f1,-counts,pairs.f0))
+    first = N.ones(len(order),dtype=bool)
+    first[1:] = pairs.f0[order][1:] != pairs.f0[order][:-1]
+    return pairs.f1[order][first]
+
+mode_dict = {'SQLite':SQLite_keyword,'runtime':runtime_mode,'Numpy':numpy_mode}
 
 def agg_mode(aggOrigin):
     return mode_dict[aggOrigin]
@@ -113,6 +157,47 @@ def agg_mode(aggOrigin):
 
 
 
+'''
+########################################################################################################################
+RUNNING AGGREGATES 
+
+The aggregates of a running state that is updated incrementally when one parent value changes (see :meth:`.GBNvertex.parentChanged`). The state is `[sum,count]` for `AVG` and a counted multiset `{key = value : value = count}` otherwise.
+'''
+def running_avg(state):
+    '''
+    :arg state: List `[sum,count]` 
+    :returns: Average, rounded as in :meth:`.runtime_avg`
+    '''
+    return round(state[0]*1./state[1])
+
+def running_max(counts):
+    '''
+    :arg counts: Counted multiset of values
+    :returns: Maximum of values
+    '''
+    return max(counts)
+
+def running_min(counts):
+    '''
+    :arg counts: Counted multiset of values
+    :returns: Minimum of values
+    '''
+    return min(counts)
+
+def running_mode(counts):
+    '''
+    :arg counts: Counted multiset of values
+    :returns: Most frequent value (the smallest one in case of a tie)
+    '''
+    return min(counts, key=lambda v: (-counts[v],v))
+
+runtime_kinds = {runtime_avg:'AVG',runtime_max:'MAX',runtime_min:'MIN',runtime_mode:'MODE'}
+''' Maps the runtime aggregation methods to the aggregator keywords '''
+
+running_aggregators = {'AVG':running_avg,'MAX':running_max,'MIN':running_min,'MODE':running_mode}
+''' Maps the aggregator keywords to the running aggregates '''
+
+
 '''
 ########################################################################################################################
 The dictionary used by the parser to asign a aggregator method to a dependency
@@ -121,10 +206,10 @@ aggregators = {'AVG':agg_avg,'MAX':agg_max,'MIN':agg_min,'MODE':agg_mode}
 """
 Dictionary of supported aggregation types.
 
-    * AVG : 'SQLite','runtime' supported
-    * MAX : 'SQLite','runtime' supported
-    * MIN : 'SQLite','runtime' supported
-    * MODE : only 'runtime' supported
+    * AVG : 'SQLite','runtime','Numpy' supported
+    * MAX : 'SQLite','runtime','Numpy' supported
+    * MIN : 'SQLite','runtime','Numpy' supported
+    * MODE : 'runtime','Numpy' supported
         
 """
 
@@ -0,0 +1,144 @@
+'''
+The :class:`.NeighbourhoodCache` keeps the parent and children objects of the attribute objects that have been loaded by the inference :mod:`engine`. Every query resets the Ground Bayesian Network and unrolls it again (see :meth:`inference.engine.infer`), consecutive queries often touch the same objects (e.g. a professor with many students). The neighbourhood of an object is cached per dependency, only the objects that are not cached are queried (see :meth:`inference.engine.loadRows`).
+
+The cache is a least recently used (LRU) cache with a memory budget of :attr:`BUDGET` bytes. It is cleared automatically when the data changes, i.e. when the data version of the dataset changes (see :meth:`.DataSetInterface.dataVersion`, `PRAGMA data_version` in SQLite).
+'''
+
+import logging
+import sys
+
+from collections import OrderedDict
+
+
+BUDGET = 64*2**20
+'''
+Memory budget of a :class:`.NeighbourhoodCache` in bytes, the least recently used entries are evicted once it is exceeded
+'''
+
+
+def rowsSize(rows):
+    '''
+    Estimates the memory used by a list of result rows
+
+    :arg rows: List of tuples
+    :returns: Number of bytes
+    '''
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum([sys.getsizeof(value) for value in row])
+    return size
+
+
+class NeighbourhoodCache():
+    '''
+    LRU cache of the result rows of the `loadXXX()` methods of a :class:`.DataSetInterface` that bind attribute objects, e.g. :meth:`.SQLiteDI.loadDependencyParentObjects` and :meth:`.SQLiteDI.loadDependencyChildrenObjects`. An entry is keyed by `(method name, dependency, object key)`, it contains the result rows of that object. The first columns of a result row are the key of the bound object.
+    '''
+
+    def __init__(self, dsi, budget=None):
+        '''
+        :arg dsi: :class:`.DataSetInterface` instance
+        :arg budget: Optional memory budget in bytes (default :attr:`BUDGET`)
+        '''
+        self.dsi = dsi
+        '''The :class:`.DataSetInterface` instance
+        '''
+        self.budget = budget
+        '''Memory budget in bytes
+        '''
+        if budget is None:
+            self.budget = BUDGET
+        self.entries = OrderedDict()
+        '''Ordered dictionary `{ (method,dep,obj) : (rows,size) }`, the least recently used entry comes first
+        '''
+        self.size = 0
+        '''Estimated number of bytes of all entries
+        '''
+        self.version = dsi.dataVersion()
+        '''Data version of the dataset when the entries were loaded, see :meth:`.validate`
+        '''
+        self.hits = 0
+        '''Number of objects found in the cache
+        '''
+        self.misses = 0
+        '''Number of objects not found in the cache
+        '''
+
+    def validate(self):
+        '''
+        Clears the cache if the data version of the dataset has changed since the entries were loaded
+        '''
+        version = self.dsi.dataVersion()
+        if version != self.version:
+            logging.info('The data of %s has changed, clearing the neighbourhood cache'%self.dsi)
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        '''
+        Removes all entries
+        '''
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def missing(self, method, dep, gbnVertices):
+        '''
+        :arg method: Name of the `loadXXX()` method
+        :arg dep: :class:`.Dependency`
+        :arg gbnVertices: List of :class:`.GBNvertex` instances
+        :returns: List of the vertices whose objects are not cached
+        '''
+        return [gbnV for gbnV in gbnVertices if (method,dep,tuple(gbnV.obj)) not in self.entries]
+
+    def lookup(self, method, dep, gbnVertices):
+        '''
+        Returns the cached rows of the objects of `gbnVertices`, the entries are marked as recently used
+
+        :arg method: Name of the `loadXXX()` method
+        :arg dep: :class:`.Dependency`
+        :arg gbnVertices: List of :class:`.GBNvertex` instances
+        :returns: Tuple `(rows,missing)` with the rows of the cached objects and the list of vertices whose objects are not cached
+        '''
+        rows = []
+        missing = []
+        for gbnV in gbnVertices:
+            key = (method,dep,tuple(gbnV.obj))
+            entry = self.entries.pop(key,None)
+            if entry is None:
+                missing.append(gbnV)
+            else:
+                self.entries[key] = entry
+                rows.extend(entry[0])
+        self.hits += len(gbnVertices) - len(missing)
+        self.misses += len(missing)
+        return (rows,missing)
+
+    def store(self, method, dep, gbnVertices, rows, nKeys):
+        '''
+        Stores the rows of a query for the objects of `gbnVertices`, the rows are grouped by the object key in their first `nKeys` columns. Objects without rows are cached as well. The least recently used entries are evicted if the budget is exceeded.
+
+        :arg method: Name of the `loadXXX()` method
+        :arg dep: :class:`.Dependency`
+        :arg gbnVertices: List of :class:`.GBNvertex` instances that were bound in the query
+        :arg rows: List of result rows
+        :arg nKeys: Number of key columns of the bound object
+        '''
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row[:nKeys]),[]).append(row)
+
+        for gbnV in gbnVertices:
+            obj = tuple(gbnV.obj)
+            key = (method,dep,obj)
+            objRows = groups.get(obj,[])
+            size = rowsSize(objRows)
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (objRows,size)
+            self.size += size
+
+        while self.size > self.budget and self.entries:
+            (key,(objRows,size)) = self.entries.popitem(last=False)
+            self.size -= size
+
+    def __repr__(self):
+        return 'NeighbourhoodCache of %s (%s objects, %.1f MB, %s hits, %s misses)'%(self.dsi,len(self.entries),self.size/2.**20,self.hits,self.misses)
@@ -51,11 +51,30 @@ diType = 'UnSpecified'
 trainingSets = {}
 """Dictionary that maps a crossvalidation test set (one `DataSetInterface` in `datainterface.DSI`) with the corresponding training set (all other `DataSetInterfaces` in `datainterface.DSI`)"""
 
+CREATEINDEXES = False
+"""If `True`, :meth:`.configure` creates the indexes that the queries of the PRM need in all datasets (see :meth:`.SQLiteDI.createIndexes`) and updates the statistics of the query planner. As this modifies the database files it is not done by default.
+"""
+
+EXPLAINQUERIES = False
+"""If `True`, :meth:`.configure` logs the query plans of the load queries of the PRM (see :meth:`.SQLiteDI.explainQueries`)
+"""
+
 
 def configure(prm):
     '''
     A method that allows us to configure a dataset interface based on information from the instantiated PRM. 
+
+    Every dataset is configured using :meth:`.DataSetInterface.configure`, e.g. :class:`.MemoryDI` loads the tables of the slotchains into memory. The slotchain joins of the dependencies turn into full table scans if the primary and foreign key columns are not indexed. If :attr:`CREATEINDEXES` is `True`, the missing indexes are created and the statistics of the query planner are updated in every dataset. If :attr:`EXPLAINQUERIES` is `True`, the query plans are logged.
+
+    :arg prm: The :mod:`prm.prm` module
     '''
+    for dsi in DSI:
+        dsi.configure(prm)
+        if CREATEINDEXES:
+            dsi.createIndexes(prm)
+            dsi.analyze()
+        if EXPLAINQUERIES:
+            dsi.explainQueries(prm)
     
     # When dealing with aggregation, we want to create VIEWS to facilitate the sql queries.
     # If a dependency has a 1:n or m:n relationship, then aggregation is required.
@@ -74,7 +93,7 @@ def configure(prm):
     
 def computeTrainingSets():
     ''' 
-    Returns a dictionary mapping a crossvalidation test set with the corresponding training set { datasetinstance : [datasetinstance1,datasetinstance2,....]}. Every :class:`!DataSetInterface` in `datainterface.DSI` is a key in `datainterface.trainingSets`, the value is a list of all other :class:`!DataSetInterface` instances in `datainterface.DSI`
+    Returns a dictionary mapping a crossvalidation test set with the corresponding training set { datasetinstance : [datasetinstance1,datasetinstance2,....]}. Every :class:`!DataSetInterface` in `datainterface.DSI` is a key in `datainterface.trainingSets`, the value is a list of all other :class:`!DataSetInterface` instances in `datainterface.DSI`. The CPD learner doesn't query the training sets, it subtracts the cached counts of the held-out dataset from the total counts (see :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsFold`).
     '''
         
     for dsi in DSI:
@@ -84,12 +103,13 @@ def computeTrainingSets():
                 ts.append(tdsi)            
         trainingSets[dsi]=ts
 
-def datasetinterfaceFactory(path,ditype):
+def datasetinterfaceFactory(path,ditype,mode=None):
     '''
     Creates a connection to a database. There are possibly multiple dataset connections to do crossvalidation.
     
     :arg path: The path to the database
-    :arg ditype: Type of database, e.g. `SQLite`
+    :arg ditype: Type of database, e.g. `SQLite`, `Memory` (a SQLite database whose slotchain tables are kept in memory, see :class:`.MemoryDI`) or `Numpy` (a directory of memory mapped column files, see :class:`.NumpyDI`)
+    :arg mode: Optional load mode of the dataset, e.g. `memory` (see :attr:`data.sqliteinterface.MODES` and :attr:`data.npyinterface.MODES`)
     :returns: A :class:`.DataSetInterface` instance
     '''
     logging.info('\tDataSet: %s (%s)'%(path.split('/')[-1],ditype))
@@ -97,7 +117,13 @@ def datasetinterfaceFactory(path,ditype):
     
     if ditype == 'SQLite':
         from data.sqliteinterface import SQLiteDI
-        return SQLiteDI( path)
+        return SQLiteDI( path, mode)
+    elif ditype == 'Memory':
+        from data.memoryinterface import MemoryDI
+        return MemoryDI( path, mode)
+    elif ditype == 'Numpy':
+        from data.npyinterface import NumpyDI
+        return NumpyDI( path, mode)
     elif ditype == 'MySQL':
         raise Exception("MySQL not yet implemented")
     elif ditype == 'XML':
@@ -121,6 +147,30 @@ class DataSetInterface:
         self.dsiType = dsiType
         
     
+    def configure(self,prm):
+        ''' Configures the dataset interface with the instantiated PRM, see :meth:`data.datainterface.configure`. Nothing is done by default. '''
+        pass
+
+    def dataVersion(self):
+        ''' Returns a value that changes when the data is modified, e.g. to invalidate a :class:`data.cache.NeighbourhoodCache`. `None` by default, i.e. the data is not expected to change '''
+        return None
+
+    def threadSafe(self):
+        ''' Returns `True` if the data can be read by multiple threads at the same time (e.g. by a :class:`data.prefetch.Prefetcher`), `False` by default '''
+        return False
+
+    def createIndexes(self,prm):
+        ''' Creates the indexes needed to query the data of the PRM, see :meth:`.configure` '''
+        raise Exception("method createIndexes() is not implemented in the DataSetInterface")
+
+    def analyze(self):
+        ''' Updates the statistics of the query planner, see :meth:`.configure` '''
+        raise Exception("method analyze() is not implemented in the DataSetInterface")
+
+    def explainQueries(self,prm):
+        ''' Logs the query plans of the queries of the PRM, see :meth:`.configure` '''
+        raise Exception("method explainQueries() is not implemented in the DataSetInterface")
+    
     def __repr__(self):
         ''' String representation of the data interface'''
         raise Exception("method __repr__() is not implemented in the DataSetInterface")
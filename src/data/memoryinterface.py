@@ -0,0 +1,501 @@
+'''
+The class :class:`.MemoryDI` is a :class:`.DataSetInterface` that answers the queries of the inference :mod:`engine` without SQL. When the Ground Bayesian Network is unrolled, :meth:`inference.engine.unrollGBN` queries the parents and children of the attribute objects once per dependency and level of the breadth first search. If the relational skeleton fits into memory, executing these queries in SQLite and converting every row to a tuple is pure overhead.
+
+The tables of the dependency slotchains are loaded once into :class:`.Table` instances, i.e. one :class:`numpy.array` per column, with a hash index on the primary key and sorted indexes on the join columns. A slotchain is evaluated with vectorized joins (`numpy.searchsorted`, see :class:`.SlotchainJoins`), the result rows have the same layout as the result sets of :class:`.SQLiteDI`. The joins are shared with :class:`data.npyinterface.NumpyDI`, which stores the tables as memory mapped column files.
+
+The SQLite connection is kept for all other queries, e.g. the queries of the CPD learners, they are inherited from :class:`.SQLiteDI`. The data interface is specified by the type `Memory`, e.g. ``<Dataset type='Memory' path='./data/database.sqlite'/>``.
+'''
+
+import logging
+
+import numpy as N
+
+from data.sqliteinterface import SQLiteDI, COLUMN_FETCH_SIZE
+
+
+class Table():
+    '''
+    A database table stored column by column in :class:`numpy.array` instances.
+    '''
+
+    def __init__(self, name, columns, orders=None):
+        '''
+        :arg name: Name of the table
+        :arg columns: Dictionary `{column name : numpy.array}`, the arrays have the same length
+        :arg orders: Optional dictionary `{column name : numpy.array}` with the stable sort order of a column, e.g. stored by :meth:`data.npyinterface.exportSQLite`
+        '''
+        self.name = name
+        '''Name of the table
+        '''
+        self.columns = columns
+        '''Dictionary `{column name : numpy.array}`
+        '''
+        self.nRows = 0
+        '''Number of rows
+        '''
+        if columns:
+            self.nRows = len(columns.values()[0])
+        self.orders = orders or {}
+        '''Dictionary `{column name : numpy.array}` of the precomputed sort orders, see :meth:`.sortedIndex`
+        '''
+        self.hashIndexes = {}
+        '''Dictionary `{tuple of column names : {tuple of values : row}}`, see :meth:`.rowsOfKeys`
+        '''
+        self.sortedIndexes = {}
+        '''Dictionary `{column name : (order,sorted values)}`, see :meth:`.join`
+        '''
+
+    def column(self, name):
+        '''
+        :arg name: Name of the column
+        :returns: :class:`numpy.array` with the values of the column
+        '''
+        if name not in self.columns:
+            raise Exception("table %s has no column %s"%(self.name,name))
+        return self.columns[name]
+
+    def rowsOfKeys(self, columns, keys):
+        '''
+        Returns the rows whose `columns` are equal to one of the `keys`. The columns have to be unique (e.g. the primary key), duplicate keys are ignored.
+
+        :arg columns: List of column names
+        :arg keys: List of tuples of values
+        :returns: :class:`numpy.array` of row indices
+        '''
+        columns = tuple(columns)
+        if columns not in self.hashIndexes:
+            values = zip(*[self.column(c).tolist() for c in columns])
+            self.hashIndexes[columns] = dict(zip(values,xrange(self.nRows)))
+        index = self.hashIndexes[columns]
+
+        rows = []
+        found = set()
+        for key in keys:
+            row = index.get(tuple(key))
+            if row is not None and row not in found:
+                found.add(row)
+                rows.append(row)
+        return N.array(rows,dtype=int)
+
+    def sortedIndex(self, column):
+        '''
+        Returns the sorted index of `column`, a precomputed sort order of :attr:`.orders` is used if it exists
+
+        :arg column: Column name
+        :returns: Tuple `(order,sorted values)` of :class:`numpy.array` instances
+        '''
+        if column not in self.sortedIndexes:
+            order = self.orders.get(column)
+            if order is None:
+                order = N.argsort(self.column(column),kind='mergesort')
+            self.sortedIndexes[column] = (order,self.column(column)[order])
+        return self.sortedIndexes[column]
+
+    def join(self, column, values):
+        '''
+        Returns all pairs `(i,row)` for which `values[i]` is equal to the value of `column` in `row`, using a sorted index of `column`.
+
+        :arg column: Column name
+        :arg values: :class:`numpy.array` of values
+        :returns: Tuple `(positions,rows)` of :class:`numpy.array` instances of equal length
+        '''
+        (order,sortedValues) = self.sortedIndex(column)
+
+        left = N.searchsorted(sortedValues,values,side='left')
+        right = N.searchsorted(sortedValues,values,side='right')
+        counts = right - left
+
+        positions = N.repeat(N.arange(len(values)),counts)
+        # offset of every match within the range of its value
+        offsets = N.arange(counts.sum()) - N.repeat(counts.cumsum() - counts,counts)
+        rows = order[N.repeat(left,counts) + offsets]
+        return (positions,rows)
+
+    def nbytes(self):
+        '''
+        :returns: Number of bytes of the column arrays
+        '''
+        return sum([values.nbytes for values in self.columns.values()])
+
+    def __repr__(self):
+        return 'Table %s (%s rows, %s columns)'%(self.name,self.nRows,len(self.columns))
+
+
+def tableFromRows(name, columnNames, rows):
+    '''
+    Creates a :class:`.Table` from the rows of a query
+
+    :arg name: Name of the table
+    :arg columnNames: List of the column names
+    :arg rows: List of rows, every row is a tuple of values
+    :returns: :class:`.Table`
+    '''
+    columns = {}
+    if rows:
+        for (columnName,values) in zip(columnNames,zip(*rows)):
+            columns[columnName] = N.array(values)
+    else:
+        for columnName in columnNames:
+            columns[columnName] = N.array([])
+    return Table(name,columns)
+
+
+def parseClause(const_str):
+    '''
+    Parses a join condition `Table1.column1=Table2.column2` of a slotchain (e.g. of :attr:`.Dependency.slotchain_attr_string`), or a disjunction of conditions `(A.a=B.b OR A.a=B.c)` (a relationship can have multiple foreign keys to the same entity).
+
+    :arg const_str: Constraint string
+    :returns: Clause, i.e. a list of tuples `(Table1,column1,Table2,column2)` of which at least one has to be satisfied
+    '''
+    clause = []
+    for condition in const_str.strip('()').split(' OR '):
+        (fromA,toA) = condition.strip().split('=')
+        clause.append(tuple(fromA.split('.',1)) + tuple(toA.split('.',1)))
+    return clause
+
+
+class ColumnResult():
+    '''
+    Result set of an in-memory query, the result is stored column by column. It provides the interface of :class:`.ResultSet`: the rows can be iterated one by one, or read as :class:`numpy.array` batches using :meth:`.columns`.
+    '''
+
+    def __init__(self, columns, fetchSize=COLUMN_FETCH_SIZE):
+        '''
+        :arg columns: List of :class:`numpy.array` instances of equal length, one per column of the result
+        :arg fetchSize: Number of rows per batch of :meth:`.columns`
+        '''
+        self.resultColumns = columns
+        '''List of :class:`numpy.array` instances, one per column
+        '''
+        self.fetchSize = fetchSize
+        '''Number of rows per batch of :meth:`.columns`
+        '''
+        self.nRows = 0
+        '''Number of rows
+        '''
+        if columns:
+            self.nRows = len(columns[0])
+        self.rows = None
+        '''List of the result rows, created when the first row is read
+        '''
+        self.position = 0
+        '''Position of the next row
+        '''
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        '''
+        :returns: The next row
+        '''
+        if self.position >= self.nRows:
+            raise StopIteration
+        if self.rows is None:
+            self.rows = zip(*[values.tolist() for values in self.resultColumns])
+        row = self.rows[self.position]
+        self.position += 1
+        return row
+
+    def fetchone(self):
+        '''
+        :returns: The next row, `None` if all rows have been read
+        '''
+        return next(self,None)
+
+    def columns(self):
+        '''
+        Iterates over the remaining rows in batches of `fetchSize` rows, see :meth:`.ResultSet.columns`
+
+        :returns: Generator of lists of :class:`numpy.array` instances
+        '''
+        while self.position < self.nRows:
+            end = self.position + self.fetchSize
+            batch = [values[self.position:end] for values in self.resultColumns]
+            self.position = min(end,self.nRows)
+            yield batch
+
+    def detach(self):
+        '''
+        Nothing to do, the result doesn't depend on the state of a database
+        '''
+        pass
+
+    def close(self):
+        '''
+        Discards the remaining rows
+        '''
+        self.position = self.nRows
+
+
+class SlotchainJoins():
+    '''
+    Evaluates the queries of the inference :mod:`engine` by joining :class:`.Table` instances. A subclass initializes :attr:`.tables` and :attr:`.joinClauses` and implements `table(name)`, which returns the :class:`.Table` `name`, and `setResult(columns)`, which stores the result of a query as :class:`.ColumnResult` for `resultSet()` and returns it.
+    '''
+
+    tables = None
+    '''Dictionary `{table name : Table}` of the loaded tables
+    '''
+
+    joinClauses = None
+    '''Cache of the join clauses of the dependency slotchains, see :meth:`.slotchainClauses`
+    '''
+
+    def configure(self, prm):
+        '''
+        Loads the tables of all dependency slotchains, except the slotchains of uncertain dependencies (the uncertain relationship doesn't contain data). Other tables are loaded when they are accessed.
+
+        :arg prm: The :mod:`prm.prm` module
+        '''
+        names = set()
+        for dep in prm.dependencies.values():
+            if not dep.uncertain:
+                names.update(dep.slotchain_string)
+
+        for name in sorted(names):
+            self.table(name)
+
+        logging.info('%s tables loaded (%s rows, %.1f MB)'%(len(self.tables),sum([t.nRows for t in self.tables.values()]),sum([t.nbytes() for t in self.tables.values()])/2.**20))
+
+    def slotchainClauses(self, dep):
+        '''
+        Returns the join conditions of the slotchain of `dep`, see :meth:`.parseClause`
+
+        :arg dep: :class:`.Dependency`
+        :returns: List of clauses
+        '''
+        if dep not in self.joinClauses:
+            self.joinClauses[dep] = [parseClause(const_str) for const_str in dep.slotchain_attr_string]
+        return self.joinClauses[dep]
+
+    def joinTables(self, start, rows, clauses, tables=()):
+        '''
+        Evaluates a query starting with the `rows` of the table `start`. The tables are joined one at a time along the clauses, clauses between two joined tables are applied as filters. A table that isn't connected to the joined tables by any clause (e.g. one of the `tables` that doesn't appear in the clauses) is joined as cross product, as in a SQL query with multiple tables in the `FROM` clause. The result rows are ordered by the `rows` of `start`.
+
+        :arg start: Name of the first table
+        :arg rows: :class:`numpy.array` of row indices of `start`
+        :arg clauses: List of clauses, see :meth:`.parseClause`
+        :arg tables: Optional list of names of further tables of the query
+        :returns: Dictionary `{table name : numpy.array of row indices}`, the arrays are aligned, i.e. the i-th entries form one result row
+        '''
+        joined = {start : rows}
+
+        pending = list(clauses)
+        while pending:
+            for clause in pending:
+                # the joined side and the new table of every condition
+                sides = []
+                for (t1,c1,t2,c2) in clause:
+                    if t1 in joined and t2 not in joined:
+                        sides.append((t1,c1,t2,c2))
+                    elif t2 in joined and t1 not in joined:
+                        sides.append((t2,c2,t1,c1))
+                if all([t1 in joined and t2 in joined for (t1,c1,t2,c2) in clause]):
+                    # filter
+                    mask = N.zeros(len(joined[start]),dtype=bool)
+                    for (t1,c1,t2,c2) in clause:
+                        mask |= self.table(t1).column(c1)[joined[t1]] == self.table(t2).column(c2)[joined[t2]]
+                    for name in joined:
+                        joined[name] = joined[name][mask]
+                    break
+                elif len(sides) == len(clause) and len(set([s[2] for s in sides])) == 1:
+                    newTable = self.table(sides[0][2])
+                    positions = []
+                    rows = []
+                    for (t1,c1,t2,c2) in sides:
+                        (p,r) = newTable.join(c2,self.table(t1).column(c1)[joined[t1]])
+                        positions.append(p)
+                        rows.append(r)
+                    positions = N.concatenate(positions)
+                    rows = N.concatenate(rows)
+                    if len(sides) > 1:
+                        # a pair satisfying multiple conditions is only joined once
+                        (positions,rows) = divmod(N.unique(positions*newTable.nRows + rows),newTable.nRows)
+                    for name in joined:
+                        joined[name] = joined[name][positions]
+                    joined[newTable.name] = rows
+                    break
+            else:
+                # none of the pending clauses is connected to the joined tables
+                self.crossJoin(joined,pending[0][0][0])
+                continue
+            pending.remove(clause)
+
+        for name in tables:
+            if name not in joined:
+                self.crossJoin(joined,name)
+
+        return joined
+
+    def crossJoin(self, joined, name):
+        '''
+        Joins every row of `joined` with all rows of the table `name`, see :meth:`.joinTables`
+
+        :arg joined: Dictionary `{table name : numpy.array of row indices}`, it is updated
+        :arg name: Table name
+        '''
+        nRows = self.table(name).nRows
+        nJoined = len(joined.values()[0])
+        for t in joined:
+            joined[t] = N.repeat(joined[t],nRows)
+        joined[name] = N.tile(N.arange(nRows),nJoined)
+
+    def joinSlotchain(self, dep, start, keys):
+        '''
+        Evaluates the slotchain of `dep`, starting with the rows of the table `start` whose primary key is in `keys`, see :meth:`.joinTables`.
+
+        :arg dep: :class:`.Dependency`
+        :arg start: :class:`.ERClass` whose objects are bound
+        :arg keys: List of primary key tuples of the bound objects
+        :returns: Dictionary `{table name : numpy.array of row indices}`
+        '''
+        rows = self.table(start.name).rowsOfKeys([pk.name for pk in start.pk],keys)
+        return self.joinTables(start.name,rows,self.slotchainClauses(dep))
+
+    def selectColumns(self, joined, columns):
+        '''
+        Returns the result columns of a query
+
+        :arg joined: Dictionary `{table name : numpy.array of row indices}`, see :meth:`.joinTables`
+        :arg columns: List of tuples `(table name, column name)`
+        :returns: List of :class:`numpy.array` instances
+        '''
+        return [self.table(t).column(c)[joined[t]] for (t,c) in columns]
+
+    def loadObjects(self, qvar):
+        '''
+        See :meth:`.SQLiteDI.loadObjects`, the result rows are `[attribute, pk1, pk2, ...]`
+
+        :arg qvar: :class:`inference.query.Qvariable`
+        :returns: :class:`.ColumnResult`
+        '''
+        erClass = qvar.attr.erClass
+        table = self.table(erClass.name)
+        if qvar.objs.pkValues:
+            rows = table.rowsOfKeys([pk.name for pk in erClass.pk],qvar.objs.pkValues)
+        else:
+            rows = N.arange(table.nRows)
+        columns = [(erClass.name,qvar.attr.name)] + [(erClass.name,pk.name) for pk in erClass.pk]
+        return self.setResult(self.selectColumns({erClass.name:rows},columns))
+
+    def loadDependencyParentObjects(self, dep, gbnVertices):
+        '''
+        See :meth:`.SQLiteDI.loadDependencyParentObjects`, the result rows are `[dep_child.pk1, ..., dep_parent.pk1, ..., dep_parent.val]`
+
+        :arg dep: :class:`prm.dependency.Dependency`
+        :arg gbnVertices: A list of :class:`network.groundBN.GBNvertex`
+        :returns: :class:`.ColumnResult`
+        '''
+        child = dep.child.erClass
+        parent = dep.parent.erClass
+        joined = self.joinSlotchain(dep,child,[v.obj for v in gbnVertices])
+        columns = [(child.name,pk.name) for pk in child.pk] + [(parent.name,pk.name) for pk in parent.pk] + [(parent.name,dep.parent.name)]
+        return self.setResult(self.selectColumns(joined,columns))
+
+    def loadDependencyChildrenObjects(self, dep, gbnVertices):
+        '''
+        See :meth:`.SQLiteDI.loadDependencyChildrenObjects`, the result rows are `[dep_parent.pk1, ..., dep_child.pk1, ..., dep_child.val]`
+
+        :arg dep: :class:`prm.dependency.Dependency`
+        :arg gbnVertices: A list of :class:`network.groundBN.GBNvertex`
+        :returns: :class:`.ColumnResult`
+        '''
+        child = dep.child.erClass
+        parent = dep.parent.erClass
+        joined = self.joinSlotchain(dep,parent,[v.obj for v in gbnVertices])
+        columns = [(parent.name,pk.name) for pk in parent.pk] + [(child.name,pk.name) for pk in child.pk] + [(child.name,dep.child.name)]
+        return self.setResult(self.selectColumns(joined,columns))
+
+    def loadAttributeObjects(self, attr):
+        '''
+        See :meth:`.SQLiteDI.loadAttributeObjects`, the result rows are `[attr.pk1, attr.pk2, ..., attr.val]`
+
+        :arg attr: :class:`.Attribute`
+        :returns: :class:`.ColumnResult`
+        '''
+        erClass = attr.erClass
+        table = self.table(erClass.name)
+        columns = [(erClass.name,pk.name) for pk in erClass.pk] + [(erClass.name,attr.name)]
+        return self.setResult(self.selectColumns({erClass.name:N.arange(table.nRows)},columns))
+
+    def loadExistParents(self, refGbnV, existdep):
+        '''
+        See :meth:`.SQLiteDI.loadExistParents`, the result rows are `[k_entity.pk1, ..., dep.parent.pk1, ..., dep.parent.val]`. The uncertain relationship isn't joined. If the n-side entity is part of the query, only its object referenced by the reference vertex is used.
+
+        :arg refGbnV: :class:`.ReferenceVertex`
+        :arg existdep: :class:`.Dependency` with the exist attribute as child
+        :returns: :class:`.ColumnResult`
+        '''
+        dep = refGbnV.dependency
+        kEntity = dep.kAttribute.erClass
+        nEntity = dep.nAttribute.erClass
+        parent = existdep.parent.erClass
+
+        tables = [er.name for er in existdep.slotchain if er != dep.uncertainRelationship]
+        if kEntity.name not in tables:
+            tables.append(kEntity.name)
+
+        if nEntity.name in tables:
+            start = nEntity.name
+            rows = self.table(start).rowsOfKeys([pk.name for pk in nEntity.pk],[refGbnV.refGBNvertex.obj])
+        else:
+            start = tables[0]
+            rows = N.arange(self.table(start).nRows)
+
+        clauses = [parseClause(const_str) for const_str in existdep.slotchain_erclass_exclusive[dep.uncertainRelationship]]
+        joined = self.joinTables(start,rows,clauses,tables)
+        columns = [(kEntity.name,pk.name) for pk in kEntity.pk] + [(parent.name,pk.name) for pk in parent.pk] + [(parent.name,existdep.parent.name)]
+        return self.setResult(self.selectColumns(joined,columns))
+
+
+class MemoryDI(SlotchainJoins, SQLiteDI):
+    '''
+    A subclass of :class:`.SQLiteDI` that answers :meth:`.loadObjects`, :meth:`.loadDependencyParentObjects`, :meth:`.loadDependencyChildrenObjects`, :meth:`.loadAttributeObjects` and :meth:`.loadExistParents` from tables kept in memory, see :class:`.SlotchainJoins`.
+    '''
+
+    def __init__(self, path, mode=None):
+        '''
+        :arg path: Path to SQLite DB file
+        :arg mode: Optional, comma separated list of load modes of the SQLite connection (see :attr:`data.sqliteinterface.MODES`)
+        '''
+        SQLiteDI.__init__(self,path,mode)
+
+        self.tables = {}
+        '''Dictionary `{table name : Table}` of the tables loaded into memory
+        '''
+
+        self.joinClauses = {}
+        '''Cache of the join clauses of the dependency slotchains, see :meth:`.slotchainClauses`
+        '''
+
+    def table(self, name):
+        '''
+        Returns the table `name`, it is loaded from the database the first time it is accessed (by any thread)
+
+        :arg name: Name of the table
+        :returns: :class:`.Table`
+        '''
+        if name not in self.tables:
+            with self.lock:
+                if name not in self.tables:
+                    cur = self.connection().con.cursor()
+                    cur.execute('SELECT * FROM %s;'%name)
+                    columnNames = [d[0] for d in cur.description]
+                    self.tables[name] = tableFromRows(name,columnNames,cur.fetchall())
+                    cur.close()
+        return self.tables[name]
+
+    def setResult(self, columns):
+        '''
+        Stores the result of an in-memory query as the result set of the current thread, see :meth:`.SQLiteDI.resultSet`
+
+        :arg columns: List of :class:`numpy.array` instances, one per column of the result
+        :returns: :class:`.ColumnResult`
+        '''
+        connection = self.connection()
+        connection.result = ColumnResult(columns)
+        return connection.result
+
+    def __repr__(self):
+        ''' String representation for the in-memory DI '''
+        return 'Memory %s'%SQLiteDI.__repr__(self)
@@ -0,0 +1,406 @@
+'''
+The class :class:`.NumpyDI` is a :class:`.DataSetInterface` for datasets stored as `NumPy` column files. Every table (entity or relationship) is a directory that contains one `.npy` file per column, e.g. ``./data/university/Student/intelligence.npy``. The files are opened as memory mapped arrays (`numpy.load(mmap_mode='r')`), i.e. opening a dataset doesn't read any data and a column scan is a sequential read of raw values. As the files are never modified, the format suits immutable snapshots of a database.
+
+The sort orders of the key columns are stored next to the columns (``<column>.order.npy``), they are the sorted indexes of the slotchain joins (see :class:`.Table`). The joins of the inference :mod:`engine` are shared with :class:`.MemoryDI` (see :class:`.SlotchainJoins`), the queries of the CPD learners are evaluated with the same joins and counted with `numpy.unique`.
+
+A dataset is created from a SQLite database with :meth:`.exportSQLite`, e.g. ::
+
+    from data.npyinterface import exportSQLite
+    exportSQLite('./data/university.sqlite','./data/university')
+
+and specified by the type `Numpy` in the data interface specification, e.g. ``<Dataset type='Numpy' path='./data/university'/>``.
+'''
+
+import logging
+import os
+import threading
+
+import sqlite3
+
+import numpy as N
+
+from data.datainterface import DataSetInterface
+from data.memoryinterface import Table, ColumnResult, SlotchainJoins
+from data.sqliteinterface import COLUMN_FETCH_SIZE
+
+
+MODES = ['memory']
+'''
+Load modes of a `Numpy` dataset, specified by the `mode` attribute of the `<Dataset>` element:
+
+* `memory` : The columns are read into memory instead of being memory mapped
+'''
+
+ORDER_SUFFIX = '.order.npy'
+'''
+Suffix of the files that contain the sort order of a column, see :meth:`.exportSQLite`
+'''
+
+
+class NumpyDI(SlotchainJoins, DataSetInterface):
+    '''
+    A subclass of :class:`.DataSetInterface` that reads a dataset of memory mapped `NumPy` column files. The tables are opened when they are first accessed (by any thread), the result of the last query is stored per thread.
+    '''
+
+    def __init__(self, path, mode=None):
+        '''
+        :arg path: Path to the directory of the dataset
+        :arg mode: Optional, comma separated list of load modes (see :attr:`MODES`)
+        '''
+        DataSetInterface.__init__(self,'Numpy')
+
+        self.path = path
+        """Path to the directory of the dataset"""
+
+        self.mode = []
+        """List of load modes, see :attr:`MODES`"""
+        if mode:
+            self.mode = [m.strip() for m in mode.split(',')]
+        for m in self.mode:
+            if m not in MODES:
+                raise Exception("unknown load mode '%s' for dataset %s"%(m,self.path))
+
+        if not os.path.isdir(path):
+            raise Exception("the dataset %s is not a directory"%path)
+
+        self.fetchSize = COLUMN_FETCH_SIZE
+        """Number of rows per batch of the results read column by column, see :meth:`.ColumnResult.columns`
+        """
+
+        self.tables = {}
+        '''Dictionary `{table name : Table}` of the opened tables
+        '''
+
+        self.joinClauses = {}
+        '''Cache of the join clauses of the dependency slotchains, see :meth:`.slotchainClauses`
+        '''
+
+        self.lock = threading.RLock()
+        """Lock that protects the opening of the tables
+        """
+
+        self.local = threading.local()
+        """Thread local storage of the result of the last query, see :meth:`.resultSet`
+        """
+
+    def table(self, name):
+        '''
+        Returns the table `name`, its column files are opened the first time it is accessed
+
+        :arg name: Name of the table
+        :returns: :class:`.Table`
+        '''
+        if name not in self.tables:
+            with self.lock:
+                if name not in self.tables:
+                    self.tables[name] = self.openTable(name)
+        return self.tables[name]
+
+    def openTable(self, name):
+        '''
+        Opens the column files and the sort orders of the table `name`
+
+        :arg name: Name of the table
+        :returns: :class:`.Table`
+        '''
+        directory = os.path.join(self.path,name)
+        if not os.path.isdir(directory):
+            raise Exception("table %s not found in dataset %s"%(name,self.path))
+
+        mmapMode = 'r'
+        if 'memory' in self.mode:
+            mmapMode = None
+
+        columns = {}
+        orders = {}
+        for fileName in os.listdir(directory):
+            if fileName.endswith(ORDER_SUFFIX):
+                orders[fileName[:-len(ORDER_SUFFIX)]] = N.load(os.path.join(directory,fileName),mmap_mode=mmapMode)
+            elif fileName.endswith('.npy'):
+                columns[fileName[:-len('.npy')]] = N.load(os.path.join(directory,fileName),mmap_mode=mmapMode)
+        return Table(name,columns,orders)
+
+    def threadSafe(self):
+        '''
+        :returns: `True`, the tables are opened under a lock and the results are stored per thread
+        '''
+        return True
+
+    def setResult(self, columns):
+        '''
+        Stores the result of a query as the result set of the current thread, see :meth:`.resultSet`
+
+        :arg columns: List of :class:`numpy.array` instances, one per column of the result
+        :returns: :class:`.ColumnResult`
+        '''
+        self.local.result = ColumnResult(columns,self.fetchSize)
+        return self.local.result
+
+    def notNull(self, columns):
+        '''
+        Removes the rows with missing values (`NaN`, see :meth:`.exportSQLite`) from a result
+
+        :arg columns: List of :class:`numpy.array` instances
+        :returns: List of :class:`numpy.array` instances
+        '''
+        mask = None
+        for values in columns:
+            if values.dtype.kind == 'f':
+                if mask is None:
+                    mask = ~N.isnan(values)
+                else:
+                    mask &= ~N.isnan(values)
+        if mask is None or mask.all():
+            return columns
+        return [values[mask] for values in columns]
+
+    def joinAttribute(self, attribute):
+        '''
+        Joins all objects of `attribute` with their parent objects, the tables of the slotchains of all dependencies of `attribute` are merged (see :meth:`.SQLiteDI.sqlFullCPDdata`)
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: Dictionary `{table name : numpy.array of row indices}`, see :meth:`.joinTables`
+        '''
+        clauses = []
+        for dep in attribute.dependenciesChild:
+            for clause in self.slotchainClauses(dep):
+                if clause not in clauses:
+                    clauses.append(clause)
+        start = attribute.erClass.name
+        return self.joinTables(start,N.arange(self.table(start).nRows),clauses)
+
+    def fullColumns(self, attribute):
+        '''
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: The columns [`attributeValues`,`parentValues1`,`parentValues2`,....] of :meth:`.loadFullCPDdata`
+        '''
+        joined = self.joinAttribute(attribute)
+        columns = [(a.erClass.name,a.name) for a in [attribute] + attribute.parents]
+        return self.notNull(self.selectColumns(joined,columns))
+
+    def aggregatedColumns(self, attribute):
+        '''
+        Groups the rows of the join of :meth:`.joinAttribute` by attribute object, the values of multiple parent objects are aggregated with the `Numpy` aggregators of the dependencies (see :mod:`data.aggregation`)
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: The columns [`attributeValues`,`parentValues1`,`parentValues2`,....] of :meth:`.loadFullAggCPDdata`
+        '''
+        joined = self.joinAttribute(attribute)
+        objects = joined[attribute.erClass.name]
+
+        # the rows of an attribute object are consecutive
+        first = N.ones(len(objects),dtype=bool)
+        first[1:] = objects[1:] != objects[:-1]
+        starts = N.flatnonzero(first)
+
+        columns = [self.table(attribute.erClass.name).column(attribute.name)[objects[starts]]]
+        for dep in attribute.dependenciesChild:
+            values = self.table(dep.parent.erClass.name).column(dep.parent.name)[joined[dep.parent.erClass.name]]
+            if dep.aggregator is None or len(starts) == 0:
+                columns.append(values[starts])
+            else:
+                columns.append(dep.aggregator(self.dsiType)(values,starts))
+        return columns
+
+    def countColumns(self, columns):
+        '''
+        Counts the occurences of every assignment of a result, rows with missing values are ignored
+
+        :arg columns: List of :class:`numpy.array` instances
+        :returns: List of :class:`numpy.array` instances, one per column of the distinct assignments (in sorted order) and the counts
+        '''
+        columns = self.notNull(columns)
+        if len(columns[0]) == 0:
+            return columns + [N.array([],dtype=int)]
+
+        uniques = []
+        inverses = []
+        for values in columns:
+            (u,inverse) = N.unique(values,return_inverse=True)
+            uniques.append(u)
+            inverses.append(inverse)
+        dims = [len(u) for u in uniques]
+
+        (keys,counts) = N.unique(N.ravel_multi_index(inverses,dims),return_counts=True)
+        indices = N.unravel_index(keys,dims)
+        return [u[i] for (u,i) in zip(uniques,indices)] + [counts]
+
+    def loadCountCPDdata(self, attribute, aggregate=False):
+        '''
+        See :meth:`.SQLiteDI.loadCountCPDdata`, the rows are `[valAttr, valPa1, valPa2, ..., count]`
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :arg aggregate: If `True`, the assignments of :meth:`.loadFullAggCPDdata` are counted, otherwise the assignments of :meth:`.loadFullCPDdata`
+        :returns: :class:`.ColumnResult`
+        '''
+        if aggregate:
+            columns = self.aggregatedColumns(attribute)
+        else:
+            columns = self.fullColumns(attribute)
+        return self.setResult(self.countColumns(columns))
+
+    def loadFullAggCPDdata(self, attribute):
+        '''
+        See :meth:`.SQLiteDI.loadFullAggCPDdata`
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: :class:`.ColumnResult`
+        '''
+        return self.setResult(self.aggregatedColumns(attribute))
+
+    def loadFullCPDdata(self, attribute):
+        '''
+        See :meth:`.SQLiteDI.loadFullCPDdata`
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: :class:`.ColumnResult`
+        '''
+        return self.setResult(self.fullColumns(attribute))
+
+    def loadFullCPDcolumns(self, attribute):
+        '''
+        See :meth:`.SQLiteDI.loadFullCPDcolumns`
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: Generator of lists of :class:`numpy.array` instances, [`attributeValues`,`parentValues1`,`parentValues2`,....]
+        '''
+        return self.loadFullCPDdata(attribute).columns()
+
+    def loadAttributeParentObjects(self, attr, gbnVertices):
+        '''
+        Not supported, the inference :mod:`engine` uses :meth:`.loadDependencyParentObjects` (see :meth:`.SQLiteDI.loadAttributeParentObjects`)
+        '''
+        raise Exception("method loadAttributeParentObjects() is not implemented in the NumpyDI")
+
+    def createIndexes(self, prm):
+        '''
+        Computes the sorted indexes of all join columns of the dependency slotchains that haven't been opened, i.e. that weren't stored by :meth:`.exportSQLite`
+
+        :arg prm: The :mod:`prm.prm` module
+        :returns: List of the indexed columns `table.column`
+        '''
+        created = []
+        for dep in prm.dependencies.values():
+            if dep.uncertain:
+                continue
+            for clause in self.slotchainClauses(dep):
+                for (t1,c1,t2,c2) in clause:
+                    for (t,c) in [(t1,c1),(t2,c2)]:
+                        table = self.table(t)
+                        if c not in table.sortedIndexes:
+                            table.sortedIndex(c)
+                            created.append('%s.%s'%(t,c))
+        return created
+
+    def analyze(self):
+        '''
+        Nothing to do, the joins don't use statistics
+        '''
+        pass
+
+    def explainQueries(self, prm):
+        '''
+        Logs the join conditions of the dependency slotchains, a join column without stored sort order (that has to be sorted when it is accessed first) is logged as a warning
+
+        :arg prm: The :mod:`prm.prm` module
+        :returns: Dictionary `{ dependency name : [condition,...] }`
+        '''
+        plans = {}
+        for dep in prm.dependencies.values():
+            if dep.uncertain:
+                continue
+            plans[dep.name] = []
+            logging.info('Joins of %s'%dep.name)
+            for clause in self.slotchainClauses(dep):
+                for (t1,c1,t2,c2) in clause:
+                    detail = '%s.%s=%s.%s'%(t1,c1,t2,c2)
+                    plans[dep.name].append(detail)
+                    if c1 not in self.table(t1).orders or c2 not in self.table(t2).orders:
+                        logging.warning('\t%s (no stored sort order)'%detail)
+                    else:
+                        logging.info('\t%s'%detail)
+        return plans
+
+    def retrieveRow(self):
+        '''
+        Returns the next row of the result set of the last query of the current thread (`None` if all rows have been read), see :meth:`.SQLiteDI.retrieveRow`
+        '''
+        return next(self.local.result,None)
+
+    def resultSet(self):
+        '''
+        Returns the result set of the last query executed by the current thread, see :meth:`.SQLiteDI.resultSet`
+        '''
+        return self.local.result
+
+    def __repr__(self):
+        ''' String representation for Numpy DI '''
+        if self.mode:
+            return '%s DataSet Interface connecting to %s (%s)'%(self.dsiType,self.path.rstrip('/').split('/')[-1],','.join(self.mode))
+        return '%s DataSet Interface connecting to %s'%(self.dsiType,self.path.rstrip('/').split('/')[-1])
+
+
+def columnArray(values):
+    '''
+    Converts the values of a database column to a :class:`numpy.array` that can be memory mapped. Missing values (`NULL`) of a numeric column are stored as `NaN`, of a text column as empty string.
+
+    :arg values: List of values
+    :returns: :class:`numpy.array`
+    '''
+    if None in values:
+        if all([isinstance(v,(int,long,float)) for v in values if v is not None]):
+            return N.array([N.nan if v is None else v for v in values],dtype=float)
+        values = [u'' if v is None else v for v in values]
+    array = N.array(values)
+    if array.dtype.kind == 'O':
+        raise Exception("the values can't be stored in a numpy array")
+    return array
+
+
+def exportSQLite(sqlitePath, path):
+    '''
+    Exports all tables of a SQLite database into a `Numpy` dataset, see :class:`.NumpyDI`. The sort order of every column that is part of a primary key or an index, or whose name is the name of a primary key column of any table (i.e. a foreign key), is stored as well.
+
+    :arg sqlitePath: Path to the SQLite DB file
+    :arg path: Path to the directory of the dataset, it is created if it doesn't exist
+    :returns: List of the exported table names
+    '''
+    con = sqlite3.connect(sqlitePath)
+    tableNames = [row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")]
+
+    # the key columns of every table
+    keys = {}
+    pkNames = set()
+    for name in tableNames:
+        keys[name] = set()
+        for (cid,column,type,notnull,default,pk) in con.execute('PRAGMA table_info(%s);'%name):
+            if pk:
+                keys[name].add(column)
+                pkNames.add(column)
+        for index in con.execute('PRAGMA index_list(%s);'%name).fetchall():
+            for row in con.execute('PRAGMA index_info(%s);'%index[1]):
+                keys[name].add(row[2])
+
+    for name in tableNames:
+        directory = os.path.join(path,name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        cur = con.execute('SELECT * FROM %s;'%name)
+        columnNames = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+        columns = zip(*rows) or [()]*len(columnNames)
+
+        for (column,values) in zip(columnNames,columns):
+            try:
+                array = columnArray(values)
+            except Exception:
+                raise Exception("the column %s.%s can't be exported"%(name,column))
+            N.save(os.path.join(directory,column + '.npy'),array)
+            if column in keys[name] or column in pkNames:
+                N.save(os.path.join(directory,column + ORDER_SUFFIX),N.argsort(array,kind='mergesort'))
+
+        logging.info('Exported %s (%s rows, %s columns) to %s'%(name,len(rows),len(columnNames),directory))
+
+    con.close()
+    return tableNames
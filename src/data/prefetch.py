@@ -0,0 +1,110 @@
+'''
+The :class:`.Prefetcher` executes `loadXXX()` methods of a :class:`.DataSetInterface` on a background thread. The inference :mod:`engine` submits the queries of the next attribute in the :class:`.GBNqueue` while it is still building the vertices of the current one, i.e. the database and the Python code that unrolls the Ground Bayesian Network work at the same time (see :meth:`inference.engine.unrollGBN`).
+
+The background thread reads the data with its own connection (see :meth:`.SQLiteDI.connection`). The result sets are read completely by the background thread and passed back in the order in which the queries were submitted, through a queue of at most :attr:`QUEUE_SIZE` results.
+'''
+
+import logging
+import sys
+import threading
+import Queue
+
+from collections import deque
+
+
+QUEUE_SIZE = 4
+'''
+Maximal number of result sets that the background thread reads ahead, it waits until the results are retrieved with :meth:`.Prefetcher.fetch`
+'''
+
+
+class Prefetcher():
+    '''
+    A background thread that executes the `loadXXX()` methods of a :class:`.DataSetInterface`. The queries are submitted with :meth:`.submit` and retrieved in the same order with :meth:`.fetch`.
+    '''
+
+    def __init__(self, dsi, queueSize=QUEUE_SIZE):
+        '''
+        :arg dsi: :class:`.DataSetInterface` instance that can be read by multiple threads (see :meth:`.DataSetInterface.threadSafe`)
+        :arg queueSize: Maximal number of results that are read ahead
+        '''
+        self.dsi = dsi
+        '''The :class:`.DataSetInterface` instance
+        '''
+        self.requests = Queue.Queue()
+        '''Queue of the submitted queries `(method name, arguments)`, `None` stops the background thread
+        '''
+        self.results = Queue.Queue(queueSize)
+        '''Bounded queue of the results `(True, rows)` or `(False, exception info)`
+        '''
+        self.pending = deque()
+        '''Queries `(method name, arguments)` whose results haven't been retrieved yet, in the order of submission
+        '''
+        self.thread = threading.Thread(target=self.run,name='Prefetcher')
+        '''The background thread
+        '''
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        '''
+        Executes the submitted queries until :meth:`.close` is called, runs on the background thread
+        '''
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            (method,args) = request
+            try:
+                rows = list(getattr(self.dsi,method)(*args))
+                self.results.put((True,rows))
+            except Exception:
+                self.results.put((False,sys.exc_info()))
+
+    def submit(self, method, *args):
+        '''
+        Submits the query `dsi.method(*args)` to the background thread
+
+        :arg method: Name of the `loadXXX()` method, e.g. `loadDependencyParentObjects`
+        :arg args: Arguments of the method
+        '''
+        self.pending.append((method,args))
+        self.requests.put((method,args))
+
+    def fetch(self, method, *args):
+        '''
+        Returns the result of the query `dsi.method(*args)`. If it is the next pending query (the arguments are compared by identity), its result is retrieved from the background thread (waiting for it if necessary), otherwise the query is executed by the calling thread.
+
+        :arg method: Name of the `loadXXX()` method
+        :arg args: Arguments of the method
+        :returns: List of the result rows, or the result set of the `loadXXX()` method
+        '''
+        if self.pending:
+            (pendingMethod,pendingArgs) = self.pending[0]
+            if pendingMethod == method and len(pendingArgs) == len(args) and all([a is b for (a,b) in zip(pendingArgs,args)]):
+                self.pending.popleft()
+                (ok,value) = self.results.get()
+                if not ok:
+                    raise value[0], value[1], value[2]
+                return value
+        return getattr(self.dsi,method)(*args)
+
+    def clear(self):
+        '''
+        Discards the results of all pending queries, e.g. if the unrolling was interrupted
+        '''
+        while self.pending:
+            self.pending.popleft()
+            self.results.get()
+
+    def close(self):
+        '''
+        Discards the pending queries and stops the background thread
+        '''
+        self.clear()
+        self.requests.put(None)
+        self.thread.join()
+        logging.debug('Prefetcher of %s stopped'%self.dsi)
+
+    def __repr__(self):
+        return 'Prefetcher of %s (%s pending queries)'%(self.dsi,len(self.pending))
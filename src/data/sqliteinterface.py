@@ -3,9 +3,11 @@ The class :class:`~!.DataSetInterface` specifies a set of methods that are need
 '''
 
 import logging
+import threading
 
 import sqlite3 
-from itertools import repeat
+
+import numpy as N
 
 from analytics.performance import time_analysis
 
@@ -13,92 +15,448 @@ from analytics.performance import time_analysis
 from data.datainterface import DataSetInterface
 
 
+MODES = ['memory','mmap','readonly']
+'''
+Load modes of a dataset, specified by the `mode` attribute of the `<Dataset>` element of the data interface specification (e.g. `mode='mmap,readonly'`, see :class:`.DataInterfaceParser`). Learning and unrolling only read the data and access the same pages over and over:
+
+* `memory` : The database is copied into an in-memory database when the connection is created. Changes (e.g. indexes created by :meth:`.SQLiteDI.createIndexes`) are not written to the file. The in-memory database can only be accessed by the thread that created the data interface.
+* `mmap` : The database file is accessed using memory mapped I/O (up to :attr:`MMAP_SIZE` bytes)
+* `readonly` : The data can't be modified (`query_only`), the page cache is enlarged to :attr:`CACHE_SIZE`, temporary tables are kept in memory and the rollback journal is disabled
+'''
+
+MMAP_SIZE = 2**30
+'''
+Maximal number of bytes of a database file that are memory mapped in the `mmap` mode
+'''
+
+CACHE_SIZE = 2**18
+'''
+Size of the page cache in KiB in the `readonly` mode
+'''
+
+CACHED_STATEMENTS = 500
+'''
+Number of compiled statements that `sqlite3` caches per connection (the default is 100). The statements of the `loadXXX()` methods are constant for every dependency/attribute (see :meth:`.SQLiteDI.statement`), with this cache size they are compiled only once.
+'''
+
+FETCH_SIZE = 1000
+"""
+Default number of rows that a :class:`.ResultSet` fetches at once from its cursor (`fetchmany()`), see :attr:`.SQLiteDI.fetchSize`
+"""
+
+COLUMN_FETCH_SIZE = 100000
+"""
+Number of rows that are fetched at once when a result set is read column by column, see :meth:`.ResultSet.columns`
+"""
+
+
+class ResultSet():
+    '''
+    Iterator over the rows of a query executed by a `loadXXX()` method of :class:`.SQLiteDI`. Every result set has its own cursor, thus multiple result sets can be open at the same time. The rows are fetched in batches of `fetchSize` rows, a large result set (e.g. of :meth:`.SQLiteDI.loadFullCPDdata`) is streamed in bounded memory. The cursor is closed once all rows have been read.
+    '''
+
+    def __init__(self, cur, fetchSize):
+        '''
+        :arg cur: `sqlite3.Cursor` that executed the query
+        :arg fetchSize: Number of rows fetched at once
+        '''
+        self.cur = cur
+        '''The cursor of the query, `None` once all rows have been fetched
+        '''
+        self.fetchSize = fetchSize
+        '''Number of rows fetched at once
+        '''
+        self.batch = []
+        '''The rows of the current batch
+        '''
+        self.position = 0
+        '''Position of the next row in the current batch
+        '''
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        '''
+        :returns: The next row
+        '''
+        if self.position == len(self.batch):
+            if self.cur is None:
+                raise StopIteration
+            self.batch = self.cur.fetchmany(self.fetchSize)
+            self.position = 0
+            if not self.batch:
+                self.close()
+                raise StopIteration
+        row = self.batch[self.position]
+        self.position += 1
+        return row
+
+    def fetchone(self):
+        '''
+        :returns: The next row, `None` if all rows have been read
+        '''
+        return next(self,None)
+
+    def columns(self):
+        '''
+        Iterates over the remaining rows in batches of `fetchSize` rows. Every batch is converted to one :class:`numpy.array` per column, the type of the array is derived from the values (e.g. `int` for an integer column).
+
+        :returns: Generator of lists of :class:`numpy.array` instances
+        '''
+        rows = self.batch[self.position:]
+        self.batch = []
+        self.position = 0
+        while True:
+            if rows:
+                yield [N.array(values) for values in zip(*rows)]
+            if self.cur is None:
+                break
+            rows = self.cur.fetchmany(self.fetchSize)
+            if not rows:
+                self.close()
+
+    def detach(self):
+        '''
+        Fetches all remaining rows and closes the cursor, the result set doesn't depend on the state of the database anymore (e.g. the temporary key table, see :meth:`.SQLiteDI.bindKeys`)
+        '''
+        if self.cur is not None:
+            self.batch = self.batch[self.position:] + self.cur.fetchall()
+            self.position = 0
+            self.close()
+
+    def close(self):
+        '''
+        Closes the cursor, remaining rows are discarded
+        '''
+        if self.cur is not None:
+            self.cur.close()
+            self.cur = None
+
+
+class Connection():
+    '''
+    A connection of a :class:`.SQLiteDI` to the database and its state, every thread uses its own connection (see :meth:`.SQLiteDI.connection`).
+    '''
+
+    def __init__(self, con, readonly):
+        '''
+        :arg con: `sqlite3.Connection`
+        :arg readonly: If `True`, `PRAGMA query_only` is enabled (see :meth:`.SQLiteDI.queryOnly`)
+        '''
+        self.con = con
+        '''The `sqlite3.Connection`
+        '''
+        self.readonly = readonly
+        '''`True` if `PRAGMA query_only` is enabled
+        '''
+        self.cur = con.cursor()
+        '''SQLite cursor that executes the SQL commands that don't return a result set (e.g. :meth:`.SQLiteDI.bindKeys`), every `loadXXX()` method uses its own cursor (see :meth:`.SQLiteDI.execute`)
+        '''
+        self.keyTables = set()
+        '''Set of the number of key columns of the temporary key tables that have been created, see :meth:`.SQLiteDI.bindKeys`
+        '''
+        self.result = None
+        '''The :class:`.ResultSet` of the last `loadXXX()` method, see :meth:`.SQLiteDI.resultSet`
+        '''
+        self.keyTableResults = {}
+        '''Dictionary mapping a temporary key table to the last result set that reads it, see :meth:`.SQLiteDI.bindKeys`
+        '''
+        self.boundTable = None
+        '''The temporary key table filled by the last call of :meth:`.SQLiteDI.bindKeys`, it is assigned to the result set of the next query
+        '''
+
 
 class SQLiteDI(DataSetInterface):
     '''
     A subclass of :class:`.DataSetInterface` that links a PRM to the SQLite database that it models. 
+
+    The data interface is thread-safe, every thread reads the database with its own connection (see :meth:`.connection`). E.g. the CPD learner, the inference engine and independent queries can read the data at the same time.
     '''
-    def __init__(self,path):
+    def __init__(self,path,mode=None):
         '''
         Connection to SQLite database is created         
+
+        :arg path: Path to SQLite DB file
+        :arg mode: Optional, comma separated list of load modes (see :attr:`MODES`), e.g. `'memory'` or `'mmap,readonly'`
         '''  
         
         DataSetInterface.__init__(self, 'SQLite')
         
         self.path = path
         """Path to SQLite DB file"""
+
+        self.mode = []
+        """List of load modes, see :attr:`MODES`"""
+        if mode:
+            self.mode = [m.strip() for m in mode.split(',')]
+        for m in self.mode:
+            if m not in MODES:
+                raise Exception("unknown load mode '%s' for dataset %s"%(m,self.path))
         
-             
+
+        self.statements = {}
+        """Cache of the SQL statements of the `loadXXX()` methods, see :meth:`.statement`
+        """
+
+        self.fetchSize = FETCH_SIZE
+        """Number of rows fetched at once by the result sets of the `loadXXX()` methods, see :class:`.ResultSet`
+        """
+
+        self.lock = threading.RLock()
+        """Lock that protects the pool of connections
+        """
+
+        self.local = threading.local()
+        """Thread local storage of the :class:`.Connection` of the current thread, see :meth:`.connection`
+        """
+
+        self.connections = []
+        """List of all open :class:`.Connection` instances, the first one is the connection of the thread that created the data interface
+        """
+
+        # the connection of the creating thread is opened immediately
+        self.connection()
+
+    def connection(self):
+        '''
+        Returns the :class:`.Connection` of the current thread. Every thread reads the database with its own connection, SQLite handles concurrent readers. The first connection is opened by the thread that creates the data interface, the connections of other threads are opened when they first access the data and are read-only (`PRAGMA query_only`).
+
+        The in-memory database of the `memory` mode (see :attr:`MODES`) can't be shared, it can only be accessed by the creating thread. The connections are opened with `check_same_thread=False`, such that :meth:`.close` (or a :class:`.ResultSet` passed to another thread) can access them from another thread.
+
+        :returns: :class:`.Connection`
+        '''
+        connection = getattr(self.local,'connection',None)
+        if connection is None:
+            with self.lock:
+                if self.connections and 'memory' in self.mode:
+                    raise Exception("the in-memory database %s can only be accessed by the thread that loaded it"%self.path)
+                connection = Connection(self.connect(),'readonly' in self.mode or len(self.connections) > 0)
+                self.connections.append(connection)
+            self.local.connection = connection
+        return connection
+
+    def dataVersion(self):
+        '''
+        Returns the data version of the database (`PRAGMA data_version`) seen by the connection of the current thread. It changes when another connection (e.g. of another process) commits changes to the database, the changes made through the connection itself are not detected.
+
+        :returns: Tuple `(connection,data version)`, the versions of different connections are not comparable
+        '''
+        connection = self.connection()
+        return (connection,connection.con.execute('PRAGMA data_version;').fetchone()[0])
+
+    def threadSafe(self):
+        '''
+        :returns: `True`, unless the database is copied into memory (the `memory` mode, see :meth:`.connection`)
+        '''
+        return 'memory' not in self.mode
+
+    def connect(self):
+        '''
+        Opens a new connection to the database, configured according to the load modes (see :attr:`MODES`)
+
+        :returns: `sqlite3.Connection`
+        '''
+        con = None
         try:
-            self.con = sqlite3.connect(self.path) # make connection
-            self.con.isolation_level = None 
+            if 'memory' in self.mode:
+                con = self.loadIntoMemory()
+            else:
+                con = sqlite3.connect(self.path,cached_statements=CACHED_STATEMENTS,check_same_thread=False) # make connection
+            con.isolation_level = None 
+
+            if 'mmap' in self.mode:
+                con.execute('PRAGMA mmap_size=%s;'%MMAP_SIZE)
+            if 'readonly' in self.mode:
+                con.execute('PRAGMA cache_size=-%s;'%CACHE_SIZE)
+                con.execute('PRAGMA temp_store=MEMORY;')
+                con.execute('PRAGMA journal_mode=OFF;')
+            if 'readonly' in self.mode or len(self.connections) > 0:
+                con.execute('PRAGMA query_only=ON;')
             
-            #self.con.row_factory = sqlite3.Row # tuples in result set will be Row objects
-            self.cur = self.con.cursor() 
-            """SQLite cursor that will execute SQL commands and contain the result set
-            """
+            #con.row_factory = sqlite3.Row # tuples in result set will be Row objects
             
         except sqlite3.Error, e:            
-            logging.debug("An error occurred:", e.args[0])
+            logging.debug("An error occurred: %s"%e.args[0])
+        return con
+
+    def close(self):
+        '''
+        Closes the connections of all threads
+        '''
+        with self.lock:
+            for connection in self.connections:
+                connection.con.close()
+            self.connections = []
+            self.local = threading.local()
+
+    def loadIntoMemory(self):
+        '''
+        Copies the database file into an in-memory database using the backup API. If it isn't available (Python < 3.7), the tables are copied through an attached database and the indexes, views and triggers are recreated.
+
+        :returns: `sqlite3.Connection` to the in-memory database
+        '''
+        memCon = sqlite3.connect(':memory:',cached_statements=CACHED_STATEMENTS,check_same_thread=False)
+
+        if hasattr(memCon,'backup'):
+            fileCon = sqlite3.connect(self.path)
+            fileCon.backup(memCon)
+            fileCon.close()
+            return memCon
+
+        memCon.isolation_level = None
+        memCon.execute('ATTACH DATABASE ? AS source;',(self.path,))
+        schema = memCon.execute("SELECT type,name,sql FROM source.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%';").fetchall()
+        memCon.execute('BEGIN;')
+        for (type,name,sql) in schema:
+            if type == 'table':
+                memCon.execute(sql)
+                memCon.execute('INSERT INTO main.%s SELECT * FROM source.%s;'%(name,name))
+        # the indexes are created once the data is loaded
+        for (type,name,sql) in schema:
+            if type != 'table':
+                memCon.execute(sql)
+        memCon.execute('COMMIT;')
+        memCon.execute('DETACH DATABASE source;')
+        return memCon
+
+    def queryOnly(self, enabled):
+        '''
+        If the connection of the current thread is read-only (e.g. in the `readonly` mode, see :attr:`MODES`), enables or disables `PRAGMA query_only`. The temporary key tables (see :meth:`.bindKeys`) are written with `query_only` disabled.
+
+        :arg enabled: Boolean
+        '''
+        connection = self.connection()
+        if connection.readonly:
+            connection.cur.execute('PRAGMA query_only=%s;'%('ON' if enabled else 'OFF'))
+
+    def statement(self, builder, *args):
+        '''
+        Returns the SQL statement `builder(*args)`. The statements only depend on the structure of the PRM (e.g. the dependency or attribute), the values are bound as parameters or in a temporary table (see :meth:`.bindKeys`). Thus every statement is built once and cached in :attr:`.statements`, and `sqlite3` can reuse the compiled statement.
+
+        :arg builder: Method that builds the statement, e.g. :meth:`.sqlDependencyParentObjects`
+        :arg args: Arguments of `builder`
+        :returns: The statement returned by `builder`
+        '''
+        key = (builder.__name__,) + args
+        if key not in self.statements:
+            self.statements[key] = builder(*args)
+        return self.statements[key]
+
+    def execute(self, sqlQuery, parameters=(), fetchSize=None):
+        '''
+        Executes the query of a `loadXXX()` method with a new cursor. The result set is returned and also accessible using :meth:`.resultSet` until the current thread executes the next query.
+
+        :arg sqlQuery: SQL statement, e.g. returned by :meth:`.statement`
+        :arg parameters: Optional tuple of values bound to the parameters of the statement
+        :arg fetchSize: Optional number of rows fetched at once, the default is :attr:`.fetchSize`
+        :returns: :class:`.ResultSet`
+        '''
+        connection = self.connection()
+        cur = connection.con.cursor()
+        cur.execute(sqlQuery,parameters)
+        connection.result = ResultSet(cur,fetchSize or self.fetchSize)
+        if connection.boundTable is not None:
+            connection.keyTableResults[connection.boundTable] = connection.result
+            connection.boundTable = None
+        return connection.result
+
+    def keyTable(self, pks):
+        '''
+        Returns the temporary table used by :meth:`.bindKeys` to store the keys of objects identified by `pks`, the table is created if necessary. Temporary tables are private to a connection, thus every thread has its own key tables.
+
+        :arg pks: List of primary key :class:`.Attribute` instances that identify the objects
+        :returns: Tuple `(table,where)`, the name of the temporary table and the list of `WHERE` clause terms that join it to `pks`
+        '''
+        n = len(pks)
+        table = 'TEMP_KEYS_%s'%n
+        columns = ['k%s'%i for i in range(n)]
+
+        connection = self.connection()
+        if n not in connection.keyTables:
+            self.queryOnly(False)
+            connection.cur.execute('CREATE TEMP TABLE IF NOT EXISTS %s (%s, PRIMARY KEY (%s));'%(table,','.join(columns),','.join(columns)))
+            self.queryOnly(True)
+            connection.keyTables.add(n)
+
+        where = ['%s=%s.%s'%(pk.fullname,table,column) for (pk,column) in zip(pks,columns)]
+        return (table,where)
      
+    def bindKeys(self, pks, keys):
+        '''
+        Stores the primary key values `keys` of a set of attribute objects in a temporary table, such that the objects can be selected by joining the table instead of a `WHERE (pk=.. AND pk=..) OR (...) OR ...` clause with one term per object. The parse time of the query doesn't depend on the number of objects and SQLite can use the primary key index of the queried table.
+
+        There is one temporary table per number of key columns, `TEMP_KEYS_<n>` with the columns `k0,...,k<n-1>` (see :meth:`.keyTable`). The table is emptied before the new keys are inserted (duplicates are ignored). If the result set of a previous query that joins the table is still open, its remaining rows are fetched first (see :meth:`.ResultSet.detach`).
+
+        :arg pks: List of primary key :class:`.Attribute` instances that identify the objects
+        :arg keys: List of tuples of primary key values, one value per attribute in `pks`
+        :returns: Tuple `(table,where)`, see :meth:`.keyTable`
+        '''
+        (table,where) = self.keyTable(pks)
+        n = len(pks)
+        connection = self.connection()
+        cur = connection.cur
+
+        if table in connection.keyTableResults:
+            connection.keyTableResults.pop(table).detach()
+
+        # one transaction for all inserts, the connection is in autocommit mode
+        self.queryOnly(False)
+        cur.execute('BEGIN;')
+        try:
+            cur.execute('DELETE FROM %s;'%table)
+            cur.executemany('INSERT OR IGNORE INTO %s VALUES (%s);'%(table,','.join(['?']*n)),(tuple(key) for key in keys))
+        except:
+            cur.execute('ROLLBACK;')
+            self.queryOnly(True)
+            raise
+        cur.execute('COMMIT;')
+        self.queryOnly(True)
+
+        connection.boundTable = table
+        return (table,where)
+
      
-    def loadCountCPDdata(self, attribute):
+    def loadCountCPDdata(self, attribute, aggregate=False):
         '''
-        We pass an `attribute`, and constructe a query such that the result set `self.cur` contains all the 
+        We pass an `attribute`, and constructe a query such that the result set contains all the 
         data to learn the local distribution of that `attribute`. The `Count` in the name 
         indicates that the query is constructed such that the compuation is done on the SQL side, 
-        e.g. the number of occurences for each possible parent assignment is counted using `COUNT`. This function 
-        is used by :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsCount`.        
+        e.g. the number of occurences of each full assignment is counted using `COUNT`. Only one row per
+        assignment that occurs in the data is returned, the rows have the format
+        [valAttr, valPa1, valPa2, ..., count]. This function is used by :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsCount` and :meth:`learners.cpdlearners.CPDTabularLearner.loglikelihood`.
         
         :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :arg aggregate: If `True`, the assignments of :meth:`.loadFullAggCPDdata` are counted (one row per attribute object, the values of multiple parent objects are aggregated), otherwise the assignments of :meth:`.loadFullCPDdata`
+        :returns: :class:`.ResultSet`
         '''
-        sqlQuery = ''
-        if len(attribute.parents)==0:
-            sqlQuery = 'SELECT COUNT(*) FROM %s GROUP BY %s;'%(attribute.erClass.name,attribute.fullname)
-            
-        else:
-            sqlAttributes = [attribute.fullname]
-            sqlTables = [attribute.erClass.name]
-
-            sqlWhere = []
-        
-            for dep in attribute.dependenciesChild:
-                if dep.aggregator is None:
-                    #attribute
-                    sqlAttributes.append(dep.parent.fullname)
-                    #tables
-                    for er in dep.slotchain:
-                        if er.name not in sqlTables:
-                            sqlTables.append(er.name)
-                
-                    sqlWhere.extend(dep.slotchain_attr_string)
-                
-                else:
-                    # We created a VIEW to aggregate the parent values
-                    vName = dep.name   #'%s_%s'%(dep.parent.name,attribute.name)
-                    sqlAttributes.append('AGG_%s'%(dep.parent.name))
-                    sqlTables.append(vName)                
-                    sqlWhere.extend(['%s.%s=%s'%(vName,pki.name,pki.fullname) for pki in attribute.erClass.pk])
-
-            # string representation of the sql lists   
-            sqlAttributes =  ",".join(sqlAttributes)
-            sqlTables = ",".join(sqlTables)
-            sqlWhere = " AND ".join(sqlWhere)
-                
-            sqlQuery = 'SELECT COUNT(*) FROM %s WHERE %s GROUP BY %s;'%(sqlTables,sqlWhere,sqlAttributes)
-            
+        return self.execute(self.statement(self.sqlCountCPDdata,attribute,aggregate))
+
+    def sqlCountCPDdata(self, attribute, aggregate):
         '''
-        We execute the query and return the result set with the ordering of the queried 
-        attributes
-        '''        
+        Returns the SQL statement executed by :meth:`.loadCountCPDdata`. The query of :meth:`.loadFullCPDdata` (or :meth:`.loadFullAggCPDdata`) is used as common table expression whose rows are grouped by all columns, assignments with `NULL` values are ignored.
+        '''
+        if aggregate:
+            sqlFull = self.sqlFullAggCPDdata(attribute)
+            nColumns = 1 + len(attribute.dependenciesChild)
+        else:
+            sqlFull = self.sqlFullCPDdata(attribute)
+            nColumns = 1 + len(attribute.parents)
+
+        columns = ['v%s'%i for i in range(nColumns)]
+        sqlColumns = ','.join(columns)
+        sqlNull = ' AND '.join(['%s IS NOT NULL'%c for c in columns])
+
+        sqlQuery = 'WITH FULLDATA(%s) AS (%s) SELECT %s,COUNT(*) FROM FULLDATA WHERE %s GROUP BY %s;'%(sqlColumns,sqlFull.rstrip(';'),sqlColumns,sqlNull,sqlColumns)
+
         #logging.debug(sqlQuery)
-        self.cur.execute(sqlQuery)
+        return sqlQuery
 
 
             
     def loadFullAggCPDdata(self, attribute):
         '''
-        We pass an `attribute`, and constructe a query such that the result set `self.cur` contains all the 
+        We pass an `attribute`, and constructe a query such that the result set contains all the 
         data to learn the local distribution of that `attribute`. The `Full` in the name indicates that we don't 
         `COUNT` all occurences in the query but in the learner instead. The `Agg` indicates that if the `attribute` 
         has multiple parents for one attribute object, we use `VIEWS` to aggregate the data using SQL. 
@@ -111,6 +469,13 @@ class SQLiteDI(DataSetInterface):
         This method is currently only used to compute the log likelihood of the model given the data using :meth:`learners.cpdlearners.CPDTabularLearner.loglikelihood`.
         
         :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: :class:`.ResultSet`
+        '''
+        return self.execute(self.statement(self.sqlFullAggCPDdata,attribute))
+
+    def sqlFullAggCPDdata(self, attribute):
+        '''
+        Returns the SQL statement executed by :meth:`.loadFullAggCPDdata`
         '''
 
 
@@ -165,17 +530,33 @@ class SQLiteDI(DataSetInterface):
         attributes
         '''        
         #logging.debug(sqlQuery)
-        self.cur.execute(sqlQuery)
+        return sqlQuery
 
 
             
     def loadFullCPDdata(self, attribute):
         '''
-        We pass an `attribute`, and constructe a query such that the result set `self.cur` contains all the 
+        We pass an `attribute`, and constructe a query such that the result set contains all the 
         data to learn the local distribution of that `attribute`. The `Full` in the name indicates that we don't 
         `COUNT` all occurences in the query but in the learner instead. This method is used by :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsFull`.
         
         :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: :class:`.ResultSet`
+        '''
+        return self.execute(self.statement(self.sqlFullCPDdata,attribute))
+
+    def loadFullCPDcolumns(self, attribute):
+        '''
+        Executes the query of :meth:`.loadFullCPDdata` and reads the result set column by column in batches of :attr:`COLUMN_FETCH_SIZE` rows (see :meth:`.ResultSet.columns`). This method is used by :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsFull`, which counts the assignments of a whole batch at once.
+
+        :arg attribute: Subclass of :class:`prm.attribute.Attribute`
+        :returns: Generator of lists of :class:`numpy.array` instances, [`attributeValues`,`parentValues1`,`parentValues2`,....]
+        '''
+        return self.execute(self.statement(self.sqlFullCPDdata,attribute),fetchSize=COLUMN_FETCH_SIZE).columns()
+
+    def sqlFullCPDdata(self, attribute):
+        '''
+        Returns the SQL statement executed by :meth:`.loadFullCPDdata`
         '''
         
                                 
@@ -224,7 +605,7 @@ class SQLiteDI(DataSetInterface):
         attributes
         '''        
         #logging.debug(sqlQuery)
-        self.cur.execute(sqlQuery)        
+        return sqlQuery        
                 
     #@time_analysis
     def loadObjects(self, qvar):
@@ -240,28 +621,38 @@ class SQLiteDI(DataSetInterface):
             * If qvar.erClass is `rates` : [rates.rating, rates.user_id,rates.item_id]
         
         :arg qvar: :class:`inference.query.Qvariable`
+        :returns: :class:`.ResultSet`
+        '''
+        if qvar.objs.pkValues:
+            self.bindKeys(qvar.attr.erClass.pk,qvar.objs.pkValues)
+        return self.execute(self.statement(self.sqlObjects,qvar.attr,bool(qvar.objs.pkValues)))
+
+    def sqlObjects(self, attr, bound):
+        '''
+        Returns the SQL statement executed by :meth:`.loadObjects`
+
+        :arg attr: :class:`.Attribute` of the query variable
+        :arg bound: If `True` the attribute objects whose keys are bound in the temporary table are selected (see :meth:`.bindKeys`), otherwise all attribute objects
         '''
         
-        sqlAttribute = '%s,%s'%(qvar.attr.fullname,",".join( [pk.fullname for pk in qvar.erClass.pk ] ))
+        sqlAttribute = '%s,%s'%(attr.fullname,",".join( [pk.fullname for pk in attr.erClass.pk ] ))
         #sqlAttribute = qvar.attr.fullname
         
         # We are only loading data from one table
-        sqlTable = qvar.erClass.name
+        sqlTable = attr.erClass.name
                 
         # The where clause is defined by the qvar.objs, the primary key(s) of of the erClass
         '''
         qbvar.objs.pkValues = [(pk1Val,pk2Val,..),(pk1Val,pk2Val,..),(pk1Val,pk2Val,..),.....]
         attr.erClass.pk = [pk1,pk2,...]
         
-        sqlWhere = 
-        
-        
-        
+        The primary key values are bound in a temporary table that is joined, see `bindKeys()`
         '''
-        query_where = [' AND '.join(['%s=%s'%(pk.fullname,pkVal) for (pk,pkVal) in zip(pks,pksValue)]) for (pks, pksValue) in zip(repeat(qvar.attr.erClass.pk), qvar.objs.pkValues)]
-        query_where = ['(%s)'%pkStr for pkStr in query_where]
-        
-        sqlWhere = ' OR '.join(query_where)        
+        sqlWhere = ''
+        if bound:
+            (keyTable,query_where) = self.keyTable(attr.erClass.pk)
+            sqlTable = '%s,%s'%(sqlTable,keyTable)
+            sqlWhere = ' AND '.join(query_where)
                                         
         '''
         sqlWhere = ''
@@ -279,7 +670,7 @@ class SQLiteDI(DataSetInterface):
         
         #logging.debug(sqlQuery)
         
-        self.cur.execute(sqlQuery)
+        return sqlQuery
         
     
     def loadDependencyParentObjects(self, dep, gbnVertices):
@@ -294,7 +685,15 @@ class SQLiteDI(DataSetInterface):
         
         :arg dep: :class:`prm.dependency.Dependency`
         :arg gbnVertices: A list of :class:`network.groundBN.GBNvertex`
+        :returns: :class:`.ResultSet`
         """
+        self.bindKeys(dep.child.erClass.pk,[v.obj for v in gbnVertices])
+        return self.execute(self.statement(self.sqlDependencyParentObjects,dep))
+
+    def sqlDependencyParentObjects(self, dep):
+        '''
+        Returns the SQL statement executed by :meth:`.loadDependencyParentObjects`, the keys of the child objects are joined from the temporary table (see :meth:`.bindKeys`)
+        '''
         
         '''
         Aggregation on the data level doesn't work well, legacy comment:
@@ -351,42 +750,21 @@ class SQLiteDI(DataSetInterface):
                 
         '''
         Adding obj values to were clause. As an obj is identified by possibly multiple primary key values, the
-        where clause looks like this:
-            WHERE ..(slotchain_where)... AND ( (ob1_pk1=val AND ob1_pk2=val...) OR ((ob2_pk1=val AND ob2_pk2=val...)), .....)
+        keys are bound in a temporary table (see `bindKeys()`) that is joined with the child primary keys:
+            WHERE ..(slotchain_where)... AND child_pk1=TEMP_KEYS.k0 AND child_pk2=TEMP_KEYS.k1 ...
         ''' 
-        query_obj = []
-        for v in gbnVertices:   
-            temp_obj = []         
-            for (pk_i,obj_i) in zip(v.attr.erClass.pk,v.obj): #and obj contains a index for every pk of the v.attr.erClass (=dep.child.erclass)
-                temp_obj.append('%s=%s'%(pk_i.fullname,obj_i))
-            query_obj.append('(%s)'%(' AND '.join(temp_obj)))
+        (keyTable,query_obj) = self.keyTable(dep.child.erClass.pk)
+        query_tables.append(keyTable)
+        query_where.extend(query_obj)
                 
         sqlAttr = ','.join(query_attrs)
         sqlFrom = ','.join(query_tables)
         sqlWhere = ' AND '.join(query_where)
-        sqlObj = ' OR '.join(query_obj)
-        
-        sqlQuery = ''
-        if sqlWhere!='':
-            #slotchain present
-            sqlQuery = "SELECT %s FROM %s WHERE %s AND (%s);"%(sqlAttr,sqlFrom,sqlWhere,sqlObj) 
-        else:
-            #no slotchain
-            sqlQuery = "SELECT %s FROM %s WHERE (%s);"%(sqlAttr,sqlFrom,sqlObj) 
         
-                
-        
-        # #HACK HACK HACK : just remove objects where clause (also introduced hack in engine.py)
-        # if len(query_obj)>900:
-        #     if sqlWhere!='':
-        #         sqlQuery = "SELECT %s FROM %s WHERE %s;"%(sqlAttr,sqlFrom,sqlWhere)                         
-        #     else:
-        #         sqlQuery = "SELECT %s FROM %s;"%(sqlAttr,sqlFrom)                         
-        #     #print 'WARNING : QUERY TOO LONG'
-            
+        sqlQuery = "SELECT %s FROM %s WHERE %s;"%(sqlAttr,sqlFrom,sqlWhere) 
         
         #print '\nLOAD parents for dep %s:\n%s\n'%(dep.name,sqlQuery)
-        self.cur.execute(sqlQuery)
+        return sqlQuery
 
     
     def loadDependencyChildrenObjects(self, dep, gbnVertices):
@@ -400,7 +778,15 @@ class SQLiteDI(DataSetInterface):
         
         :arg dep: :class:`prm.dependency.Dependency`
         :arg gbnVertices: A list of :class:`network.groundBN.GBNvertex`
+        :returns: :class:`.ResultSet`
         """
+        self.bindKeys(dep.parent.erClass.pk,[v.obj for v in gbnVertices])
+        return self.execute(self.statement(self.sqlDependencyChildrenObjects,dep))
+
+    def sqlDependencyChildrenObjects(self, dep):
+        '''
+        Returns the SQL statement executed by :meth:`.loadDependencyChildrenObjects`, the keys of the parent objects are joined from the temporary table (see :meth:`.bindKeys`)
+        '''
                                        
         # attributes list
         query_attrs = []
@@ -419,58 +805,41 @@ class SQLiteDI(DataSetInterface):
         
         '''
         Adding obj values to were clause. As an obj is identified by possibly multiple primary key values, the
-        where clause looks like this:
-            WHERE ..(slotchain_where)... AND ( (ob1_pk1=val AND ob1_pk2=val...) OR ((ob2_pk1=val AND ob2_pk2=val...)), .....)
+        keys are bound in a temporary table (see `bindKeys()`) that is joined with the parent primary keys:
+            WHERE ..(slotchain_where)... AND parent_pk1=TEMP_KEYS.k0 AND parent_pk2=TEMP_KEYS.k1 ...
         ''' 
-        query_obj = []
-        
-        #from IPython.Shell import IPShellEmbed
-        #IPShellEmbed()()
-        
-        for v in gbnVertices: 
-            temp_obj = []         
-            for (pk_i,obj_i) in zip(v.attr.erClass.pk,v.obj): #and obj contains a index for every pk of the v.attr.erClass (=dep.child.erclass)
-                temp_obj.append('%s=%s'%(pk_i.fullname,obj_i))
-            query_obj.append('(%s)'%(' AND '.join(temp_obj)))
-
+        (keyTable,query_obj) = self.keyTable(dep.parent.erClass.pk)
+        query_tables.append(keyTable)
+        query_where.extend(query_obj)
 
         sqlAttr = ','.join(query_attrs)
         sqlFrom = ','.join(query_tables)
         sqlWhere = ' AND '.join(query_where)
-        sqlObj = ' OR '.join(query_obj)
-        
-        '''
-        sqlGroupBy = ','.join(dep.parent.erClass.pk_string)
-        sqlQuery = "SELECT %s FROM %s WHERE %s AND (%s) GROUP BY %s;"%(sqlAttr,sqlFrom,sqlWhere,sqlObj,sqlGroupBy) 
-        '''
-        
-        sqlQuery = ''        
-        if sqlWhere!='':
-            #slotchain present
-            sqlQuery = "SELECT %s FROM %s WHERE %s AND (%s);"%(sqlAttr,sqlFrom,sqlWhere,sqlObj) 
-        else:
-            #no slotchain
-            sqlQuery = "SELECT %s FROM %s WHERE (%s);"%(sqlAttr,sqlFrom,sqlObj) 
         
-        # #HACK HACK HACK : just remove objects where clause (also introduced hack in engine.py)
-        # if len(query_obj)>900:
-        #     if sqlWhere!='':
-        #         sqlQuery = "SELECT %s FROM %s WHERE %s;"%(sqlAttr,sqlFrom,sqlWhere)                         
-        #     else:
-        #         sqlQuery = "SELECT %s FROM %s;"%(sqlAttr,sqlFrom)                         
-        #     #print 'WARNING : QUERY TOO LONG'
+        sqlQuery = "SELECT %s FROM %s WHERE %s;"%(sqlAttr,sqlFrom,sqlWhere) 
         
         #print '\nLOAD children for dep %s:\n%s\n'%(dep.name,sqlQuery)
-        self.cur.execute(sqlQuery)
+        return sqlQuery
     
     def loadAttributeParentObjects(self, attr, gbnVertices):
         """
         Given a set of children objects obj for a given attribute attr, we are loading the set of parents (for all depenencies that `attr` is a child of). This method is not used because it performs poor compared to :meth:`loadDependencyChildrenObjects` and :meth:`loadDependencyParentObjects`.
+
+        :returns: :class:`.ResultSet`, `None` if `attr` has no parents
         """
                      
         #if there are no parents we can't do anything
         if len(attr.dependenciesChild) == 0:
             return None              
+
+        self.bindKeys(attr.erClass.pk,[v.obj for v in gbnVertices])
+        return self.execute(self.statement(self.sqlAttributeParentObjects,attr))
+
+    def sqlAttributeParentObjects(self, attr):
+        '''
+        Returns the SQL statement executed by :meth:`.loadAttributeParentObjects`, the keys of the child objects are joined from the temporary table (see :meth:`.bindKeys`)
+        '''
+                     
         # attributes list
         query_attrs = []
         query_attrs.extend(attr.erClass.pk_string) # to identify the child vertex     
@@ -519,21 +888,18 @@ class SQLiteDI(DataSetInterface):
                 for pk_i in attr.erClass.pk:
                     query_where.append('%s=%s.%s'%(pk_i.fullname,dep.name,pk_i.name))
         
-        # adding obj values to were clause
-        query_obj = []
-        for v in gbnVertices:            
-            for (pk_i,obj_i) in zip(attr.erClass.pk,v.obj):
-                query_obj.append('%s=%s'%(pk_i.fullname,obj_i))
-            
+        # adding obj values to were clause, the keys are bound in a temporary table
+        (keyTable,query_obj) = self.keyTable(attr.erClass.pk)
+        query_tables.append(keyTable)
+        query_where.extend(query_obj)
         
         sqlAttr = ','.join(query_attrs)
         sqlFrom = ','.join(query_tables)
         sqlWhere = ' AND '.join(query_where)
-        sqlObj = ' OR '.join(query_obj)
         
-        sqlQuery = "SELECT %s FROM %s WHERE %s AND (%s);"%(sqlAttr,sqlFrom,sqlWhere,sqlObj) 
+        sqlQuery = "SELECT %s FROM %s WHERE %s;"%(sqlAttr,sqlFrom,sqlWhere) 
         #logging.debug(sqlQuery)
-        self.cur.execute(sqlQuery)
+        return sqlQuery
 
     def loadAttributeObjects(self, attr ):
         '''
@@ -544,6 +910,13 @@ class SQLiteDI(DataSetInterface):
         |   < attr indentification > < attr  > 
 
         :arg attr: :class:`.Attribute`
+        :returns: :class:`.ResultSet`
+        '''
+        return self.execute(self.statement(self.sqlAttributeObjects,attr))
+
+    def sqlAttributeObjects(self, attr):
+        '''
+        Returns the SQL statement executed by :meth:`.loadAttributeObjects`
         '''
 
         sqlAttribute = '%s,%s'%(",".join( [pk.fullname for pk in attr.erClass.pk ] ),attr.fullname)
@@ -557,7 +930,7 @@ class SQLiteDI(DataSetInterface):
         
         # logging.debug(sqlQuery)
         
-        self.cur.execute(sqlQuery)
+        return sqlQuery
 
     def loadExistParents(self, refGbnV, existdep ):
         '''
@@ -569,11 +942,22 @@ class SQLiteDI(DataSetInterface):
 
         :arg refGbnV: :class:`.ReferenceVertex`
         :arg existdep: :class:`.Dependency` with the exist attribute as child
+        :returns: :class:`.ResultSet`
         '''
+        (sqlQuery,bindObj) = self.statement(self.sqlExistParents,refGbnV.dependency,existdep)
+        if bindObj:
+            return self.execute(sqlQuery,tuple(refGbnV.refGBNvertex.obj))
+        else:
+            return self.execute(sqlQuery)
 
-        #  uncertain dependency
-        dep = refGbnV.dependency
-    
+    def sqlExistParents(self, dep, existdep):
+        '''
+        Returns the SQL statement executed by :meth:`.loadExistParents`
+
+        :arg dep: The uncertain :class:`.Dependency`
+        :arg existdep: :class:`.Dependency` with the exist attribute as child
+        :returns: Tuple `(sqlQuery,bindObj)`, if `bindObj` is `True` the statement has one parameter for every primary key of the n-side attribute object
+        '''
 
         k_attr_id = ",".join( [pk.fullname for pk in dep.kAttribute.erClass.pk ])
         parent_id = ",".join( [pk.fullname for pk in existdep.parent.erClass.pk ])
@@ -601,12 +985,13 @@ class SQLiteDI(DataSetInterface):
 
         # where clause
         where = []
+        bindObj = False
 
         if dep.nAttribute.erClass.name in tables:
-            # if the n-side is in the FROM tables, then the exist dependency 'exits' through the n-side. Only the parents for the n-side attribute object that is referenced by the referenceVertex have to be loaded
-            gbnV = refGbnV.refGBNvertex        
-            for (pk_i,obj_i) in zip(gbnV.attr.erClass.pk,gbnV.obj):
-                where.append('%s=%s'%(pk_i.fullname,obj_i))
+            # if the n-side is in the FROM tables, then the exist dependency 'exits' through the n-side. Only the parents for the n-side attribute object that is referenced by the referenceVertex have to be loaded, its keys are bound as parameters
+            for pk_i in dep.nAttribute.erClass.pk:
+                where.append('%s=?'%pk_i.fullname)
+            bindObj = True
 
         if not len(existdep.slotchain_erclass_exclusive[dep.uncertainRelationship]) == 0:
             # as the uncertain relationship doesn't contain any data, only the slotchain entries that don't contain it are needed in the whereclause
@@ -622,28 +1007,132 @@ class SQLiteDI(DataSetInterface):
                        
         logging.debug(sqlQuery)
 
-        
-        self.cur.execute(sqlQuery)
+        return (sqlQuery,bindObj)
 
     
+    def indexes(self, table):
+        '''
+        Returns the column lists of all indexes of `table`, including the primary key of a `rowid` table (an `INTEGER PRIMARY KEY` column).
+
+        :arg table: Name of the table
+        :returns: List of lists of column names
+        '''
+        indexes = []
+        columns = self.connection().con.execute('PRAGMA table_info(%s);'%table).fetchall()
+        pkColumns = [c for c in columns if c[5] > 0]
+        if len(pkColumns) == 1 and pkColumns[0][2].upper() == 'INTEGER':
+            indexes.append([pkColumns[0][1]])
+
+        for index in self.connection().con.execute('PRAGMA index_list(%s);'%table).fetchall():
+            info = self.connection().con.execute('PRAGMA index_info(%s);'%index[1]).fetchall()
+            indexes.append([c[2] for c in sorted(info)])
+        return indexes
+
+    def requiredIndexes(self, prm):
+        '''
+        Returns the indexes needed by the slotchain joins of the `loadXXX()` methods:
+
+        * The primary key of every entity and relationship
+        * For every foreign key of a relationship, an index starting with the foreign key followed by the other primary key columns. A slotchain can join the relationship from any of its entities.
+        * For every dependency, covering indexes `(pk,attribute)` of the parent and child attributes, the attribute values are read from the index
+
+        :arg prm: The :mod:`prm.prm` module
+        :returns: List of tuples `(table,[column,...])`
+        '''
+        required = []
+        def require(table,columns):
+            if (table,columns) not in required:
+                required.append((table,columns))
+
+        for er in prm.entities.values() + prm.relationships.values():
+            pkColumns = [pk.name for pk in er.pk]
+            require(er.name,pkColumns)
+            if not er.isEntity():
+                for fa in er.pk:
+                    require(er.name,[fa.name] + [c for c in pkColumns if c != fa.name])
+
+        for dep in prm.dependencies.values():
+            if dep.uncertain:
+                continue
+            for attr in [dep.parent,dep.child]:
+                require(attr.erClass.name,[pk.name for pk in attr.erClass.pk] + [attr.name])
+
+        return required
+
+    def createIndexes(self, prm):
+        '''
+        Creates the indexes returned by :meth:`.requiredIndexes` that are missing, i.e. that are not the prefix of an existing index. The indexes are named `PROBREM_<table>_<columns>`.
+
+        :arg prm: The :mod:`prm.prm` module
+        :returns: List of the names of the created indexes
+        '''
+        created = []
+        for (table,columns) in self.requiredIndexes(prm):
+            existing = self.indexes(table)
+            if [index for index in existing if index[:len(columns)] == columns]:
+                continue
+            name = 'PROBREM_%s_%s'%(table,'_'.join(columns))
+            logging.info('\tCreating index %s on %s(%s)'%(name,table,','.join(columns)))
+            self.connection().cur.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s);'%(name,table,','.join(columns)))
+            created.append(name)
+        return created
+
+    def analyze(self):
+        '''
+        Gathers the statistics about the tables and indexes used by the SQLite query planner (`ANALYZE`)
+        '''
+        self.connection().cur.execute('ANALYZE;')
+
+    def explainQueries(self, prm):
+        '''
+        Computes the query plans (`EXPLAIN QUERY PLAN`) of the load statements of all dependencies and probabilistic attributes. They are logged, a full scan of a data table in a statement that selects objects by key (i.e. a statement used to unroll the GBN) is logged as a warning.
+
+        :arg prm: The :mod:`prm.prm` module
+        :returns: Dictionary `{ statement : [plan detail,...] }`
+        '''
+        statements = []
+        for attr in prm.attributes.values():
+            if attr.probabilistic:
+                statements.append(self.statement(self.sqlFullCPDdata,attr))
+        for dep in prm.dependencies.values():
+            if not dep.uncertain:
+                statements.append(self.statement(self.sqlDependencyParentObjects,dep))
+                statements.append(self.statement(self.sqlDependencyChildrenObjects,dep))
+
+        plans = {}
+        for sqlQuery in statements:
+            plans[sqlQuery] = [row[-1] for row in self.connection().con.execute('EXPLAIN QUERY PLAN %s'%sqlQuery).fetchall()]
+            logging.info('Query plan of %s'%sqlQuery)
+            for detail in plans[sqlQuery]:
+                if 'TEMP_KEYS' in sqlQuery and detail.startswith('SCAN') and 'INDEX' not in detail and 'TEMP_KEYS' not in detail:
+                    logging.warning('\t%s (full table scan)'%detail)
+                else:
+                    logging.info('\t%s'%detail)
+        return plans
+    
     def retrieveRow(self):
         '''
-        After executing a `loadXXX()` method, the cursor `self.cur` contains the result set
-        for a specific SQL query. This method returns the next row in the result set, which 
+        After executing a `loadXXX()` method, :attr:`.Connection.result` contains the result set
+        for a specific SQL query. This method returns the next row in the result set (`None` if all rows have been read), which 
         allows a caller, e.g. :meth:`learners.cpdlearners.CPDTabularLearner.learnCPDsFull` or :meth:`inference.engine.unrollGBN`, to iterate over all rows without knowledge about the data interface.
         '''
-        return self.cur.fetchone()
+        return next(self.connection().result,None)
 
     def resultSet(self):
         '''
-        We return the the cursor which is an iterable result set of the executed query (after executing a `loadXXX()` method).
+        We return the iterable result set of the last query executed by the current thread (after executing a `loadXXX()` method), i.e. the :class:`.ResultSet` that the `loadXXX()` method returned.
         The result set can then be iterated like this in the caller method::
 
             for currentRow in dsi.resultSet():
                 do something with `currentRow`
 
+        As every query has its own result set, multiple result sets can be consumed at the same time::
+
+            parents = dsi.loadDependencyParentObjects(dep,gbnVertices)
+            children = dsi.loadDependencyChildrenObjects(dep,gbnVertices)
+
         '''
-        return self.cur
+        return self.connection().result
     
     def createView(self,dep):                
         '''         
@@ -669,9 +1158,11 @@ class SQLiteDI(DataSetInterface):
         sqlGroup = pk_string
         sqlCreate = "CREATE VIEW IF NOT EXISTS %s AS SELECT %s FROM %s WHERE %s GROUP BY %s;"%(dep.name,sqlAttr,sqlFrom,sqlWhere,sqlGroup) 
         #print sqlCreate
-        self.cur.execute(sqlCreate)
+        self.connection().cur.execute(sqlCreate)
         
         
     def __repr__(self):
         ''' String representation for SQLite DI '''
+        if self.mode:
+            return '%s DataSet Interface connecting to %s (%s)'%(self.dsiType,self.path.split('/')[-1],','.join(self.mode))
         return '%s DataSet Interface connecting to %s'%(self.dsiType,self.path.split('/')[-1])
\ No newline at end of file
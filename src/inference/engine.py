@@ -17,7 +17,11 @@ There are different algorithms that will need to perform inference:
 import logging
 
 from network.groundBN import GBNGraph,GBNqueue
-from network.vertices import GBNvertex,ReferenceVertex,computeID,computeERID
+from network.vertices import GBNvertex,ReferenceVertex,computeID,computeERID,registry
+from network.compiled import CompiledGBN
+
+from data.prefetch import Prefetcher
+from data.cache import NeighbourhoodCache
 
 from analytics.performance import time_analysis
 
@@ -39,7 +43,7 @@ At this point, only one ground Bayesian network exists, :attr:`.GBN`. If posteri
 We could envision a dict() of ground Bayesian networks. Note that copy.deepcopy() doesn't work as it would also copy all other istances, e.g. :class:`.Attribute` objects.
  
 
-For now, changes are run sequentially and the convergence diagnostics are run on the collected samples of the :mod:`.posterior`.
+The chains can be run in parallel worker processes using :mod:`.parallel`, every forked worker process has its own copy of :attr:`.GBN`. Otherwise the chains are run sequentially. In both cases the convergence diagnostics are run on the collected samples of the :mod:`.posterior`.
 '''
 
 GBN = GBNGraph()
@@ -50,6 +54,53 @@ gbnQ = GBNqueue()
 ''':class:`.GBNqueue` data structure used to unroll the GBN
 '''
 
+compiledGBN = None
+''':class:`.CompiledGBN` instance of :attr:`.GBN`, compiled by :meth:`.compileGBN` after unrolling if the inference algorithm samples on the compiled arrays (`inferenceAlgo.COMPILED`)
+'''
+
+
+PIPELINE = True
+'''
+If `True`, :meth:`.unrollGBN` is pipelined: while the result sets of one attribute in the :attr:`.gbnQ` are turned into vertices, the parent and children queries of the next attribute are executed by the :attr:`.prefetcher` thread. It requires a data interface that can be read by multiple threads (see :meth:`.DataSetInterface.threadSafe`), otherwise the GBN is unrolled serially.
+'''
+
+prefetcher = None
+''':class:`.Prefetcher` of the dataset used to unroll the GBN, it is created by the first pipelined :meth:`.unrollGBN`
+'''
+
+CACHE = True
+'''
+If `True`, the parents and children of the attribute objects are cached across queries in the :attr:`.neighbourhoodCache`, only the objects that are not cached are queried (see :meth:`.loadRows`)
+'''
+
+neighbourhoodCache = None
+''':class:`.NeighbourhoodCache` of the dataset used to unroll the GBN, it is created by the first :meth:`.unrollGBN` if :attr:`.CACHE` is `True`
+'''
+
+prefetchedMisses = {}
+'''
+Dictionary `{ (method,dep,id(gbnVertices)) : missing vertices }` of the batches submitted to the :attr:`.prefetcher` while :attr:`.CACHE` is `True`, only the queries of the vertices that were missing in the :attr:`.neighbourhoodCache` are prefetched
+'''
+
+INCREMENTAL = False
+'''
+If `True`, :meth:`.infer` doesn't unroll a new GBN for every query. The :attr:`.GBN` of the previous query is updated by :meth:`.updateGBN`: the vertices of the previous query and the neighbourhoods loaded so far are reused, only the missing parts are loaded from the data.
+'''
+
+neighbours = {}
+'''
+Dictionary `{ (method,dep,vertex ID) : list of (ID,obj,value) }` with the parent (`method='loadDependencyParentObjects'`) and children (`method='loadDependencyChildrenObjects'`) attribute objects of the vertices unrolled by :meth:`.updateGBN`. It is kept across queries and cleared by :meth:`.reset` or if the data changes.
+'''
+
+recycled = {}
+'''
+Dictionary `{ vertex ID : GBNvertex }` of the detached vertices of previous queries that are not part of the current :attr:`.GBN`, they are reused by :meth:`.updateGBN` if they are needed again
+'''
+
+incrementalState = None
+'''
+Tuple `(dsi,data version)` of the dataset that :attr:`.neighbours` and :attr:`.recycled` were loaded from, see :meth:`.DataSetInterface.dataVersion`
+'''
 
 inferenceAlgo = None
 '''
@@ -63,9 +114,9 @@ query = None
     
 def reset():
     """
-    Resets the :class:`GBNGraph` and :class:`GBNqueue` instances.
+    Resets the :class:`GBNGraph` and :class:`GBNqueue` instances, including the vertices and neighbourhoods kept by :meth:`.updateGBN`.
     """
-    global GBN,gbnQ
+    global GBN,gbnQ,compiledGBN,incrementalState
     
     for gbnV in GBN.values():
         del gbnV
@@ -73,6 +124,10 @@ def reset():
     del gbnQ
     GBN = GBNGraph()
     gbnQ = GBNqueue()
+    compiledGBN = None
+    neighbours.clear()
+    recycled.clear()
+    incrementalState = None
 
     
 @time_analysis
@@ -82,7 +137,8 @@ def infer(queryI):
     Runs inference for `query` by 
         
     * Resetting GBN
-    * Unrolling GBN
+    * Unrolling GBN (or updating the GBN of the previous query if :attr:`.INCREMENTAL` is `True`)
+    * Compiling GBN (if the inference algorithm uses the compiled arrays)
     * Initialize inference algorithm
     * Run inference and collect posterior samples        
     
@@ -91,11 +147,17 @@ def infer(queryI):
     query = queryI
     logging.info('Inference for: %s'%query)
         
-    reset()
-    #unrolling the ground bayes net
-    unrollGBN()
+    if INCREMENTAL:
+        updateGBN()
+    else:
+        reset()
+        #unrolling the ground bayes net
+        unrollGBN()
     
     logging.info(GBN)
+
+    if inferenceAlgo.COMPILED:
+        compileGBN()
         
     inferenceAlgo.run()
     # logging.debug('inferenceAlgo.run() is commented')
@@ -112,17 +174,29 @@ def unrollGBN():
     .. note::
         Add proper description of algorithm
     
-    
+    If :attr:`.PIPELINE` is `True`, the next batch of the queue is popped before the current batch is processed and its queries are submitted to the :attr:`.prefetcher` (see :meth:`.prefetchBatch`). Vertices that are pushed for the attribute of the next batch in the meantime form a new batch. 
     
     '''
-    
+    global prefetcher,neighbourhoodCache
     
 
     # TODO : FIX THE CROSS VALIDATION. WE DON'T WANT TO QUERY K DIFFERENT FOLDS 
     # WHEN UNROLLING. JUST ONE, THE TRAINING SET FOLD
     dsi = DI.DSI[0]
     
+    pipelined = PIPELINE and dsi.threadSafe()
+    if pipelined:
+        if prefetcher is None or prefetcher.dsi is not dsi:
+            if prefetcher is not None:
+                prefetcher.close()
+            prefetcher = Prefetcher(dsi)
+        prefetcher.clear()
+    prefetchedMisses.clear()
     
+    if CACHE:
+        if neighbourhoodCache is None or neighbourhoodCache.dsi is not dsi:
+            neighbourhoodCache = NeighbourhoodCache(dsi)
+        neighbourhoodCache.validate()
     
     # add the inference (event) variables to the GBN 
     for qvar in query.event:
@@ -151,15 +225,18 @@ def unrollGBN():
     # logging.info('\t%s'%' '.join([gbnV.ID for gbnV in GBN.values()]))
 
     # add all the parents of the inference nodes
-    while not gbnQ.isEmpty():
-        (attr,gbnVertices) = gbnQ.pop()
+    batch = popBatch()
+    while batch is not None:
+        (attr,gbnVertices,gbnVerticesNotInE) = batch
         
         #logging.info('Handling attribute %s with %s gbn vertices'%(attr.fullname,len(gbnVertices)))
         
-        #filtering the gbn vertices that are part of the evidence
-
-        gbnVerticesNotInE = filter(lambda gbnV: not query.gbnVertexInEvidence(gbnV), gbnVertices)
-        #logging.debug("gbnVerticesNotInE: %s"%gbnVerticesNotInE)
+        #the queries of the next batch are executed while the current batch is processed
+        nextBatch = None
+        if pipelined:
+            nextBatch = popBatch()
+            if nextBatch is not None:
+                prefetchBatch(nextBatch)
         
         #We load the parents. Note that the parents are also loaded for gbnVertices that are in 
         #the evidence to cover the V-structure effect (explaining away)
@@ -172,6 +249,242 @@ def unrollGBN():
             addChildren(attr,gbnVerticesNotInE)
         
         #logging.info('Done Handling %s'%(attr.fullname))
+        
+        if nextBatch is None:
+            nextBatch = popBatch()
+        batch = nextBatch
+
+def updateGBN():
+    '''
+    Updates the :attr:`.GBN` of the previous query for the current :attr:`.query`, used instead of :meth:`.reset` and :meth:`.unrollGBN` if :attr:`.INCREMENTAL` is `True`.
+
+    The GBN is traversed in the same way as by :meth:`.unrollGBN`, starting from the event vertices. The parents and children of a vertex are loaded from the data only once and kept in :attr:`.neighbours` (see :meth:`.loadNeighbours`). The vertices of the previous GBN and the :attr:`.recycled` vertices are reused, their event and evidence flags are re-stamped. The edges of the previous GBN are kept if they are still needed, the missing edges are added and the others removed. The vertices of the previous GBN that are outside of the new d-separated subgraph are detached and recycled.
+
+    The neighbourhoods are discarded if the data has changed (see :meth:`.DataSetInterface.dataVersion`). Reference uncertainty is not supported, the GBN is unrolled from scratch if the PRM has uncertain dependencies.
+    '''
+    global GBN,gbnQ,compiledGBN,incrementalState
+
+    dsi = DI.DSI[0]
+
+    if [dep for dep in PRM.dependencies.values() if dep.uncertain]:
+        reset()
+        unrollGBN()
+        return
+
+    state = (dsi,dsi.dataVersion())
+    if state != incrementalState:
+        reset()
+        incrementalState = state
+
+    previous = GBN
+    GBN = GBNGraph()
+    gbnQ = GBNqueue()
+    compiledGBN = None
+
+    edges = set()
+    # the edges of the new GBN `(parent ID, child ID)`
+
+    def addVertex(ID,attr,obj,event=False,fixed=False,value=None):
+        gbnV = previous[ID]
+        if gbnV is None:
+            gbnV = recycled.pop(ID,None)
+        if gbnV is None:
+            gbnV = GBNvertex(ID=ID,attr=attr,obj=obj)
+        gbnV.restamp(event=event,fixed=fixed,value=value)
+        GBN.insertVertex(gbnV)
+        return gbnV
+
+    # add the inference (event) variables to the GBN
+    for qvar in query.event:
+        dsi.loadObjects(qvar)
+        for row in dsi.resultSet():
+            vertexID = computeID(qvar.attr,row[1:])
+            if vertexID not in GBN:
+                GBN.eventVertices[vertexID] = addVertex(vertexID,qvar.attr,row[1:],event=True)
+                gbnQ.push(GBN[vertexID])
+
+    batch = popBatch()
+    while batch is not None:
+        (attr,gbnVertices,gbnVerticesNotInE) = batch
+
+        # parents, also of the vertices in the evidence (explaining away)
+        for dep in attr.dependenciesChild:
+            loaded = loadNeighbours(dsi,'loadDependencyParentObjects',dep,gbnVertices)
+            for gbnV in gbnVertices:
+                for (parent_ID,parent_obj,parent_val) in loaded[gbnV.ID]:
+                    if parent_ID not in GBN:
+                        if not query.objInEvidence(dep.parent,parent_ID):
+                            gbnQ.push(addVertex(parent_ID,dep.parent,parent_obj))
+                        elif parent_val is not None:
+                            addVertex(parent_ID,dep.parent,parent_obj,fixed=True,value=parent_val)
+                        else:
+                            continue
+                    edges.add((parent_ID,gbnV.ID))
+
+        # children, only of the vertices that are not in the evidence
+        if gbnVerticesNotInE:
+            for dep in attr.dependenciesParent:
+                loaded = loadNeighbours(dsi,'loadDependencyChildrenObjects',dep,gbnVerticesNotInE)
+                for gbnV in gbnVerticesNotInE:
+                    for (child_ID,child_obj,child_val) in loaded[gbnV.ID]:
+                        if child_ID not in GBN:
+                            if not query.objInEvidence(dep.child,child_ID):
+                                gbnQ.push(addVertex(child_ID,dep.child,child_obj))
+                            elif child_val is not None:
+                                gbnQ.push(addVertex(child_ID,dep.child,child_obj,fixed=True,value=child_val))
+                            else:
+                                continue
+                        edges.add((gbnV.ID,child_ID))
+
+        batch = popBatch()
+
+    # detach and recycle the vertices that are not needed anymore
+    for (ID,gbnV) in previous.iteritems():
+        if ID not in GBN:
+            gbnV.detach()
+            recycled[ID] = gbnV
+
+    # remove the edges of the previous GBN that are not needed anymore, add the missing ones
+    for gbnV in GBN.itervalues():
+        for parentVs in gbnV.parents.values():
+            for parentV in [parentV for (parent_ID,parentV) in parentVs.iteritems() if (parent_ID,gbnV.ID) not in edges]:
+                gbnV.removeParent(parentV)
+    for (parent_ID,child_ID) in edges:
+        GBN[child_ID].addParent(GBN[parent_ID])
+
+    logging.debug('GBN updated: %s vertices (%s recycled), %s neighbourhoods loaded'%(len(GBN),len(recycled),len(neighbours)))
+
+def loadNeighbours(dsi, method, dep, gbnVertices):
+    '''
+    Returns the parent or children attribute objects of the vertices, the neighbourhoods that are not in :attr:`.neighbours` yet are loaded with :meth:`.loadRows`
+
+    :arg dsi: :class:`.DataSetInterface` instance
+    :arg method: `loadDependencyParentObjects` or `loadDependencyChildrenObjects`
+    :arg dep: :class:`.Dependency`
+    :arg gbnVertices: List of :class:`.GBNvertex` instances
+    :returns: Dictionary `{ vertex ID : list of (ID,obj,value) }`
+    '''
+    missing = [gbnV for gbnV in gbnVertices if (method,dep,gbnV.ID) not in neighbours]
+    if missing:
+        if method == 'loadDependencyParentObjects':
+            (boundAttr,otherAttr) = (dep.child,dep.parent)
+        else:
+            (boundAttr,otherAttr) = (dep.parent,dep.child)
+        n_bound_pk = len(boundAttr.erClass.pk)
+        end_other_pk = n_bound_pk+len(otherAttr.erClass.pk)
+
+        for gbnV in missing:
+            neighbours[(method,dep,gbnV.ID)] = []
+        for row in loadRows(dsi,method,dep,missing):
+            other_obj = row[n_bound_pk:end_other_pk]
+            neighbours[(method,dep,computeID(boundAttr,row[0:n_bound_pk]))].append((computeID(otherAttr,other_obj),other_obj,row[-1]))
+
+    return dict([(gbnV.ID,neighbours[(method,dep,gbnV.ID)]) for gbnV in gbnVertices])
+
+def popBatch():
+    '''
+    Pops the next attribute and its vertices from the :attr:`.gbnQ`
+
+    :returns: Tuple `(attr,gbnVertices,gbnVerticesNotInE)`, where `gbnVerticesNotInE` are the vertices that are not part of the evidence. `None` if the queue is empty.
+    '''
+    if gbnQ.isEmpty():
+        return None
+    (attr,gbnVertices) = gbnQ.pop()
+    #filtering the gbn vertices that are part of the evidence
+    gbnVerticesNotInE = filter(lambda gbnV: not query.gbnVertexInEvidence(gbnV), gbnVertices)
+    #logging.debug("gbnVerticesNotInE: %s"%gbnVerticesNotInE)
+    return (attr,gbnVertices,gbnVerticesNotInE)
+
+def prefetchBatch(batch):
+    '''
+    Submits the queries of a batch to the :attr:`.prefetcher`, in the order in which :meth:`.addParents` and :meth:`.addChildren` retrieve them (see :meth:`.loadRows`). The queries of uncertain dependencies depend on the state of the GBN and are not prefetched.
+
+    :arg batch: Tuple `(attr,gbnVertices,gbnVerticesNotInE)`, see :meth:`.popBatch`
+    '''
+    (attr,gbnVertices,gbnVerticesNotInE) = batch
+    for dep in attr.dependenciesChild:
+        if not dep.uncertain:
+            prefetchRows('loadDependencyParentObjects',dep,gbnVertices)
+    if gbnVerticesNotInE:
+        for dep in attr.dependenciesParent:
+            if not dep.uncertain:
+                prefetchRows('loadDependencyChildrenObjects',dep,gbnVerticesNotInE)
+
+def prefetchRows(method, dep, gbnVertices):
+    '''
+    Submits the query `method(dep,gbnVertices)` to the :attr:`.prefetcher`. If :attr:`.CACHE` is `True`, only the vertices that are missing in the :attr:`.neighbourhoodCache` are queried (see :attr:`.prefetchedMisses`).
+
+    :arg method: Name of the `loadXXX()` method
+    :arg dep: :class:`.Dependency`
+    :arg gbnVertices: List of :class:`.GBNvertex` instances
+    '''
+    if neighbourhoodCache is not None and CACHE:
+        missing = neighbourhoodCache.missing(method,dep,gbnVertices)
+        prefetchedMisses[(method,dep,id(gbnVertices))] = missing
+        if missing:
+            prefetcher.submit(method,dep,missing)
+    else:
+        prefetcher.submit(method,dep,gbnVertices)
+
+def fetchRows(dsi, method, dep, gbnVertices):
+    '''
+    Executes the query `dsi.method(dep,gbnVertices)`, its result is taken from the :attr:`.prefetcher` if it has been prefetched
+
+    :arg dsi: :class:`.DataSetInterface` instance
+    :arg method: Name of the `loadXXX()` method
+    :arg dep: :class:`.Dependency`
+    :arg gbnVertices: List of :class:`.GBNvertex` instances
+    :returns: Iterable over the result rows
+    '''
+    if prefetcher is not None and prefetcher.dsi is dsi:
+        return prefetcher.fetch(method,dep,gbnVertices)
+    return getattr(dsi,method)(dep,gbnVertices)
+
+def loadRows(dsi, method, dep, gbnVertices):
+    '''
+    Returns the result rows of the query `dsi.method(dep,gbnVertices)`, e.g. of :meth:`.SQLiteDI.loadDependencyParentObjects`. If :attr:`.CACHE` is `True`, the rows of the objects in the :attr:`.neighbourhoodCache` are taken from the cache and only the other objects are queried (if they have been prefetched, the result is taken from the :attr:`.prefetcher`). The new rows are stored in the cache.
+
+    :arg dsi: :class:`.DataSetInterface` instance
+    :arg method: Name of the `loadXXX()` method
+    :arg dep: :class:`.Dependency`
+    :arg gbnVertices: List of :class:`.GBNvertex` instances
+    :returns: Iterable over the result rows
+    '''
+    if not CACHE or neighbourhoodCache is None or neighbourhoodCache.dsi is not dsi:
+        return fetchRows(dsi,method,dep,gbnVertices)
+
+    # the first columns of a row are the key of the bound object
+    if method == 'loadDependencyParentObjects':
+        nKeys = len(dep.child.erClass.pk)
+    else:
+        nKeys = len(dep.parent.erClass.pk)
+
+    rows = []
+    prefetched = prefetchedMisses.pop((method,dep,id(gbnVertices)),None)
+    if prefetched:
+        fetched = list(fetchRows(dsi,method,dep,prefetched))
+        neighbourhoodCache.store(method,dep,prefetched,fetched,nKeys)
+        rows.extend(fetched)
+        prefetchedIDs = set([id(gbnV) for gbnV in prefetched])
+        gbnVertices = [gbnV for gbnV in gbnVertices if id(gbnV) not in prefetchedIDs]
+
+    (cached,missing) = neighbourhoodCache.lookup(method,dep,gbnVertices)
+    rows.extend(cached)
+    if missing:
+        fetched = list(fetchRows(dsi,method,dep,missing))
+        neighbourhoodCache.store(method,dep,missing,fetched,nKeys)
+        rows.extend(fetched)
+    return rows
+
+def compileGBN():
+    '''
+    Compiles the unrolled :attr:`.GBN` into the array based :class:`.CompiledGBN` used by the samplers, see :mod:`network.compiled`. The object graph :attr:`.GBN` is kept as construction and debugging view.
+    '''
+    global compiledGBN
+
+    compiledGBN = CompiledGBN(GBN)
+
+    logging.debug(compiledGBN)
 
 def validateGBN():
     """
@@ -182,13 +495,13 @@ def validateGBN():
         if attr.hasParents:
             # in this case all gbn vertices of this attribute should have at least one parent
             for gbnV in gbns:
-                for paAttr in gbnV.parents.keys():
+                for paAttr in [dep.parent for dep in attr.dependenciesChild]:
                     if not gbnV.hasParents(paAttr):
                         # if there aren't any parents, a sampling vertex is added.
-                        artificial_ID = '%s(%s)'%(paAttr.fullname,gbnV.ID)
+                        artificial_ID = registry.intern(('%s(%%s)'%paAttr.fullname,gbnV.ID))
                         GBN.addSamplingVertex(artificial_ID,paAttr,None)
                         GBN[gbnV.ID].addParent(GBN[artificial_ID])
-                        logging.debug('adding artificial %s'%artificial_ID ) 
+                        logging.debug('adding artificial %s'%registry.name(artificial_ID) ) 
         
 
 # @time_analysis
@@ -238,7 +551,7 @@ def addParents(attr,gbnVertices):
             # Note that 'gbnVertices' is a SET of gbnVertices 
             for gbnV in gbnVertices:
             
-                logging.debug('Adding Reference vertex for %s'%gbnV.ID)
+                logging.debug('Adding Reference vertex for %s'%registry.name(gbnV.ID))
                 
                 # add reference vertex 
                 refVID = GBN.addReferenceVertex(gbnV,dep)
@@ -283,10 +596,7 @@ def addParents(attr,gbnVertices):
             
             
             # load all parent obj
-            dsi.loadDependencyParentObjects(dep,gbnVertices)
-            
-            
-            for row in dsi.resultSet():
+            for row in loadRows(dsi,'loadDependencyParentObjects',dep,gbnVertices):
                 
                 
                 #extract child id
@@ -310,20 +620,16 @@ def addParents(attr,gbnVertices):
                         GBN.addSamplingVertex(parent_ID,dep.parent,parent_obj)
                         gbnQ.push(GBN[parent_ID])                    
                         #Having added the vertex just before, we can for efficiency reasons add the edge to the GBN as we know that it hasn't been there before
-                        #adds parent information to child node                    
-                        GBN[child_ID].parents[GBN[parent_ID].attr][parent_ID] =GBN[parent_ID] 
-                        #adds child information to parent node
-                        GBN[parent_ID].children[GBN[child_ID].attr][child_ID] = GBN[child_ID]
+                        #adds the parent/child information to both nodes
+                        GBN[child_ID].addNewParent(GBN[parent_ID])
                     
                     elif parent_val is not None:   #parent obj is in evidence -> d-seperates -> not pushed onto queue 
 
                         #add parent vertex to GBN
                         GBN.addEvidenceVertex(parent_ID,dep.parent,parent_obj,parent_val)  
                         #Having added the vertex just before, we can for efficiency reasons add the edge to the GBN as we know that it hasn't been there before
-                        #adds parent information to child node                    
-                        GBN[child_ID].parents[GBN[parent_ID].attr][parent_ID] = GBN[parent_ID] 
-                        #adds child information to parent node
-                        GBN[parent_ID].children[GBN[child_ID].attr][child_ID] = GBN[child_ID]
+                        #adds the parent/child information to both nodes
+                        GBN[child_ID].addNewParent(GBN[parent_ID])
                     
                 #parent vertex already in GBN
                 else:    
@@ -371,10 +677,8 @@ def addChildren(attr,gbnVertices):
             n_child_pk = len(child_pk)
             end_child_pk = n_child_pk+n_parent_pk
             
-            # load all parent obj
-            dsi.loadDependencyChildrenObjects(dep,gbnVertices)            
-            
-            for row in dsi.resultSet():
+            # load all children obj
+            for row in loadRows(dsi,'loadDependencyChildrenObjects',dep,gbnVertices):
                 #extract parent id
                 parent_ID = computeID(dep.parent,row[0:n_parent_pk]) 
                 #extract child information
@@ -393,10 +697,8 @@ def addChildren(attr,gbnVertices):
                         GBN.addSamplingVertex(child_ID,dep.child,child_obj)
                     
                         #Having added the vertex just before, we can for efficiency reasons add the edge to the GBN as we know that it hasn't been there before
-                        #adds parent information to child node                    
-                        GBN[child_ID].parents[GBN[parent_ID].attr][parent_ID] =GBN[parent_ID] 
-                        #adds child information to parent node
-                        GBN[parent_ID].children[GBN[child_ID].attr][child_ID] = GBN[child_ID]
+                        #adds the parent/child information to both nodes
+                        GBN[child_ID].addNewParent(GBN[parent_ID])
                     
                         # pushing gbnVertex onto queue (also push vertices that are in the evidence because of possible V-structures)
                         gbnQ.push(GBN[child_ID])
@@ -408,10 +710,8 @@ def addChildren(attr,gbnVertices):
                         GBN.addEvidenceVertex(child_ID,dep.child,child_obj,child_val)  
 
                         #Having added the vertex just before, we can for efficiency reasons add the edge to the GBN as we know that it hasn't been there before
-                        #adds parent information to child node                    
-                        GBN[child_ID].parents[GBN[parent_ID].attr][parent_ID] =GBN[parent_ID] 
-                        #adds child information to parent node
-                        GBN[parent_ID].children[GBN[child_ID].attr][child_ID] = GBN[child_ID]
+                        #adds the parent/child information to both nodes
+                        GBN[child_ID].addNewParent(GBN[parent_ID])
                     
                         # pushing gbnVertex onto queue (also push vertices that are in the evidence because of possible V-structures)
                         gbnQ.push(GBN[child_ID])
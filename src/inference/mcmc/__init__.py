@@ -21,6 +21,27 @@
     :members:
 
 
+:mod:`~!.parallel` module
+----------------------------
+
+.. automodule:: inference.mcmc.parallel
+    :members:
+
+
+:mod:`~!.adaptive` module
+----------------------------
+
+.. automodule:: inference.mcmc.adaptive
+    :members:
+
+
+:mod:`~!.diagnostics` module
+----------------------------
+
+.. automodule:: inference.mcmc.diagnostics
+    :members:
+
+
 :mod:`~!.likelihood` module
 -----------------------------
 
@@ -0,0 +1,130 @@
+'''
+Runs the chains of a MCMC sampler (e.g. :mod:`.gibbs`, :mod:`.mh`) until a target precision is reached, instead of a fixed number of iterations.
+
+The chains are run interleaved, :attr:`WINDOW` iterations at a time, and a :class:`.ConvergenceMonitor` tracks the values of the event vertices:
+
+* The burn in stops as soon as the chains agree on the last window, i.e. the Gelman Rubin statistic of every event vertex is below :attr:`RHAT`
+* The collection of samples stops as soon as every event vertex has an effective sample size of at least :attr:`ESS` and a Gelman Rubin statistic below :attr:`RHAT`
+
+The `BURNIN` and `ITER` constants of the sampler are the maximal number of iterations. As only one Ground Bayesian Network exists, the state of every chain is saved and restored between windows by the sampler (`saveState()` and `restoreState()`).
+'''
+
+import logging
+
+import numpy as N
+
+from inference.mcmc import posterior
+from inference.mcmc.diagnostics import ConvergenceMonitor
+from network.vertices import ReferenceVertex
+
+from inference import engine
+
+
+WINDOW = 100
+'''
+Number of iterations a chain is run before the convergence is checked
+'''
+
+RHAT = 1.05
+'''
+Threshold for the Gelman Rubin statistic of the event vertices
+'''
+
+ESS = 1000
+'''
+Target effective sample size of the event vertices (summed over all chains)
+'''
+
+monitor = None
+'''
+The :class:`.ConvergenceMonitor` of the last run
+'''
+
+
+def run(sampler, chainIDs):
+    '''
+    Runs the chains of `sampler` until the target precision is reached, the samples are stored in :attr:`.posterior.samples`.
+
+    :arg sampler: Sampler module implementing `init(chainID)`, `step()`, `saveState()`, `restoreState(state)` and the constants `BURNIN` and `ITER`
+    :arg chainIDs: List of chain identifications
+    '''
+    global monitor
+
+    eventValues = eventValuesFunction(sampler)
+    monitor = ConvergenceMonitor(chainIDs,len(engine.GBN.eventVertices))
+
+    states = {}
+    for chainID in chainIDs:
+        sampler.init(chainID=chainID)
+        states[chainID] = sampler.saveState()
+
+    #BURNIN phase, until the chains agree on the last window
+    burnin = 0
+    while burnin < sampler.BURNIN:
+        n = min(WINDOW,sampler.BURNIN - burnin)
+        monitor.reset()
+        for chainID in chainIDs:
+            sampler.restoreState(states[chainID])
+            monitor.update(chainID,runWindow(sampler,n,eventValues))
+            states[chainID] = sampler.saveState()
+        burnin += n
+        if (monitor.rhat() <= RHAT).all():
+            break
+
+    #Collecting samples, until the target precision is reached
+    monitor.reset()
+    nSamples = 0
+    while nSamples < sampler.ITER:
+        n = min(WINDOW,sampler.ITER - nSamples)
+        for chainID in chainIDs:
+            sampler.restoreState(states[chainID])
+            posterior.switchChain(chainID)
+            monitor.update(chainID,runWindow(sampler,n,eventValues,nSamples))
+            states[chainID] = sampler.saveState()
+        nSamples += n
+        if (monitor.rhat() <= RHAT).all() and (monitor.ess() >= ESS).all():
+            break
+
+    posterior.truncateChains(nSamples)
+
+    # the GBN is left in the state of the last chain
+    sampler.restoreState(states[chainIDs[-1]])
+    if sampler.COMPILED:
+        engine.compiledGBN.writeValues()
+
+    logging.info('Adaptive run: %s burn in and %s collected iterations per chain, max R_hat=%.3f, min ESS=%.0f'%(burnin,nSamples,monitor.rhat().max(),monitor.ess().min()))
+
+
+def runWindow(sampler, n, eventValues, firstSample=None):
+    '''
+    Runs `n` iterations of the current chain.
+
+    :arg sampler: Sampler module
+    :arg n: Number of iterations
+    :arg eventValues: Function returning the current values of the event vertices
+    :arg firstSample: Optional, if not `None` the samples are collected using :meth:`.posterior.collectSamples` with the sample counts `firstSample,...,firstSample+n-1`
+    :returns: `n x nEvents` :class:`numpy.array` with the values of the event vertices
+    '''
+    window = N.zeros((n,len(engine.GBN.eventVertices)))
+    for i in range(n):
+        sampler.step()
+        if firstSample is not None:
+            posterior.collectSamples(firstSample + i)
+        window[i,:] = eventValues()
+    return window
+
+
+def eventValuesFunction(sampler):
+    '''
+    :arg sampler: Sampler module
+    :returns: A function returning the current values of the event vertices, read from the :class:`.CompiledGBN` if the sampler uses it. The :class:`.CompiledGBN` doesn't contain the references of the :class:`.ReferenceVertex` instances, if there is one among the event vertices the values are read from the vertices (see :meth:`.posterior.vertexValue`) as in :meth:`.posterior.initChain`.
+    '''
+    eventIDs = engine.GBN.eventVertices.keys()
+    eventVs = [engine.GBN[ID] for ID in eventIDs]
+
+    if sampler.COMPILED and not [gbnV for gbnV in eventVs if isinstance(gbnV,ReferenceVertex)]:
+        cGBN = engine.compiledGBN
+        eventIdx = cGBN.indices(eventIDs)
+        return lambda: cGBN.currentValues(eventIdx)
+    else:
+        return lambda: N.array([posterior.vertexValue(gbnV) for gbnV in eventVs])
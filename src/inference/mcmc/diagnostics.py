@@ -0,0 +1,250 @@
+'''
+Convergence diagnostics of MCMC chains, computed without plotting (see :mod:`.posterior` for the plots).
+
+The functions operate on `M x |Y|` traces of samples (one column per variable). They are vectorized: the cumulative statistics are computed with cumulative sums and the autocorrelation with the FFT, the cost is `O(M log M)` per variable instead of `O(M^2)`.
+
+The :class:`.ConvergenceMonitor` is updated with windows of samples of every chain and estimates the Gelman Rubin statistic :math:`\hat{R}` and the effective sample size (ESS) incrementally, i.e. the memory doesn't grow with the number of samples. It is used by :mod:`.adaptive` to stop the burn in and the collection of samples once the chains have converged.
+'''
+
+import numpy as N
+
+
+def cumulativeMean(chain):
+    '''
+    Returns the cumulative mean of `chain`, row `j` is the mean of the first `j+1` samples.
+
+    :arg chain: `M x |Y|` :class:`numpy.array`
+    :returns: `M x |Y|` :class:`numpy.array`
+    '''
+    counts = N.arange(1,chain.shape[0]+1,dtype=float)
+    return chain.cumsum(axis=0,dtype=float) / counts[:,N.newaxis]
+
+
+def cumulativeVariance(chain):
+    '''
+    Returns the cumulative sample variance of `chain` (`Probabilistic Graphical Models`, equation 12.27), row `j` is the variance of the first `j+1` samples. The variance of one sample is undefined, the first row is `numpy.inf`.
+
+    The sums of squares are accumulated on the samples centered on their overall mean, which avoids the cancellation of large values.
+
+    :arg chain: `M x |Y|` :class:`numpy.array`
+    :returns: `M x |Y|` :class:`numpy.array`
+    '''
+    centered = chain - chain.mean(axis=0,dtype=float)
+    counts = N.arange(1,chain.shape[0]+1,dtype=float)[:,N.newaxis]
+    cumMean = centered.cumsum(axis=0) / counts
+    cumSquares = (centered**2).cumsum(axis=0)
+
+    V = N.empty(chain.shape,dtype=float)
+    V[0,:] = N.inf
+    # sum((x-mean_j)^2) = sum(x^2) - (j+1)*mean_j^2
+    V[1:,:] = N.maximum(cumSquares[1:] - counts[1:] * cumMean[1:]**2,0) / (counts[1:] - 1)
+    return V
+
+
+def gelmanRubin(chains):
+    '''
+    Computes the Gelman Rubin convergence diagnostic :math:`\hat{R}` for all prefixes of the chains, according to `Probabilistic Graphical Models` (p. 523). The between chain variance is scaled by the total number of samples `M`.
+
+    :arg chains: List of `K` traces, `M x |Y|` :class:`numpy.array` instances of the same shape
+    :returns: `(M-1) x |Y|` :class:`numpy.array`, row `j` is :math:`\hat{R}` after `j+2` samples
+    '''
+    K = len(chains)
+    M = chains[0].shape[0]
+
+    # cumulative mean of every chain, f^{bar}_{k} in koller book
+    f_bar_K = N.array([cumulativeMean(chain) for chain in chains])
+    # cumulative mean across all chains, f^{bar} in koller book
+    f_bar = f_bar_K.mean(axis=0)
+
+    # between chain variance, B in koller book
+    B = M/(K-1.) * ((f_bar_K - f_bar)**2).sum(axis=0)
+
+    # with-in chain variance, W in koller book
+    W = N.array([cumulativeVariance(chain) for chain in chains]).mean(axis=0)
+
+    # an estimator that overestimates the variance, V in koller book
+    V = (M-1.)/M * W + 1./M * B
+
+    return N.sqrt(V[1:]/W[1:])
+
+
+def autocovariance(chain, maxLag=None):
+    '''
+    Computes the autocovariance of `chain` for the lags `0,...,maxLag-1` using the FFT (`Probabilistic Graphical Models`, equation 12.28). The covariance with lag `l` is normalized by `M-l`, the covariance with lag `0` is the sample variance.
+
+    :arg chain: `M x |Y|` :class:`numpy.array`
+    :arg maxLag: Optional number of lags (default `M`)
+    :returns: `maxLag x |Y|` :class:`numpy.array`
+    '''
+    M = chain.shape[0]
+    if maxLag is None or maxLag > M:
+        maxLag = M
+
+    centered = chain - chain.mean(axis=0,dtype=float)
+    # zero padding to at least 2M avoids the circular correlation
+    nFFT = 1 << int(2*M - 1).bit_length()
+    F = N.fft.rfft(centered,n=nFFT,axis=0)
+    acov = N.fft.irfft(F * N.conjugate(F),n=nFFT,axis=0)[:maxLag]
+
+    acov /= (M - N.arange(maxLag,dtype=float))[:,N.newaxis]
+    acov[0,:] *= M / max(M-1.,1.)
+    return acov
+
+
+def autocorrelation(chain, maxLag=None):
+    '''
+    Computes the autocorrelation of `chain` for the lags `0,...,maxLag-1`, see :meth:`.autocovariance`. The autocorrelation of a constant variable is `0` for all lags but `0`.
+
+    :arg chain: `M x |Y|` :class:`numpy.array`
+    :arg maxLag: Optional number of lags (default `M`)
+    :returns: `maxLag x |Y|` :class:`numpy.array`
+    '''
+    acov = autocovariance(chain,maxLag)
+    variance = acov[0,:]
+
+    A = N.zeros(acov.shape,dtype=float)
+    A[0,:] = 1
+    varying = variance > 0
+    A[:,varying] = acov[:,varying] / variance[varying]
+    return A
+
+
+def effectiveSampleSize(chain):
+    '''
+    Estimates the effective sample size :math:`M / (1 + 2 \sum_l \rho_l)` of every variable of `chain`. The sum of the autocorrelations :math:`\rho_l` is truncated using Geyer's initial positive sequence: the autocorrelations are summed in pairs of consecutive lags until the first pair that is not positive. A constant variable has the effective sample size `M`.
+
+    :arg chain: `M x |Y|` :class:`numpy.array`
+    :returns: :class:`numpy.array` of length `|Y|`
+    '''
+    M = chain.shape[0]
+    if M < 4:
+        return N.ones(chain.shape[1]) * M
+
+    A = autocorrelation(chain)
+    nPairs = M / 2
+    pairs = A[0:2*nPairs:2] + A[1:2*nPairs:2]
+    # only the initial positive pairs are used
+    positive = N.cumprod(pairs > 0,axis=0)
+
+    tau = -1 + 2 * (pairs * positive).sum(axis=0)
+    ess = N.ones(chain.shape[1]) * M
+    correlated = tau > 0
+    ess[correlated] = N.minimum(M / tau[correlated],M)
+    return ess
+
+
+class ConvergenceMonitor():
+    '''
+    Incremental estimates of the Gelman Rubin statistic and the effective sample size of a set of chains. For every chain the number of samples, the running mean and variance (merged window by window) and the means of all windows (the batch means used to estimate the ESS) are kept.
+    '''
+
+    def __init__(self, chainIDs, nVariables):
+        '''
+        :arg chainIDs: List of chain identifications
+        :arg nVariables: Number of monitored variables
+        '''
+        self.chainIDs = chainIDs
+        '''List of chain identifications
+        '''
+        self.nVariables = nVariables
+        '''Number of monitored variables
+        '''
+        self.reset()
+
+    def reset(self):
+        '''
+        Discards all samples, e.g. at the end of the burn in
+        '''
+        self.n = dict([(ID,0) for ID in self.chainIDs])
+        '''Number of samples of every chain
+        '''
+        self.mean = dict([(ID,N.zeros(self.nVariables)) for ID in self.chainIDs])
+        '''Running mean of every chain
+        '''
+        self.M2 = dict([(ID,N.zeros(self.nVariables)) for ID in self.chainIDs])
+        '''Running sum of squared differences from the mean of every chain
+        '''
+        self.batchMeans = dict([(ID,[]) for ID in self.chainIDs])
+        '''List of tuples `(size,mean)` of all windows of every chain
+        '''
+
+    def update(self, chainID, window):
+        '''
+        Adds a window of samples of chain `chainID`. The running mean and variance are merged with the window statistics (Chan et al.), the window mean is kept as batch mean.
+
+        :arg chainID: Chain identification
+        :arg window: `nSamples x nVariables` :class:`numpy.array`
+        '''
+        nW = window.shape[0]
+        if nW == 0:
+            return
+        meanW = window.mean(axis=0)
+        M2W = ((window - meanW)**2).sum(axis=0)
+
+        n = self.n[chainID]
+        delta = meanW - self.mean[chainID]
+        total = n + nW
+        self.mean[chainID] = self.mean[chainID] + delta * nW / total
+        self.M2[chainID] = self.M2[chainID] + M2W + delta**2 * n * nW / total
+        self.n[chainID] = total
+
+        self.batchMeans[chainID].append((nW,meanW))
+
+    def variance(self, chainID):
+        '''
+        :arg chainID: Chain identification
+        :returns: Sample variance of every variable of chain `chainID`
+        '''
+        return self.M2[chainID] / max(self.n[chainID] - 1,1)
+
+    def rhat(self):
+        '''
+        Returns the Gelman Rubin statistic of every variable (see :meth:`.posterior.gelman_rubin`). Variables that are constant in all chains have :math:`\hat{R}=1`.
+
+        :returns: :class:`numpy.array` of length `nVariables`, `numpy.inf` if there are less than two chains or samples
+        '''
+        K = len(self.chainIDs)
+        M = min(self.n.values())
+        if K < 2 or M < 2:
+            return N.inf * N.ones(self.nVariables)
+
+        chainMeans = N.array([self.mean[ID] for ID in self.chainIDs])
+        # between chain variance
+        B = M/(K-1.) * ((chainMeans - chainMeans.mean(axis=0))**2).sum(axis=0)
+        # with-in chain variance
+        W = N.array([self.variance(ID) for ID in self.chainIDs]).mean(axis=0)
+
+        V = (M-1.)/M * W + 1./M * B
+
+        R_hat = N.ones(self.nVariables)
+        varying = W > 0
+        R_hat[varying] = N.sqrt(V[varying]/W[varying])
+        R_hat[~varying & (B > 0)] = N.inf
+        return R_hat
+
+    def ess(self):
+        '''
+        Returns the effective sample size of every variable summed over all chains. The ESS of a chain is estimated using batch means, :math:`n s^2 / (b \cdot Var(\\bar{x}_{batch}))` with the window size `b` as batch size. A variable without variance contributes all its samples.
+
+        :returns: :class:`numpy.array` of length `nVariables`
+        '''
+        total = N.zeros(self.nVariables)
+        for ID in self.chainIDs:
+            n = self.n[ID]
+            batches = self.batchMeans[ID]
+            if len(batches) < 2:
+                continue
+            sizes = N.array([size for (size,m) in batches],dtype=float)
+            means = N.array([m for (size,m) in batches])
+            # weighted variance of the batch means, scaled to the mean batch size
+            varBatch = (sizes[:,N.newaxis] * (means - self.mean[ID])**2).sum(axis=0) / (len(batches) - 1)
+            s2 = self.variance(ID)
+
+            chainESS = N.ones(self.nVariables) * n
+            mixing = varBatch > 0
+            chainESS[mixing] = N.minimum(n * s2[mixing] / varBatch[mixing],n)
+            total += chainESS
+        return total
+
+    def __repr__(self):
+        return 'ConvergenceMonitor (%s chains, %s variables, %s samples)'%(len(self.chainIDs),self.nVariables,sum(self.n.values()))
@@ -11,11 +11,16 @@ of the sampling attribute in the GBN. The full conditionals are given by:
 
 
 
+import logging
+
 import numpy as N
 import random 
+import sys
 
 from inference.mcmc.likelihood import Likelihood
 from inference.mcmc import posterior
+from inference.mcmc import parallel
+from inference.mcmc import adaptive
 
 from analytics.performance import time_analysis
 
@@ -54,13 +59,53 @@ BLOCKGIBBS = True # False
 If `True` the sampler will collect samples for all event variables of the same attribute class in one block. 
 '''
 
+COMPILED = True
+'''
+If `True` the sampler operates on the arrays of the :class:`.CompiledGBN` (see :attr:`inference.engine.compiledGBN`) instead of traversing the :class:`.GBNvertex` instances.
+'''
+
+
+CHROMATIC = False
+'''
+If `True` (and :attr:`COMPILED` is `True`) a Gibbs step is a chromatic sweep instead of the Block Gibbs or standard Gibbs step selected by :attr:`BLOCKGIBBS`: the Markov blanket graph of the GBN is coloured (see :meth:`.CompiledGBN.colour`) and all vertices of one colour, which are conditionally independent, are sampled at the same time in one vectorized batch. Every sweep samples every sampling vertex once, it has the same stationary distribution as a systematic scan.
+'''
+
+PARALLEL = False
+'''
+If `True` the chains are run in parallel worker processes using :mod:`.parallel`
+'''
+
+ADAPTIVE = False
+'''
+If `True` the chains are run interleaved until the posterior of the event vertices reaches the target precision of :mod:`.adaptive`, :attr:`BURNIN` and :attr:`ITER` are the maximal number of iterations. :attr:`PARALLEL` is ignored.
+'''
+
 
 def run():
     '''
-    Sequentally runs :attr:`CHAINS` MCMC runs, the posterior samples are stored in
-    :attr:`.posterior.samples`.
+    Runs :attr:`CHAINS` MCMC runs, the posterior samples are stored in
+    :attr:`.posterior.samples`. The chains are run in parallel if :attr:`PARALLEL` is `True`, sequentially otherwise, or until convergence if :attr:`ADAPTIVE` is `True`.
     '''
+
+    #  reset collected samples
+    posterior.samples = {}
+    posterior.conditionals = {}
+    posterior.accumulators = {}
+
+    # the batches of the chromatic sweep and of the Block Gibbs step are computed from the colouring
+    if COMPILED and (CHROMATIC or BLOCKGIBBS):
+        engine.compiledGBN.colour()
+        logging.info('%s Gibbs: %s colours, %s batches'%(CHROMATIC and 'Chromatic' or 'Block',engine.compiledGBN.colours.max()+1,len(engine.compiledGBN.chromaticSchedule)))
+
     chain = 'chain_'
+    if ADAPTIVE:
+        adaptive.run(sys.modules[__name__],['%s%s'%(chain,c) for c in range(CHAINS)])
+        return
+
+    if PARALLEL:
+        parallel.run(sys.modules[__name__],['%s%s'%(chain,c) for c in range(CHAINS)])
+        return
+
     for c in range(CHAINS):
         init(chainID = '%s%s'%(chain,c))
         runChain()
@@ -85,6 +130,10 @@ def runChain():
     for i in range(ITER):
         gibbsStep()
         collectSamples(i)
+
+    #the object graph reflects the final state of the chain
+    if COMPILED:
+        engine.compiledGBN.writeValues()
         
 
 
@@ -93,8 +142,12 @@ def runChain():
 def gibbsStep():
     '''
     Performs a GIBBS step, either a Block Gibbs or a standard Gibbs step. 
-    The method :meth:`.sampleFullConditional` is called to sample a event variable.
+    The method :meth:`.sampleFullConditional` is called to sample a event variable. If :attr:`COMPILED` is `True`, :meth:`.compiledGibbsStep` is used instead.
     '''
+    if COMPILED:
+        compiledGibbsStep()
+        return
+
     # global GBN
     '''  
     STANDARD GIBBS : update every sampling vertex in one step
@@ -127,18 +180,12 @@ def gibbsStep():
         
         # print 'Chosen sampling attr:',attrS.fullname
         
-        for dep in attrS.dependenciesParent:
-            attrC = dep.child
-            if attrC in engine.GBN.allByAttribute:
-                for gbnV in engine.GBN.allByAttribute[attrC]:                                                            
-                    gbnV.parentAssignments()
-        
+        # the parent assignments of the children are kept up to date by GBNvertex.setValue()
         for gbnV in engine.GBN.samplingVerticesByAttribute[attrS]:      
                 
-            gbnV.parentAssignments()
             #we sample new state  
-            print 'Old Value for %s : %s'%(gbnV.ID,gbnV.value)   
-            gbnV.value = sampleFullConditional(gbnV)
+            # print 'Old Value for %s : %s'%(gbnV.ID,gbnV.value)   
+            gbnV.setValue(sampleFullConditional(gbnV))
             # print 'New Value for %s : %s'%(gbnV.ID,gbnV.value)
     
     
@@ -147,48 +194,85 @@ def gibbsStep():
         LAZY STANDARD GIBBS
         '''
         for attrS in engine.GBN.samplingVerticesByAttribute.keys():
-            for dep in attrS.dependenciesParent:
-                attrC = dep.child
-        
-                if attrC in engine.GBN.allByAttribute:
-                    for gbnV in engine.GBN.allByAttribute[attrC]:
-                        gbnV.parentAssignments()
-            
             for gbnV in engine.GBN.samplingVerticesByAttribute[attrS]:      
                 
-                gbnV.parentAssignments()
                 #we sample new state            
-                gbnV.value = sampleFullConditional(gbnV)
+                gbnV.setValue(sampleFullConditional(gbnV))
     
 
 
+@time_analysis
+def compiledGibbsStep():
+    '''
+    Performs a GIBBS step on the arrays of :attr:`inference.engine.compiledGBN`, either a chromatic sweep (see :attr:`CHROMATIC`), a Block Gibbs or a standard Gibbs step (see :attr:`BLOCKGIBBS`). The chromatic sweep and the Block Gibbs step sample the batches of :attr:`.CompiledGBN.chromaticSchedule` using :meth:`.CompiledGBN.sampleBatch`, the standard step computes the full conditional distributions one vertex at a time using :meth:`.CompiledGBN.fullConditional`. The parent assignments of the children are computed from the current values and don't need to be updated lazily.
+    '''
+    cGBN = engine.compiledGBN
+
+    if CHROMATIC:
+        # one vectorized batch per colour and attribute
+        for batch in cGBN.chromaticSchedule:
+            posterior.setCompiledConditionals(batch[1],cGBN.sampleBatch(batch))
+
+    elif BLOCKGIBBS:
+        # sample every vertex of the same, randomly selected, attribute. The vertices of one
+        # attribute can be in each other's Markov blanket, the block is sampled one colour at a time
+        attrS = random.choice(cGBN.blockSchedule.keys())
+        for batch in cGBN.blockSchedule[attrS]:
+            posterior.setCompiledConditionals(batch[1],cGBN.sampleBatch(batch))
+
+    else:
+        for vs in cGBN.samplingByAttribute.values():
+            for v in vs.tolist():
+                fc = cGBN.sample(v)
+                posterior.setCompiledConditionals(N.array([v]),fc[N.newaxis,:])
+
+
 def collectSamples(nSample):
     """
-    Stores a sampled state (e.g. one value for each event variable) in the :attr:`posterior.currentchain`
+    Stores a sampled state (e.g. one value for each event variable) in the :attr:`posterior.currentchain` using :meth:`.posterior.collectSamples`
     
     :arg nSample: Int Count of the collected sample.
     """
-    # global GBN
-    for (i,gbnV) in enumerate(engine.GBN.eventVertices.values()):                
-        
-        posterior.currentChain[nSample,i] = gbnV.value
+    posterior.collectSamples(nSample)
 
 
-@time_analysis    
-def sampleFullConditional(gbnV):
+step = gibbsStep
+'''
+The transition kernel, used by :mod:`.adaptive`
+'''
+
+
+def saveState():
     '''
-    Returns a random sample distributed according to the sampling distribution - e.g. the 
-    full conditional distribution in case of a Gibbs sampler - of the attribute class of `gbnV`.
-    
+    Returns the current state of the markov chain, used by :mod:`.adaptive` to run several chains interleaved
+
+    :returns: Copy of :attr:`.CompiledGBN.values` if :attr:`COMPILED` is `True`, a dictionary `{ vertex ID : value }` of the sampling vertices otherwise
+    '''
+    if COMPILED:
+        return engine.compiledGBN.values.copy()
+    return dict([(gbnV.ID,gbnV.value) for gbnV in engine.GBN.samplingVertices.values()])
+
+
+def restoreState(state):
+    '''
+    Sets the state of the markov chain returned by :meth:`.saveState`
+
+    :arg state: State returned by :meth:`.saveState`
+    '''
+    if COMPILED:
+        engine.compiledGBN.values[:] = state
+        return
+    for (gbnID,value) in state.items():
+        engine.GBN[gbnID].setValue(value)
+
+
+def fullConditional(gbnV):
+    '''
+    Computes the full conditional distribution of `gbnV` given the current values of its Markov blanket, using the conditional likelihood functions of its children (see :attr:`.likelihoods`). :meth:`.CompiledGBN.fullConditional` is the equivalent on the compiled GBN.
+
     :arg gbnV: :class:`GBNvertex` 
-    :returns: Random sample
-    
+    :returns: `1 x cardinality` :class:`numpy.array`, the normalized full conditional
     '''
-   
-    cumFC = None
-    
-        
-    #TODO  AVOID CREATING NEW LISTS NUMPY.ARRAYS WITH EVERY ITERATION.
     fc = N.ones((1,gbnV.attr.cardinality))
     #fcLog = N.zeros((1,gbnV.attr.cardinality))
 
@@ -226,7 +310,7 @@ def sampleFullConditional(gbnV):
             #the assignment of conditional variables
             condAss = [childV.value]
         
-            #TODO DANGEROUS , ONLY VALID FOR BLOCK GIBBS
+            #the parent assignment is cached and kept up to date by GBNvertex.setValue()
             childV.parentAssignments()
         
             # print 'childV.parentAss',childV.parentAss
@@ -276,9 +360,27 @@ def sampleFullConditional(gbnV):
     #prob
 
     #Normalize
-    fc = fc / fc.sum(axis=1)
+    return fc / fc.sum(axis=1)
+
+
+@time_analysis    
+def sampleFullConditional(gbnV):
+    '''
+    Returns a random sample distributed according to the sampling distribution - e.g. the 
+    full conditional distribution in case of a Gibbs sampler - of the attribute class of `gbnV`.
+    
+    :arg gbnV: :class:`GBNvertex` 
+    :returns: Random sample
+    
+    '''
+   
+    fc = fullConditional(gbnV)
+
     #Compute cumulative dist
     cumFC = fc.cumsum(axis=1)
+
+    #Rao-Blackwellized estimate
+    posterior.setConditional(gbnV,fc[0,:])
     
 
 
@@ -324,10 +426,9 @@ def sampleFullConditional(gbnV):
     u = N.random.uniform()
     
 
-    # prob 
-    for i,cumprop in enumerate(cumFC[0,:]):
-        if u <= cumprop:
-            return gbnV.attr.domain[i]
+    # prob, the first value whose cumulative probability is >= u
+    i = N.searchsorted(cumFC[0,:],u)
+    return gbnV.attr.domain[min(i,gbnV.attr.cardinality-1)]
     '''
     # logprob
     print 'Full conditional', cumLogFC
@@ -364,7 +465,10 @@ def initializeVertices():
     Creates an initial state for the markov chain by assigning a value to all sampling vertices
     '''
     for gbnV in engine.GBN.samplingVertices.values():
-        gbnV.value = gbnV.attr.domain[0]        
+        gbnV.setValue(gbnV.attr.domain[0])
+
+    if COMPILED:
+        engine.compiledGBN.readValues()
         
 
 def configure():
@@ -8,6 +8,7 @@ The random walk samples the full conditional distributions for normal :class:`.G
 '''
 
 import logging
+import sys
 
 import numpy as N
 import random 
@@ -16,6 +17,8 @@ from network.vertices import ReferenceVertex
 
 from inference.mcmc.likelihood import Likelihood
 from inference.mcmc import posterior
+from inference.mcmc import parallel
+from inference.mcmc import adaptive
 
 from analytics.performance import time_analysis
 
@@ -36,6 +39,11 @@ ITER = 10
 '''Number of samples to collect
 '''
 
+COMPILED = True
+'''
+If `True` the Gibbs steps of all vertices whose Markov blanket doesn't change with the references are performed on the arrays of the :class:`.CompiledGBN` (see :attr:`inference.engine.compiledGBN`). The values of the :class:`.GBNvertex` instances are kept up to date as the Metropolis Hastings steps depend on them.
+'''
+
 from inference import engine 
 '''The engine module contains the :class:`.GBNgraph` instance
 '''
@@ -49,16 +57,36 @@ Dictionary of likelihood functions that are precomputed when the sampler is conf
     
 '''
 
+PARALLEL = False
+'''
+If `True` the chains are run in parallel worker processes using :mod:`.parallel`
+'''
+
+ADAPTIVE = False
+'''
+If `True` the chains are run interleaved until the posterior of the event vertices reaches the target precision of :mod:`.adaptive`, :attr:`BURNIN` and :attr:`ITER` are the maximal number of iterations. :attr:`PARALLEL` is ignored.
+'''
+
 def run():
     '''
-    Sequentally runs :attr:`CHAINS` MCMC runs, the posterior samples are stored in
-    :attr:`.posterior.samples`.
+    Runs :attr:`CHAINS` MCMC runs, the posterior samples are stored in
+    :attr:`.posterior.samples`. The chains are run in parallel if :attr:`PARALLEL` is `True`, sequentially otherwise, or until convergence if :attr:`ADAPTIVE` is `True`.
     '''
 
     #  reset collected samples
     posterior.samples = {}
+    posterior.conditionals = {}
+    posterior.accumulators = {}
 
     chain = 'chain_'
+    if ADAPTIVE:
+        adaptive.run(sys.modules[__name__],['%s%s'%(chain,c) for c in range(CHAINS)])
+        return
+
+    if PARALLEL:
+        parallel.run(sys.modules[__name__],['%s%s'%(chain,c) for c in range(CHAINS)])
+        return
+
     for c in range(CHAINS):
         init(chainID = '%s%s'%(chain,c))
 
@@ -88,6 +116,41 @@ def runChain():
 
 
 
+def saveState():
+    '''
+    Returns the current state of the markov chain, used by :mod:`.adaptive` to run several chains interleaved
+
+    :returns: Dictionary `{ vertex ID : value }` of the sampling vertices, the value of a :class:`.ReferenceVertex` is the list of referenced vertices
+    '''
+    state = {}
+    for gbnV in engine.GBN.samplingVertices.values():
+        if isinstance(gbnV,ReferenceVertex):
+            state[gbnV.ID] = gbnV.references.values()
+        else:
+            state[gbnV.ID] = gbnV.value
+    return state
+
+
+def restoreState(state):
+    '''
+    Sets the state of the markov chain returned by :meth:`.saveState`
+
+    :arg state: State returned by :meth:`.saveState`
+    '''
+    for (gbnID,value) in state.items():
+        gbnV = engine.GBN[gbnID]
+        if isinstance(gbnV,ReferenceVertex):
+            gbnV.removeAllReferences()
+            for kGBNv in value:
+                gbnV.addReference(kGBNv)
+        else:
+            gbnV.setValue(value)
+
+    if COMPILED:
+        engine.compiledGBN.readValues()
+
+
+
 # @time_analysis
 def mcmcStep():
     '''
@@ -96,6 +159,8 @@ def mcmcStep():
     Note that we can exploit the conditional independence by `Lazy Aggregation`. When sampling all event vertices of a certain attribute, we need to perform the (potential aggregation) on the parent vertices only once (see references).
     '''
     
+    cGBN = engine.compiledGBN
+
     # Sampling every sampling vertex in the GBN
     for gbnV in engine.GBN.samplingVertices.values():
 
@@ -111,6 +176,18 @@ def mcmcStep():
             
 
         # If the vertex is a normal vertex, we apply a Gibbs step
+        elif COMPILED:
+
+            v = cGBN.index[gbnV.ID]
+
+            if cGBN.dynamic[v]:
+                # the Markov blanket depends on the references, the object graph is used
+                gibbsStep(gbnV)
+                cGBN.values[v] = gbnV.attr.indexingValue(gbnV.value)
+            else:
+                posterior.setConditional(gbnV,cGBN.sample(v))
+                gbnV.setValue(gbnV.attr.domain[cGBN.values[v]])
+
         else:
             
             # logging.info('gibbsStep, parents')
@@ -139,6 +216,10 @@ def mcmcStep():
     #         gbnV.value = gibbsStep(gbnV)
 
 
+step = mcmcStep
+'''
+The transition kernel, used by :mod:`.adaptive`
+'''
 
 
 @time_analysis
@@ -265,7 +346,7 @@ def gibbsStep(gbnV):
             #the assignment of conditional variables
             condAss = [childV.value]
         
-            #TODO DANGEROUS , ONLY VALID FOR BLOCK GIBBS
+            #the parent assignment is cached and kept up to date by GBNvertex.setValue()
             childV.parentAssignments()
         
             # print 'childV.parentAss',childV.parentAss
@@ -318,6 +399,9 @@ def gibbsStep(gbnV):
     fc = fc / fc.sum(axis=1)
     #Compute cumulative dist
     cumFC = fc.cumsum(axis=1)
+
+    #Rao-Blackwellized estimate
+    posterior.setConditional(gbnV,fc[0,:])
     
 
 
@@ -368,7 +452,7 @@ def gibbsStep(gbnV):
     
     for i,cumprop in enumerate(cumFC[0,:]):
         if u <= cumprop:
-            gbnV.value = gbnV.attr.domain[i]
+            gbnV.setValue(gbnV.attr.domain[i])
             # return!
             return
     '''
@@ -436,7 +520,10 @@ def initializeVertices():
             
         # If the vertex is a normal vertex, we apply a Gibbs step
         else:                        
-            gbnV.value = random.choice(gbnV.attr.domain)
+            gbnV.setValue(random.choice(gbnV.attr.domain))
+
+    if COMPILED:
+        engine.compiledGBN.readValues()
         
 
 def configure():
@@ -0,0 +1,134 @@
+'''
+Runs the chains of a MCMC sampler (e.g. :mod:`.gibbs`, :mod:`.mh`) in parallel worker processes.
+
+The worker processes are forked from the current process once the Ground Bayesian Network has been unrolled, thus every worker has its own copy of the :attr:`inference.engine.GBN` (and :attr:`inference.engine.compiledGBN`) and of the learned local distributions. Every chain is initialized with its own random seed, the collected samples are sent back and stored in :attr:`.posterior.samples` under the chain ID. The final state of the last chain is sent back as well, afterwards the GBN is in the same state as after a sequential run.
+
+The workers don't query the data, the :attr:`inference.engine.prefetcher` thread is stopped before they are forked. The parallel run is optional (see e.g. :attr:`.gibbs.PARALLEL`), the samples of a chain depend on its seed but not on the number of processes.
+
+.. note::
+    Worker processes are created using `os.fork()`. On platforms without `fork()` the chains are run sequentially.
+'''
+
+import logging
+import os
+import random
+import multiprocessing
+
+import numpy as N
+
+from inference.mcmc import posterior
+
+from inference import engine
+
+
+PROCESSES = None
+'''
+Number of worker processes. If `None`, one process per chain is used, at most `multiprocessing.cpu_count()`
+'''
+
+sampler = None
+'''
+The sampler module (e.g. :mod:`.gibbs`, :mod:`.mh`) whose chains are run by the workers. It is set by :meth:`.run` before the workers are forked.
+'''
+
+
+def run(samplerModule, chainIDs):
+    '''
+    Runs one chain per chain ID of `samplerModule` in a pool of worker processes and stores the samples in :attr:`.posterior.samples`.
+
+    :arg samplerModule: Sampler module implementing `init(chainID)` and `runChain()`
+    :arg chainIDs: List of chain identifications
+    '''
+    global sampler
+    sampler = samplerModule
+
+    # the seeds are drawn in the parent process, a seeded run stays reproducible
+    seeds = N.random.randint(0,2**31-1,len(chainIDs)).tolist()
+
+    processes = PROCESSES
+    if processes is None:
+        processes = min(len(chainIDs),multiprocessing.cpu_count())
+
+    if processes < 2 or len(chainIDs) < 2 or not hasattr(os,'fork'):
+        for (chainID,seed) in zip(chainIDs,seeds):
+            runChain((chainID,seed))
+        return
+
+    # no thread is forked with the workers, the prefetcher is restarted by the next unrolling
+    if engine.prefetcher is not None:
+        engine.prefetcher.close()
+        engine.prefetcher = None
+
+    logging.info('Running %s chains in %s worker processes'%(len(chainIDs),processes))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(runChain,zip(chainIDs,seeds))
+    finally:
+        pool.close()
+        pool.join()
+
+    for (chainID,chainSamples,currentIndex,chainConditionals,accumulator,state) in results:
+        posterior.samples[chainID] = chainSamples
+        posterior.accumulators[chainID] = accumulator
+
+    # the GBN is left in the final state of the last chain, as after a sequential run
+    sampler.restoreState(importState(state))
+    if sampler.COMPILED:
+        engine.compiledGBN.writeValues()
+
+    # the posterior refers to the last chain, as after a sequential run
+    posterior.currentChain = posterior.samples[chainIDs[-1]]
+    posterior.currentChainID = chainIDs[-1]
+    posterior.currentIndex = currentIndex
+    posterior.posteriorVertices = dict([(gbnID,engine.GBN[gbnID]) for gbnID in currentIndex.keys()])
+    posterior.currentAccumulator = posterior.accumulators[chainIDs[-1]]
+    posterior.initColumns()
+
+    if posterior.RAOBLACKWELL:
+        posterior.initConditionals(chainIDs[-1])
+        for (chainID,chainSamples,currentIndex,chainConditionals,accumulator,state) in results:
+            posterior.conditionals[chainID] = chainConditionals
+
+
+def runChain(args):
+    '''
+    Runs one chain of :attr:`.sampler`, executed by a worker process.
+
+    :arg args: Tuple `(chainID,seed)`
+    :returns: Tuple `(chainID,samples,currentIndex,conditionals,accumulator,state)`, where `samples` is the :class:`numpy.array` of collected samples (`None` if they are not stored), `currentIndex` is :attr:`.posterior.currentIndex`, `conditionals` the entry of :attr:`.posterior.conditionals` (`None` if no Rao-Blackwellized estimates are collected), `accumulator` the :class:`.posterior.Accumulator` of the chain and `state` its final state (see :meth:`.exportState`)
+    '''
+    (chainID,seed) = args
+
+    N.random.seed(seed)
+    random.seed(seed)
+
+    sampler.init(chainID=chainID)
+    logging.info('%s, running %s (%s iterations)'%(chainID,sampler.__name__,sampler.ITER))
+    sampler.runChain()
+
+    return (chainID,posterior.samples[chainID],posterior.currentIndex,posterior.conditionals.get(chainID),posterior.accumulators[chainID],exportState(sampler.saveState()))
+
+
+def exportState(state):
+    '''
+    Converts a state returned by the `saveState()` method of the sampler so that it can be sent to the parent process, the referenced vertices of a :class:`.ReferenceVertex` are replaced by their IDs.
+
+    :arg state: State returned by `saveState()`
+    :returns: State that doesn't contain :class:`.GBNvertex` instances
+    '''
+    if not isinstance(state,dict):
+        return state
+    return dict([(gbnID,isinstance(value,list) and [gbnV.ID for gbnV in value] or value) for (gbnID,value) in state.items()])
+
+
+def importState(state):
+    '''
+    Inverse of :meth:`.exportState`, the IDs of the referenced vertices are replaced by the vertices of the :attr:`inference.engine.GBN`
+
+    :arg state: State returned by :meth:`.exportState`
+    :returns: State that can be passed to the `restoreState()` method of the sampler
+    '''
+    if not isinstance(state,dict):
+        return state
+    return dict([(gbnID,isinstance(value,list) and [engine.GBN[ID] for ID in value] or value) for (gbnID,value) in state.items()])
@@ -5,7 +5,7 @@ This module contains
 * Data structures to collect posterior samples
 * Convergence diagnostics
 
-The convergence diagnostics have to be called by the ProbReM project script, e.g. from outside the framework.
+The convergence diagnostics have to be called by the ProbReM project script, e.g. from outside the framework. The diagnostics :meth:`.gelmanRubinCurve`, :meth:`.autocorrelations` and :meth:`.effectiveSampleSize` return `numpy` arrays (computed by :mod:`.diagnostics`), the plotting functions (e.g. :meth:`.gelman_rubin`, :meth:`.autocorrelation`) draw them using matplotlib, which is only imported when a plot is drawn.
 
 '''
 
@@ -13,9 +13,10 @@ import logging
 
 
 import numpy as N
-import pylab as PL
 
-from network.vertices import ReferenceVertex
+from network.vertices import ReferenceVertex,registry
+
+from inference.mcmc import diagnostics
 
 from inference import engine 
 '''The engine module contains the :class:`.GBNgraph` instance
@@ -35,6 +36,11 @@ currentChain = None
 :class:`numpy.array` that is currently being used by the sampler
 '''
 
+currentChainID = None
+'''
+Identification of :attr:`.currentChain`
+'''
+
 posteriorVertices = None
 '''
 Dictionary of vertices that we are collecting samples from (e.g. the event vertices or all sampling vertices including latent variables), set 
@@ -45,15 +51,96 @@ currentIndex = {}
 Dictionary mapping each event variable `ID` to an index used to access :attr:`.currentChain`
 '''
 
+compiledIndex = None
+'''
+`numpy.array` with the :class:`.CompiledGBN` vertex index of every column of :attr:`.currentChain`. It is `None` if the GBN is not compiled or if the posterior contains :class:`.ReferenceVertex` instances, in which case the samples are collected from the :class:`.GBNvertex` instances.
+'''
+
+RAOBLACKWELL = False
+'''
+If `True` the Rao-Blackwellized estimates of the posterior marginals are collected as well: instead of counting the sampled values, the full conditional distributions computed by the sampler are averaged (see :meth:`.setConditional`). The averaged conditionals have a lower variance than the sample frequencies, they are returned by :meth:`.marginals` and by :meth:`.mean` with `estimator='raoblackwell'`.
+'''
+
+conditionals = {}
+'''
+Dictionary containing the sum of the full conditional distributions of the posterior vertices for every chain. The entries are `nVariables x max(cardinality)` arrays, row `i` belongs to column `i` of the samples (see :attr:`.currentIndex`), and rows of :class:`.ReferenceVertex` instances are not used (see :attr:`.domainColumns`)
+
+    { key = 'chainIdentification' : value = :class:`numpy.array` }
+'''
+
+currentConditionalSum = None
+'''
+The entry of :attr:`.conditionals` of the current chain
+'''
+
+currentConditional = None
+'''
+:class:`numpy.array` with the latest full conditional distribution of every posterior vertex, updated by the sampler using :meth:`.setConditional` and :meth:`.setCompiledConditionals`
+'''
+
+latestConditionals = {}
+'''
+Dictionary containing :attr:`.currentConditional` of every chain, used by :meth:`.switchChain`
+'''
+
+compiledColumn = None
+'''
+`numpy.array` mapping every :class:`.CompiledGBN` vertex index to its column in :attr:`.currentChain` (`-1` if the vertex is not a posterior vertex)
+'''
+
+domainValues = None
+'''
+`nVariables x max(cardinality)` :class:`numpy.array`, row `i` contains the domain of the attribute of column `i` (padded with zeros)
+'''
+
+domainMask = None
+'''
+Boolean `nVariables x max(cardinality)` :class:`numpy.array`, `True` for the entries of :attr:`.domainValues` that belong to the domain
+'''
+
+cardinalities = None
+'''
+`numpy.array` with the cardinality of the attribute of every column
+'''
+
+domainColumns = None
+'''
+Boolean `numpy.array`, `True` for the columns whose values are in the domain of an attribute (i.e. all but :class:`.ReferenceVertex` columns). For these columns the value counts and the Rao-Blackwellized estimates are collected.
+'''
+
+STORETRACE = True
+'''
+If `True` the collected samples are stored in :attr:`.samples`. Otherwise only the :class:`.Accumulator` of every chain is kept and the memory doesn't grow with the number of samples; the diagnostics that need the full traces (e.g. :meth:`.autocorrelation`) are not available.
+'''
+
+THIN = 1
+'''
+Only every `THIN`-th sample is collected
+'''
+
+accumulators = {}
+'''
+Dictionary containing the :class:`.Accumulator` of every chain
+
+    { key = 'chainIdentification' : value = :class:`.Accumulator` }
+'''
+
+currentAccumulator = None
+'''
+The :class:`.Accumulator` of the current chain
+'''
+
 def initChain(chainID,ITER,onlyEvent=False):
     '''
     Initializes a new MCMC run. Note that `onlyEvent=False`, so the samples or all `engine.GBN.samplingVertices` are collected. But the posterior is a joint distribution over the event variables (thus the other sampling variables are already marginalized)
+
+    If :attr:`STORETRACE` is `True`, every :attr:`THIN`-th sample is stored in :attr:`.currentChain` using the smallest dtype that fits the values (see :meth:`.traceDtype`). The :class:`.Accumulator` of the chain is updated in any case.
     
     :arg chainID: String identification for new chain
     :arg ITER: Number of samples to be collected
     :arg onlyEvent: Bolean, if `True` only the values of the event vertices are collected (i.e. not latent sampling variables)
     '''
-    global samples,currentChain,currentIndex,posteriorVertices
+    global samples,currentChain,currentChainID,currentIndex,posteriorVertices,compiledIndex,currentAccumulator
     
     posteriorVertices = engine.GBN.samplingVertices
 
@@ -64,37 +151,286 @@ def initChain(chainID,ITER,onlyEvent=False):
     for i,vertexID in enumerate(posteriorVertices.keys()):
         currentIndex[vertexID] = i
         
+    initColumns()
 
     nVariables = len(posteriorVertices)
+    nSamples = (ITER + THIN - 1) / THIN
 
-    samples[chainID] = N.zeros((ITER,nVariables))
+    samples[chainID] = None
+    if STORETRACE:
+        samples[chainID] = N.zeros((nSamples,nVariables),dtype=traceDtype())
     currentChain = samples[chainID]
+    currentChainID = chainID
+
+    accumulators[chainID] = Accumulator(nVariables,domainValues.shape[1],nSamples)
+    currentAccumulator = accumulators[chainID]
+
+    compiledIndex = None
+    if engine.compiledGBN is not None:
+        if not [gbnV for gbnV in posteriorVertices.values() if isinstance(gbnV,ReferenceVertex)]:
+            compiledIndex = engine.compiledGBN.indices(posteriorVertices.keys())
+
+    if RAOBLACKWELL:
+        initConditionals(chainID)
+    elif chainID in conditionals:
+        del conditionals[chainID]
+
+
+def switchChain(chainID):
+    '''
+    Continues collecting samples for the chain `chainID`, which has been initialized using :meth:`.initChain`. Used to run several chains interleaved (see :mod:`.adaptive`).
+
+    :arg chainID: String identification of the chain
+    '''
+    global currentChain,currentChainID,currentAccumulator,currentConditional,currentConditionalSum
+
+    currentChain = samples[chainID]
+    currentChainID = chainID
+    currentAccumulator = accumulators[chainID]
+    if RAOBLACKWELL:
+        currentConditional = latestConditionals[chainID]
+        currentConditionalSum = conditionals[chainID]
+
+
+def truncateChains(ITER):
+    '''
+    Discards the rows of the stored samples that haven't been collected, if a run stopped before the allocated number of iterations (see :mod:`.adaptive`).
+
+    :arg ITER: Number of iterations that have been run
+    '''
+    global currentChain
+
+    nSamples = (ITER + THIN - 1) / THIN
+    for chainID in samples.keys():
+        if samples[chainID] is not None:
+            samples[chainID] = samples[chainID][:nSamples]
+    if currentChainID is not None:
+        currentChain = samples[currentChainID]
+
+
+def initColumns():
+    '''
+    Computes the information about the columns of the samples, i.e. :attr:`.domainValues`, :attr:`.domainMask`, :attr:`.cardinalities` and :attr:`.domainColumns`. The order of the columns is given by :attr:`.currentIndex`.
+    '''
+    global domainValues,domainMask,cardinalities,domainColumns
+
+    gbnVs = sorted(posteriorVertices.values(),key=lambda gbnV: currentIndex[gbnV.ID])
+    nVariables = len(gbnVs)
+    maxCard = max([gbnV.attr.cardinality for gbnV in gbnVs] + [1])
+
+    domainColumns = N.array([not isinstance(gbnV,ReferenceVertex) for gbnV in gbnVs],dtype=bool)
+    cardinalities = N.array([gbnV.attr.cardinality for gbnV in gbnVs],dtype=N.intp)
+    domainValues = N.zeros((nVariables,maxCard))
+    domainMask = N.zeros((nVariables,maxCard),dtype=bool)
+    for i,gbnV in enumerate(gbnVs):
+        if domainColumns[i]:
+            domainValues[i,:gbnV.attr.cardinality] = gbnV.attr.domain
+            domainMask[i,:gbnV.attr.cardinality] = True
+
+
+def traceDtype():
+    '''
+    Returns the smallest dtype that can store the values of all posterior vertices: the smallest integer type that fits all domains, `numpy.int64` if the posterior contains :class:`.ReferenceVertex` instances (the sampled values are primary keys) and `numpy.float64` if a domain contains non integer values.
+    '''
+    if not domainColumns.all():
+        return N.int64
+    values = domainValues[domainMask]
+    if len(values) == 0:
+        return N.int8
+    if (values != N.round(values)).any():
+        return N.float64
+    return N.promote_types(N.min_scalar_type(int(values.min())),N.min_scalar_type(int(values.max())))
+
+
+def initConditionals(chainID):
+    '''
+    Initializes the data structures used to collect the Rao-Blackwellized estimates of chain `chainID`, see :attr:`RAOBLACKWELL`
+
+    :arg chainID: String identification of the chain
+    '''
+    global currentConditional,currentConditionalSum,compiledColumn
+
+    (nVariables,maxCard) = domainValues.shape
+
+    conditionals[chainID] = N.zeros((nVariables,maxCard))
+    currentConditionalSum = conditionals[chainID]
+    currentConditional = N.zeros((nVariables,maxCard))
+    latestConditionals[chainID] = currentConditional
+
+    compiledColumn = None
+    if engine.compiledGBN is not None:
+        compiledColumn = -N.ones(engine.compiledGBN.nVertices,dtype=N.intp)
+        for (gbnID,i) in currentIndex.items():
+            if domainColumns[i]:
+                compiledColumn[engine.compiledGBN.index[gbnID]] = i
+
+
+def setConditional(gbnV,fc):
+    '''
+    Stores the full conditional distribution `fc` that the sampler computed for `gbnV`. Nothing is stored if `gbnV` is not a posterior vertex.
+
+    :arg gbnV: :class:`.GBNvertex` instance
+    :arg fc: Normalized full conditional distribution, `numpy.array` of length `gbnV.attr.cardinality`
+    '''
+    if RAOBLACKWELL and gbnV.ID in currentIndex:
+        currentConditional[currentIndex[gbnV.ID],:len(fc)] = fc
+
+
+def setCompiledConditionals(vs,fc):
+    '''
+    Stores the full conditional distributions `fc` that the sampler computed for the :class:`.CompiledGBN` vertices `vs`, the vectorized equivalent of :meth:`.setConditional`.
+
+    :arg vs: `numpy.array` of vertex indices, all of the same attribute
+    :arg fc: Normalized full conditional distributions, `len(vs) x cardinality` array
+    '''
+    if RAOBLACKWELL:
+        cols = compiledColumn[vs]
+        posteriorVs = cols >= 0
+        if posteriorVs.any():
+            currentConditional[cols[posteriorVs],:fc.shape[1]] = fc[posteriorVs]
         
 
 def collectSamples(nSample):
     '''
-    Extracting the value of a node and storing it in the appropriate `numpy.array`, :attr:`.currentChain`.
+    Extracting the value of a node and storing it in the appropriate `numpy.array`, :attr:`.currentChain` (if :attr:`STORETRACE` is `True`), and in the :class:`.Accumulator` of the current chain. Only every :attr:`THIN`-th sample is collected.
     
-    :arg nSample: Int Count of the collected sample, i.e. the row number
+    :arg nSample: Int Count of the collected sample
     '''    
-    
+    if nSample % THIN != 0:
+        return
+
+    # the values of all posterior vertices are read from the compiled GBN at once
+    if compiledIndex is not None:
+        values = engine.compiledGBN.currentValues(compiledIndex)
+        indices = engine.compiledGBN.values[compiledIndex]
+    else:
+        values = vertexValues()
+        indices = valueIndices(values)
+
+    if STORETRACE:
+        currentChain[nSample / THIN,:] = values
+
+    currentAccumulator.add(values,indices)
+
+    if RAOBLACKWELL:
+        collectConditionals(values)
+
+
+def collectConditionals(values):
+    '''
+    Adds :attr:`.currentConditional` to the Rao-Blackwellized estimate of the current chain. Vertices that haven't been sampled yet (e.g. with :attr:`.gibbs.BLOCKGIBBS`) contribute their current value instead.
+
+    :arg values: `numpy.array`, the current values of the posterior vertices
+    '''
+    missing = N.flatnonzero(domainColumns & (currentConditional.sum(axis=1) == 0))
+    for i in missing:
+        card = cardinalities[i]
+        currentConditional[i,:card] = domainValues[i,:card] == values[i]
+
+    currentConditionalSum[:,:] += currentConditional
+
+
+def vertexValue(gbnV):
+    '''
+    Returns the value of a :class:`.GBNvertex` that is collected as a sample. For a :class:`.ReferenceVertex` this is the current reference.
+
+    :arg gbnV: :class:`.GBNvertex` instance
+    :returns: Value of the vertex
+    '''
+    # If the vertex is a reference vertex, we collect the current reference 
+    if isinstance(gbnV,ReferenceVertex):
+
+        # at this point we are assuming that k=1
+        # we can extract the ID using the 1st entry of the obj list of the attribute, e.g.  2 in e.g. 'Professor.fame.2' 
+        return gbnV.references.values()[0].obj[0]
+
+    # If the vertex is a normal vertex, we collect the sampled value
+    return gbnV.value
+
+
+def vertexValues():
+    '''
+    Returns the values of the :class:`.GBNvertex` instances, see :meth:`.collectSamples` and :meth:`.vertexValue`
+
+    :returns: `numpy.array` of values, ordered by :attr:`.currentIndex`
+    '''
+    values = N.zeros(len(currentIndex))
     for gbnID,gbnV in posteriorVertices.items():
-        
-        # If the vertex is a reference vertex, we collect the current reference 
-        if isinstance(gbnV,ReferenceVertex):
+        values[currentIndex[gbnID]] = vertexValue(gbnV)
 
-            i = currentIndex[gbnID]
+    return values
 
-            # at this point we are assuming that k=1
-            # we can extract the ID using the 1st entry of the obj list of the attribute, e.g.  2 in e.g. 'Professor.fame.2' 
-            currentChain[nSample,i] = gbnV.references.values()[0].obj[0]
-            
 
-        # If the vertex is a normal vertex, we collect the sampled value
-        else:
-            
-            i = currentIndex[gbnID]
-            currentChain[nSample,i] = gbnV.value
+def valueIndices(values):
+    '''
+    :arg values: `numpy.array` of values, ordered by :attr:`.currentIndex`
+    :returns: `numpy.array` with the domain index of every value, `-1` for the columns without domain (see :attr:`.domainColumns`)
+    '''
+    matches = (domainValues == values[:,N.newaxis]) & domainMask
+    indices = matches.argmax(axis=1)
+    indices[~matches.any(axis=1)] = -1
+    return indices
+
+
+class Accumulator():
+    '''
+    Constant memory summary of the samples of one chain, its size doesn't depend on the number of samples. It keeps the number of samples, the running mean and variance of every variable (Welford's algorithm) and the counts of the sampled domain values.
+    '''
+    def __init__(self,nVariables,maxCard,maxSamples):
+        '''
+        :arg nVariables: Number of posterior variables
+        :arg maxCard: Maximal cardinality of the posterior variables
+        :arg maxSamples: Maximal number of samples, used to choose the dtype of the counts
+        '''
+        self.n = 0
+        '''Number of collected samples
+        '''
+        self.mean = N.zeros(nVariables)
+        '''Running mean of every variable
+        '''
+        self.M2 = N.zeros(nVariables)
+        '''Running sum of the squared differences from the mean of every variable
+        '''
+        self.counts = N.zeros((nVariables,maxCard),dtype=N.min_scalar_type(maxSamples))
+        '''`nVariables x maxCard` array, the number of times every domain value was sampled
+        '''
+
+    def add(self,values,indices):
+        '''
+        Adds one sample
+
+        :arg values: `numpy.array` of values
+        :arg indices: `numpy.array` with the domain index of every value, `-1` if the variable has no domain
+        '''
+        self.n += 1
+        delta = values - self.mean
+        self.mean += delta / self.n
+        self.M2 += delta * (values - self.mean)
+        cols = N.flatnonzero(indices >= 0)
+        self.counts[cols,indices[cols]] += 1
+
+    def variance(self):
+        '''
+        :returns: The sample variance of every variable
+        '''
+        return self.M2 / max(self.n - 1,1)
+
+    def __repr__(self):
+        return 'Accumulator (%s samples, %s variables)'%(self.n,len(self.mean))
+
+
+def trace(chainID=None):
+    '''
+    Returns the stored samples of the chain `chainID` (default is the current chain).
+
+    :arg chainID: Optional identification of chain
+    :returns: `numpy.array` of samples
+    '''
+    if chainID is None:
+        chainID = currentChainID
+    if samples.get(chainID) is None:
+        raise Exception('The samples of %s were not stored (STORETRACE=False), only the accumulated statistics are available'%chainID)
+    return samples[chainID]
 
 
 def plotCumulativeMeanAllChains(**kwargs):
@@ -105,6 +441,8 @@ def plotCumulativeMeanAllChains(**kwargs):
 
     :arg kwargs: Optional arguments for :meth:`.cumulativeMean`
     '''    
+    import pylab as PL
+
     # create new figure to plot all chains in
     fig = PL.figure()     
     for chainID in samples.keys():        
@@ -120,10 +458,9 @@ def plotCumulativeMean(**kwargs):
     :arg gbnV: Optional :class:`GBNvertex` to be analyzed
     :arg fig: Optional `matplotlib.figure.Figure` to be used 
     '''
+    import pylab as PL
 
-    chain = currentChain
-    if 'chainID' in kwargs:
-        chain = samples[kwargs['chainID']]
+    chain = trace(kwargs.get('chainID'))
     
     #calculate cumulative mean
     cumChain = cumulativeMean(chain)
@@ -144,7 +481,7 @@ def plotCumulativeMean(**kwargs):
     elif 'gbnV' in kwargs:
         gbnID = kwargs['gbnV'].ID
         PL.plot(cumChain[:,currentIndex[gbnID]])
-        PL.xlabel('Samples for %s'%gbnID)
+        PL.xlabel('Samples for %s'%registry.name(gbnID))
         PL.ylabel('Mean')        
     else:
         # plot cumulative for all posterior variables in subplots
@@ -152,7 +489,7 @@ def plotCumulativeMean(**kwargs):
         for i,pID in enumerate(posteriorVertices.keys()):        
             PL.subplot(len(posteriorVertices),1,(i+1))            
             PL.plot(cumChain[:,currentIndex[pID]])            
-            PL.xlabel('Samples for %s'%pID)
+            PL.xlabel('Samples for %s'%registry.name(pID))
             PL.ylabel('Mean')
 
 
@@ -162,54 +499,80 @@ def cumulativeMean(chain):
 
     :arg chain: `numpy.array` 
     '''
-    cumChain = chain.cumsum(axis=0)
-    for i in range(cumChain.shape[0]):
-        cumChain[i,:] = cumChain[i,:]/(i+1.)    
+    return diagnostics.cumulativeMean(chain)
+
+def marginals(chainID=None, gbnV=None):
+    '''
+    Returns the Rao-Blackwellized posterior marginals of the posterior vertices, i.e. the average of the full conditional distributions collected during sampling (see :attr:`RAOBLACKWELL`). If a `chainID` is provided the marginals of the associated chain are returned, otherwise those of the currentChain. 
+
+    :arg chainID: Optional identification of chain to be analyzed
+    :arg gbnV: Optional :class:`GBNvertex` posterior variable to be analyzed 
+    :returns: `nVariables x max(cardinality)` :class:`numpy.array`, row `i` is the marginal of the variable with index `i` (padded with zeros). If `gbnV` is specified, the marginal of this variable.
+    '''
+    if chainID is None:
+        chainID = currentChainID
+    if chainID not in conditionals:
+        raise Exception('No Rao-Blackwellized estimates were collected for %s'%chainID)
+        
+    marg = conditionals[chainID] / accumulators[chainID].n
+    
+    if gbnV is not None:
+        i = currentIndex[gbnV.ID]
+        return marg[i,:cardinalities[i]]
+    else:
+        return marg
 
-    return cumChain
 
-def mean(chainID=None, gbnV=None, sVarInd=None, combined=False):
+def mean(chainID=None, gbnV=None, sVarInd=None, combined=False, estimator='samples'):
     '''
     Returns the posterior mean of all the sampling variables in the currentChain. 
     If a `chainID` is provided the mean of the associated chain is returned instead. If `sVarInd` or `gbnV` is provided, only the mean of this variable is returned.
-    
-    The :meth:`pylab.hist` method is used to compute the histogram
+
+    By default the mean of the sampled values is read from the :class:`.Accumulator` of the chain. With `estimator='raoblackwell'` the mean is computed from the Rao-Blackwellized :meth:`.marginals` instead (except for :class:`.ReferenceVertex` variables), they have to be collected (see :attr:`RAOBLACKWELL`).
     
     :arg chainID: Optional identification of chain to be analyzed
     :arg sVarInd: Optional index of event variable to be analyzed
     :arg gbnV: Optional :class:`GBNvertex` event variable to be analyzed 
     :arg combined: Optional (default `False`), if `True` the mean of the mean of all event variables is returned (single value).   
+    :arg estimator: Optional, `'samples'` (default) or `'raoblackwell'`
     :returns: Posterior mean as :class:`numpy.array`. If `sVarInd` or `gbnV` are specified, this is a single value
     '''
-    chain = currentChain
-    if chainID is not None:
-        chain = samples[chainID]
+    if chainID is None:
+        chainID = currentChainID
+    if estimator not in ['samples','raoblackwell']:
+        raise Exception('Unknown estimator %s'%estimator)
             
+    chainMean = accumulators[chainID].mean.copy()
+    if estimator == 'raoblackwell':
+        rbMean = (marginals(chainID) * domainValues).sum(axis=1)
+        chainMean[domainColumns] = rbMean[domainColumns]
+
     #computing mean for one or all variables?
     if combined:
-        return N.mean(chain)
+        return N.mean(chainMean)
     elif sVarInd is not None:
-        return N.mean(chain[:,sVarInd])
+        return chainMean[sVarInd]
     elif gbnV is not None:
         ind = currentIndex[gbnV]    
-        return N.mean(chain[:,ind])
+        return chainMean[ind]
     else:
-        return N.mean(chain,0)    
+        return chainMean    
 
 
 def histogramm(**kwargs):
     '''
     Convergence diagnostics that plots the posterior density function (using the matplotlib histogram) mean of all the sampling variables in the currentChain. 
-    If a `chainID` is provided the histogram of the associated chain is plotted instead. If `varIndex` or `gbnV` is provided, only the histogram of this variable is plotted.
+    If a `chainID` is provided the histogram of the associated chain is plotted instead. If `varIndex` or `gbnV` is provided, only the histogram of this variable is plotted. If the samples were not stored (see :attr:`STORETRACE`), the value counts of the :class:`.Accumulator` are plotted.
     
     :arg chainID: Optional identification of chain to be analyzed
     :arg varIndex: Optional index of event variable to be analyzed
     :arg gbnV: Optional :class:`GBNvertex` event variable to be analyzed    
     :arg fig: Optional `matplotlib.figure.Figure` to be used 
     '''
-    chain = currentChain
-    if 'chainID' in kwargs:
-        chain = samples[kwargs['chainID']]
+    import pylab as PL
+
+    chainID = kwargs.get('chainID',currentChainID)
+    chain = samples[chainID]
         
     
     # either plot on a new or specific figure window
@@ -219,8 +582,18 @@ def histogramm(**kwargs):
         PL.figure(fig.number)
     else:
         fig = PL.figure()
+
+    if chain is None:
+        # only the value counts are available
+        i = kwargs.get('varIndex')
+        if 'gbnV' in kwargs:
+            i = currentIndex[kwargs['gbnV'].ID]
+        if i is None or not domainColumns[i]:
+            raise Exception('The histogram of the accumulated statistics requires a variable with a domain (varIndex or gbnV)')
+        card = cardinalities[i]
+        PL.bar(domainValues[i,:card],accumulators[chainID].counts[i,:card])
                 
-    if 'varIndex' in kwargs:        
+    elif 'varIndex' in kwargs:        
         PL.hist(chain[:,kwargs['varIndex']])
     elif 'gbnV' in kwargs:        
         PL.hist(chain[:,currentIndex[kwargs['gbnV'].ID]])
@@ -232,134 +605,119 @@ def histogramm(**kwargs):
 
 def gelman_rubin():
     '''
-    Plots the Gelman Rubin convergence diagnostic, according to `Probabilistic Graphical Models` (p. 523).
-    '''
-
-    # extract the number of samples M 
-    M = engine.inferenceAlgo.ITER
-    # number of discarded samples (burnin)
-    T = engine.inferenceAlgo.BURNIN
-    # number of chains
-    K = engine.inferenceAlgo.CHAINS
+    Plots the Gelman Rubin convergence diagnostic computed by :meth:`.gelmanRubinCurve`.
+    If the samples were not stored (see :attr:`STORETRACE`), only the final value is computed from the accumulated statistics and plotted, see :meth:`.gelmanRubinAccumulated`.
 
+    :returns: The diagnostic, see :meth:`.gelmanRubinCurve`
+    '''
+    import pylab as PL
 
-    # cumulative mean of for all chains
-    # f^{bar}_{k} in koller book
-    f_bar_K = {}
-    for ID,chain in samples.items():
-        f_bar_k = cumulativeMean(chain)
-        f_bar_K[ID] = f_bar_k
-    
-    # cumulative mean across all chains
-    # f^{bar} in koller book
-    f_bar = N.zeros(currentChain.shape,dtype=float)
-    for f_bar_k in f_bar_K.values():
-        f_bar += f_bar_k
-    f_bar /= K
+    if [chain for chain in samples.values() if chain is None]:
+        R_hat = gelmanRubinAccumulated()
 
-    # between chain variance
-    # B in koller book
-    B = N.zeros(currentChain.shape,dtype=float)
-    for f_bar_k in f_bar_K.values():
-        B += (f_bar_k - f_bar)**2
-    B *= M/(K-1)
-
-    # with-in chain variance
-    # W in koller book
-    W = N.zeros(currentChain.shape,dtype=float)
-    # With just one sample variance will be inf
-    # W[0,:] = N.inf
-    W[0,:] = 1
-    for ID,chain in samples.items():
-        for j in range(1,M):
-            W[j,:] += 1./(j)*((chain[0:(j+1),:]-f_bar_K[ID][j,:])**2).sum(axis=0)
-        # W += ((chain - f_bar_K[ID])**2).cumsum(axis=0)
-
-    W *= (1./K)
-
-    # An estimator that can be shown to overestimate the variance
-    # V in koller book
-    V = (M-1.)/M * W + 1./M * B
+        PL.figure()
+        PL.bar(N.arange(R_hat.shape[1]),R_hat[0])
+        PL.ylabel('Gelman-Rubin')
 
-    # For M to ininity, both V and W converge to the true variance of the estimate
-    
-    # Measure of disagreement between the chains
-    # R_hat is koller book
+        return R_hat
 
-    R_hat = N.sqrt(V/W)
-
-    # print 'samples',samples.values()
-    # print 'f_bar_K',f_bar_K
-    # print 'f_bar',f_bar
-    # print 'B',B
-    # print 'W',W 
-    # print 'V',V 
-    # print 'R_hat',R_hat
+    R_hat = gelmanRubinCurve()
 
     PL.figure()
 
     for i,pID in enumerate(posteriorVertices.keys()):        
 
         PL.subplot(len(posteriorVertices),1,(i+1))
-        PL.plot(R_hat[1:,currentIndex[pID]])
+        PL.plot(R_hat[:,currentIndex[pID]])
         PL.xlabel(pID)
         PL.ylabel('Gelman-Rubin')
     
-    return R_hat[1:,:]
-    
-def autocorrelation(max_l = 50, **kwargs):
+    return R_hat
+
+
+def gelmanRubinCurve():
     '''
-    Plots the autocorrelation. Computed according to `Probabilistic Graphical Models` (p. 521). 
+    Computes the Gelman Rubin convergence diagnostic of all chains after every collected sample, according to `Probabilistic Graphical Models` (p. 523), see :meth:`.diagnostics.gelmanRubin`.
+    If the samples were not stored (see :attr:`STORETRACE`), only the final value is computed, see :meth:`.gelmanRubinAccumulated`.
 
-    :arg max_l: The autocorellation will be calculated up to lag `max_l` (default=50)
-    :arg chainID: Optional identification of chain to be analyzed
+    :returns: `(M-1) x nVariables` :class:`numpy.array`, the columns are ordered by :attr:`.currentIndex`
     '''
-    chain = currentChain
-    if 'chainID' in kwargs:
-        chain = samples[kwargs['chainID']]
+    if [chain for chain in samples.values() if chain is None]:
+        return gelmanRubinAccumulated()
 
+    return diagnostics.gelmanRubin(samples.values())
 
-    # extract the number of samples M 
-    M = engine.inferenceAlgo.ITER
     
-    # The cumulative mean
-    E_bar = cumulativeMean(chain)
+def gelmanRubinAccumulated():
+    '''
+    Computes the Gelman Rubin convergence diagnostic for all samples from the :class:`.Accumulator` instances of the chains, i.e. the last value of the curve computed by :meth:`.gelmanRubinCurve`.
 
-    # The `cumulative` Variance (equation 12.27)
-    V = N.zeros(chain.shape,dtype=float)
-    # Variance with one sample would be infinite I guess
-    V[0,:] = N.inf
-    for j in range(1,M):
-        V[j,:] = 1./(j)*((chain[0:(j+1),:]-E_bar[j,:])**2).sum(axis=0)
+    :returns: `1 x nVariables` :class:`numpy.array`
+    '''
+    accs = [accumulators[ID] for ID in samples.keys()]
+    # number of chains
+    K = len(accs)
+    # number of samples 
+    M = accs[0].n
 
-    # Note that so far we have calculated the cumulative values or the mean and variance, i.e. E_bar and V are M x |Y| matrices
-    # However, for the covariance and the autocorrelation we only use the mean/variance for all M samples, i.e. V[-1,:] and E_bar[-1,:]
+    chainMeans = N.array([acc.mean for acc in accs])
+    # between chain variance
+    B = M/(K-1.) * ((chainMeans - chainMeans.mean(axis=0))**2).sum(axis=0)
+    # with-in chain variance
+    W = N.array([acc.variance() for acc in accs]).mean(axis=0)
 
-    # The covariance (equation 12.28)
-    # A max_l x |Y| matrix, column `l` is the covariance with lag `l`
-    C = N.zeros((max_l,chain.shape[1]),dtype=float)
-    # For l=0, the covariance is equal to the variane
-    C[0,:] = V[-1,:]
-    for l in range(1,max_l):
-        C[l,:] = 1./(M-l) * ((chain[0:(M-l),:]-E_bar[-1])*(chain[l:,:]-E_bar[-1])).sum(axis=0)
+    V = (M-1.)/M * W + 1./M * B
+    R_hat = N.sqrt(V/W)
 
+    return R_hat[N.newaxis,:]
 
-    
 
-    # autocorrelation   
-    A = C / V[-1,:]
+def autocorrelation(max_l = 50, **kwargs):
+    '''
+    Plots the autocorrelation computed by :meth:`.autocorrelations`.
+
+    :arg max_l: The autocorellation will be calculated up to lag `max_l` (default=50)
+    :arg chainID: Optional identification of chain to be analyzed
+    :returns: The autocorrelation, see :meth:`.autocorrelations`
+    '''
+    import pylab as PL
 
-    # print A
+    A = autocorrelations(max_l,kwargs.get('chainID'))
 
     PL.figure()
 
     for i,pID in enumerate(posteriorVertices.keys()):        
 
         PL.subplot(len(posteriorVertices),1,(i+1))
-        PL.bar(N.arange(max_l), A[:,currentIndex[pID]])        
+        PL.bar(N.arange(A.shape[0]), A[:,currentIndex[pID]])        
         PL.xlabel(pID)
         PL.ylabel('Autocorrelation')
-    
+
+    return A
+
+
+def autocorrelations(maxLag=None, chainID=None):
+    '''
+    Computes the autocorrelation of the samples of a chain, according to `Probabilistic Graphical Models` (p. 521), see :meth:`.diagnostics.autocorrelation`.
+
+    :arg maxLag: Optional, the autocorrelation is calculated for the lags `0,...,maxLag-1` (default all lags)
+    :arg chainID: Optional identification of chain to be analyzed (default is the current chain)
+    :returns: `maxLag x nVariables` :class:`numpy.array`, the columns are ordered by :attr:`.currentIndex`
+    '''
+    return diagnostics.autocorrelation(trace(chainID),maxLag)
+
+
+def effectiveSampleSize(chainID=None):
+    '''
+    Estimates the effective sample size of every posterior variable, see :meth:`.diagnostics.effectiveSampleSize`. If no `chainID` is provided, the effective sample sizes of all chains are added up.
+
+    :arg chainID: Optional identification of chain to be analyzed
+    :returns: :class:`numpy.array` of length `nVariables`, ordered by :attr:`.currentIndex`
+    '''
+    if chainID is not None:
+        return diagnostics.effectiveSampleSize(trace(chainID))
+
+    return N.array([diagnostics.effectiveSampleSize(trace(ID)) for ID in samples.keys()]).sum(axis=0)
 
 
 
@@ -141,7 +141,7 @@ class Query():
         '''
         Dictionary used to check whether attribute objects are part of the evidence. Format:
         
-            { key = :class:`.Attribute` instance : value = ( :attr:`.ObjsVariable.constraint` , [ List of  :attr:`.GBNvertex.ID` ] ) }
+            { key = :class:`.Attribute` instance : value = ( :attr:`.ObjsVariable.constraint` , set([ integer :attr:`.GBNvertex.ID` ]) ) }
         
         When unrolling a GBN we are creating a d-separated BN for the query :math:`P(\mathbb{Y} \mid \mathbb{E})`. We need an efficient way
         to look up wheter a certain GBN node is in the evidence because this influences the structure of the 
@@ -164,7 +164,7 @@ class Query():
         self.objEvidenceLookup = {}
         if self.evidence is not None:
             for qvar in self.evidence:
-                self.objEvidenceLookup[qvar.attr] = (qvar.objs.constraint ,[computeID(qvar.attr,pkVal) for pkVal in qvar.objs.pkValues])
+                self.objEvidenceLookup[qvar.attr] = (qvar.objs.constraint ,set([computeID(qvar.attr,pkVal) for pkVal in qvar.objs.pkValues]))
     
 
     
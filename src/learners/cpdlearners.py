@@ -6,6 +6,8 @@ The basic CPD class is :class:`prm.localdistributions.CPD` which can be implemen
 :class:`prm.localdistributions.CPDTabular` stores the CPD as a matrix, whereas :class:`prm.localdistributions.CPDTree` 
 stores the CPD in a decision tree (not implemented yet).
 
+The counts of the full assignments (the sufficient statistics) are computed once per attribute and dataset and cached by the learner. A cached entry is loaded again if the data version of its dataset has changed (see :meth:`.DataSetInterface.dataVersion`), the cache is cleared if the CPDs are learned with `forceLearning=True`. If the data interface contains multiple datasets (the folds of a cross validation, see :meth:`data.datainterface.computeTrainingSets`), the counts of a training set are the total counts minus the counts of the held-out fold. Thus the CPDs of all `K` training sets are learned with `K` scans of the data, and different pseudo counts can be evaluated without accessing the data again (see :meth:`.CPDTabularLearner.crossValidate`).
+
 '''
 
 from analytics.performance import time_analysis
@@ -15,6 +17,12 @@ from prm.localdistribution import CPDTabular
 #from pylab import *
 import numpy as N
 
+
+PSEUDO_COUNT = 1
+'''
+Pseudo count that is added to the count of every full assignment before the rows of a CPD matrix are normalized (a uniform Dirichlet prior), see :meth:`.CPDTabularLearner.estimateCPD`
+'''
+
 class CPDLearner():
     '''
     Abstract class that is used to learn the conditional probability distributions for 
@@ -47,28 +55,41 @@ class CPDTabularLearner(CPDLearner):
     def __init__(self):
         
         CPDLearner.__init__(self)                                                                         
+
+        self.counts = {}
+        '''Cache of the sufficient statistics `{ (attribute,aggregate) : { dsi : (data version,counts) } }`, the counts of the flattened CPD matrix of an attribute in every dataset and the data version of the dataset when they were loaded, see :meth:`.datasetCounts`
+        '''
         
     
     def learnCPDs(self,saveDistributions=False,forceLearning=False):
         '''
         Depending on which method is standard for learning CPDs, either
-        :meth:`.learnCPDsCount` or :meth:`.learnCPDsFull` is executed.
+        :meth:`.learnCPDsCount` or :meth:`.learnCPDsFull` is executed. Both methods learn the same CPDs, 
+        :meth:`.learnCPDsCount` only transfers one row per assignment from the database.
         '''
         
-        #self.learnCPDsCount(saveDistributions,forceLearning)
-        self.learnCPDsFull(saveDistributions,forceLearning)
+        self.learnCPDsCount(saveDistributions,forceLearning)
+        #self.learnCPDsFull(saveDistributions,forceLearning)
         
     #@time_analysis
-    def learnCPDsCount(self,saveDistributions=False,forceLearning=False):
+    def learnCPDsCount(self,saveDistributions=False,forceLearning=False,aggregate=False):
         '''
         Learns the conditional probability distributions for all probabilistic attributes
         by counting the occurences on the data side. If the data interface connects
-        to a SQL based database this can easily be done using the `COUNT` statement. 
-        The data is retrieved by calling the data interface method :meth:`data.sqliteinterface.loadCountCPDdata`
+        to a SQL based database this can easily be done using `COUNT` and `GROUP BY`. 
+        The data is retrieved by calling the data interface method :meth:`data.sqliteinterface.SQLiteDI.loadCountCPDdata`,
+        every row contains a full assignment and its count [valAttr, valPa1, valPa2, etc., count]. Only the assignments
+        that occur in the data are returned, the counts are added to the entries of the CPD matrix given by :meth:`.CPDTabular.indexingCPDs`.
+        The counts of a dataset are only loaded if they aren't cached yet (see :meth:`.datasetCounts`).
         
         :arg saveDistributions: If `True`, saves the learned CPDs to disk and prints the XML line that needs to be added to the PRM specification to the standard output
-        :arg forceLearning: If `True`, the CPDs are learned even if there are distributions that could be loaded from disk
+        :arg forceLearning: If `True`, the CPDs are learned even if there are distributions that could be loaded from disk, and the cached counts are discarded (see :meth:`.clearCounts`)
+        :arg aggregate: If `True`, the parent values of an attribute object are aggregated before counting (see :meth:`data.sqliteinterface.SQLiteDI.loadFullAggCPDdata`)
         '''
+        if forceLearning:
+            self.clearCounts()
+
+        print "Learning CPD for attributes '%s'"%(','.join([attr.fullname for attr in self.prmToLearn.attributes.values() if attr.probabilistic]))
         #iterate over all attributes
         for attr in self.prmToLearn.attributes.values():                        
 
@@ -79,60 +100,18 @@ class CPDTabularLearner(CPDLearner):
                     
                 else: #only learn attributes that don't have a CPD yet (it could also be specified in prm)
 
-                    print "... Learning CPD for attribute '%s'"%(attr.fullname)
-                
                     #create CPD instance for attribute
                     attr.CPD = CPDTabular(attr)
-                    #we count all occurrences of the individual parent assignments
-                    counter = N.zeros((attr.CPD.cpdMatrix.shape[0],1))
-                
                 
                     '''
-                    We learn the distributions over all the trainig sets (no cross validation)
+                    We learn the distributions over all the trainig sets (no cross validation), the counts of every dataset are cached
                     '''
-                    for dsi in self.di.DSI:
-                    
-                
-                        #load the full data for attribute
-                        #dsi.loadFullCPDdata(attr)
-
-                        #or load the aggregated data for attribute
-                        dsi.loadCountCPDdata(attr)
-                                                                            
-
-                        for i,currentRow in enumerate(dsi.resultSet()):
-                            
-                            #keeping track of the index for the attribute
-                            npa = attr.CPD.cpdMatrix.shape[0]
-                            attrIndex = i / npa
-                            parentIndex = i % npa
-                            
-                            '''                            
-                            We handle the current row
-                            '''
-                            #count the attribute assignment
-                            attr.CPD.cpdMatrix[parentIndex,attrIndex] = currentRow[0]
-                            #count the parent assignment
-                            counter[parentIndex] += currentRow[0]                            
-    
-                
-                    #add fake counts
-                    #TODO
-            
-                    #calculate probabilities
-                    attr.CPD.cpdMatrix = attr.CPD.cpdMatrix / counter 
-                
-                    #compute the cumulative distribution
-                    attr.CPD.computeCumulativeDist()
-                    attr.CPD.computeLogDists()
-                
-                    #print attr.CPD.cpdMatrix                    
-                    #print attr.CPD.cpdMatrix.sum(axis=1)
+                    self.estimateCPD(attr,self.totalCounts(attr,self.di.DSI,aggregate))
                 
                 
                 if saveDistributions:
                     ''' Finally we can save the distributions to file if desired '''    
-                    attr.CDP.save()
+                    attr.CPD.save()
     
     #@time_analysis
     def learnCPDsFull(self,saveDistributions=False,forceLearning=False):
@@ -141,7 +120,7 @@ class CPDTabularLearner(CPDLearner):
         by iterating over a big table counting the occurences on the way. If the data interface 
         connects to a SQL based database, the result set is a big table in the form
         [valAttr, valPa1, valPa2, etc.]. 
-        The data is retrieved by calling the data interface method :meth:`data.sqliteinterface.loadFullCPDdata`
+        The data is retrieved column by column in large batches by calling the data interface method :meth:`data.sqliteinterface.SQLiteDI.loadFullCPDcolumns`, the values of a batch are mapped to the indices of the CPD matrix (:meth:`.CPDTabular.indexingCPDs`) and counted with one `numpy.bincount`. The data is always scanned, the counts of every dataset replace the cached counts (see :meth:`.datasetCounts`).
         
         :arg saveDistributions: If `True`, saves the learned CPDs to disk and prints the XML line that needs to be added to the PRM specification to the standard output        
         :arg forceLearning: If `True`, the CPDs are learned even if there are distributions that could be loaded from disk
@@ -160,8 +139,6 @@ class CPDTabularLearner(CPDLearner):
                     
                     #create CPD instance for attribute
                     attr.CPD = CPDTabular(attr)
-                    #we count all occurrences of the individual parent assignments
-                    counter = N.zeros((attr.CPD.cpdMatrix.shape[0],1))
                     
                     
                     '''
@@ -169,46 +146,21 @@ class CPDTabularLearner(CPDLearner):
                     '''
                     for dsi in self.di.DSI:
                         
-                    
-                        #load the full data for attribute
-                        dsi.loadFullCPDdata(attr)
-
-                        #or load the aggregated data for attribute
-                        #dsi.loadFullAggCPDdata(attr)
-                        
-                                                                                
-                       
-                        for currentRow in dsi.resultSet():                                                                                                                                
+                        #we count all occurrences of the full assignments in the flattened cpdMatrix
+                        counts = N.zeros(attr.CPD.cpdMatrix.size)
 
-                            '''                            
-                            We handle the current row
-                            '''                        
+                        #load the full data for attribute, column by column in batches
+                        for columns in dsi.loadFullCPDcolumns(attr):
                             
-                            #compute the matrix index for the attribute values
-                            [indexRow,indexColumn] = attr.CPD.indexingCPD(currentRow)
-                            #count the attribute assignment
-                            attr.CPD.cpdMatrix[indexRow,indexColumn] += 1
-                            #count the parent assignment
-                            counter[indexRow] +=1
+                            '''
+                            We handle the current batch: the values are mapped to the indices of the cpd matrix
+                            and all assignments are counted at once
+                            '''
+                            counts += N.bincount(attr.CPD.indexingCPDs(columns),minlength=counts.size)
+
+                        self.counts.setdefault((attr,False),{})[dsi] = (dsi.dataVersion(),counts)
                         
-                    
-                         
-                    
-                    
-                    #add fake counts
-                    nF = 1
-                    attr.CPD.cpdMatrix += nF
-                    counter += attr.CPD.cpdMatrix.shape[1]*nF
-                
-                    #calculate probabilities
-                    attr.CPD.cpdMatrix = attr.CPD.cpdMatrix / counter 
-                    
-                    #compute the cumulative distribution
-                    attr.CPD.computeCumulativeDist()
-                    attr.CPD.computeLogDists()
-                    
-                    #print attr.CPD.cpdMatrix                    
-                    #print attr.CPD.cpdMatrix.sum(axis=1)
+                    self.estimateCPD(attr,self.totalCounts(attr,self.di.DSI))
                     
                     
                 if saveDistributions:
@@ -216,12 +168,122 @@ class CPDTabularLearner(CPDLearner):
                     attr.CPD.save()
                     
 
-    def loglikelihood(self):
+    def datasetCounts(self, attr, dsi, aggregate=False):
+        '''
+        Returns the counts of the full assignments of `attr` in the dataset `dsi`. They are loaded using :meth:`data.sqliteinterface.SQLiteDI.loadCountCPDdata` the first time, and cached in :attr:`.counts` afterwards. The cached counts are loaded again if the data version of `dsi` has changed since (see :meth:`.DataSetInterface.dataVersion`).
+
+        :arg attr: :class:`prm.attribute.Attribute` with a :class:`.CPDTabular` instance
+        :arg dsi: :class:`.DataSetInterface` instance
+        :arg aggregate: If `True`, the parent values of an attribute object are aggregated before counting (see :meth:`data.sqliteinterface.SQLiteDI.loadFullAggCPDdata`)
+        :returns: :class:`numpy.array` with the counts of the flattened `cpdMatrix`
+        '''
+        cache = self.counts.setdefault((attr,aggregate),{})
+        version = dsi.dataVersion()
+        if dsi not in cache or cache[dsi][0] != version:
+            counts = N.zeros(attr.CPD.cpdMatrix.size)
+            
+            #load the counted data for attribute
+            for columns in dsi.loadCountCPDdata(attr,aggregate).columns():
+                
+                '''
+                We handle the current batch of assignments: the counts are scattered into the cpd matrix
+                '''
+                N.add.at(counts,attr.CPD.indexingCPDs(columns[:-1]),columns[-1])
+            
+            cache[dsi] = (version,counts)
+        return cache[dsi][1]
+
+    def totalCounts(self, attr, dsis, aggregate=False):
+        '''
+        :arg attr: :class:`prm.attribute.Attribute` with a :class:`.CPDTabular` instance
+        :arg dsis: List of :class:`.DataSetInterface` instances
+        :arg aggregate: See :meth:`.datasetCounts`
+        :returns: :class:`numpy.array` with the counts of the flattened `cpdMatrix` summed over the datasets `dsis`
+        '''
+        counts = N.zeros(attr.CPD.cpdMatrix.size)
+        for dsi in dsis:
+            counts += self.datasetCounts(attr,dsi,aggregate)
+        return counts
+
+    def clearCounts(self):
+        '''
+        Discards the cached counts, e.g. if the data has changed through the connection of the dataset itself (which doesn't change the data version)
+        '''
+        self.counts = {}
+
+    def learnCPDsFold(self, testSet=None, pseudoCount=None, aggregate=False):
+        '''
+        Learns the CPDs of all probabilistic attributes from the training set of a cross validation fold, i.e. from all datasets except the held-out `testSet` (see :attr:`data.datainterface.trainingSets`). The counts of the training set are the total counts minus the counts of `testSet`, the counts are cached (see :meth:`.datasetCounts`).
+
+        :arg testSet: The held-out :class:`.DataSetInterface` instance, `None` if the CPDs are learned from all datasets
+        :arg pseudoCount: Optional pseudo count, see :meth:`.estimateCPD`
+        :arg aggregate: See :meth:`.datasetCounts`
         '''
-        Computes the log likelihood for the learned CPDs. As aggregation is possibly required, it uses the method
-        :meth:`data.sqliteinterface.loadFullAggCPDdata` to retrieve the data.
+        for attr in self.prmToLearn.attributes.values():
+            if attr.probabilistic:
+                attr.CPD = CPDTabular(attr)
+                counts = self.totalCounts(attr,self.di.DSI,aggregate)
+                if testSet is not None:
+                    counts -= self.datasetCounts(attr,testSet,aggregate)
+                self.estimateCPD(attr,counts,pseudoCount)
+
+    def crossValidate(self, pseudoCounts=None, aggregate=False):
+        '''
+        `K`-fold cross validation of the CPDs over the datasets of the data interface, the log likelihood of every held-out fold (see :meth:`.loglikelihood`) is computed for every pseudo count. The data is only scanned the first time the counts of a dataset are needed (see :meth:`.datasetCounts`), the CPDs of the folds and pseudo counts are computed from the cached counts. Finally the CPDs are learned from all datasets with the pseudo count that has the highest total log likelihood.
+
+        :arg pseudoCounts: Optional list of pseudo counts (default [:attr:`.PSEUDO_COUNT`])
+        :arg aggregate: See :meth:`.datasetCounts`
+        :returns: Dictionary `{ pseudoCount : [log likelihood of fold 1, log likelihood of fold 2, ...] }`, the folds are ordered as `datainterface.DSI`
+        '''
+        if len(self.di.DSI) < 2:
+            raise Exception("cross validation requires at least two datasets in the data interface")
+        if pseudoCounts is None:
+            pseudoCounts = [PSEUDO_COUNT]
+
+        results = {}
+        for pseudoCount in pseudoCounts:
+            results[pseudoCount] = []
+            for testSet in self.di.DSI:
+                self.learnCPDsFold(testSet,pseudoCount,aggregate)
+                results[pseudoCount].append(self.loglikelihood([testSet]))
+
+        best = max(pseudoCounts,key=lambda pseudoCount: sum(results[pseudoCount]))
+        self.learnCPDsFold(None,best,aggregate)
+        return results
+
+    def estimateCPD(self,attr,counts,pseudoCount=None):
+        '''
+        Computes the CPD of `attr` from the counts of the full assignments. A pseudo count (:attr:`.PSEUDO_COUNT` by default) is added to every
+        assignment, the rows of the CPD matrix are normalized and the cumulative and log distributions are computed.
+
+        :arg attr: :class:`prm.attribute.Attribute` with a :class:`.CPDTabular` instance
+        :arg counts: :class:`numpy.array` with the counts of the flattened `cpdMatrix`, it isn't modified
+        :arg pseudoCount: Optional pseudo count
+        '''
+        if pseudoCount is None:
+            pseudoCount = PSEUDO_COUNT
+
+        #add fake counts
+        attr.CPD.cpdMatrix = counts.reshape(attr.CPD.cpdMatrixDim) + pseudoCount
+        #count the parent assignments
+        counter = attr.CPD.cpdMatrix.sum(axis=1)[:,N.newaxis]
+    
+        #calculate probabilities
+        attr.CPD.cpdMatrix = attr.CPD.cpdMatrix / counter 
         
+        #compute the cumulative distribution
+        attr.CPD.computeCumulativeDist()
+        attr.CPD.computeLogDists()
+
+    def loglikelihood(self, dsis=None):
         '''
+        Computes the log likelihood for the learned CPDs. As aggregation is possibly required, the assignments of
+        :meth:`data.sqliteinterface.SQLiteDI.loadFullAggCPDdata` are used, they are counted on the data side by :meth:`data.sqliteinterface.SQLiteDI.loadCountCPDdata` (and cached, see :meth:`.datasetCounts`).
+        
+        :arg dsis: Optional list of :class:`.DataSetInterface` instances, e.g. the held-out fold of a cross validation. By default all datasets of the data interface are used.
+        '''
+        if dsis is None:
+            dsis = self.di.DSI
         
         loglik = 0
         
@@ -229,23 +291,13 @@ class CPDTabularLearner(CPDLearner):
 
             if attr.probabilistic: 
                 
-                for dsi in self.di.DSI:
-                    
-                
-                    #load the full data for attribute
-                    #dsi.loadFullCPDdata(attr)
-
-                    #or load the aggregated data for attribute
-                    dsi.loadFullAggCPDdata(attr)
+                for dsi in dsis:
                     
-                    for currentRow in dsi.resultSet():  
-                        '''                            
-                        We handle the current row
-                        '''
-                        #compute the matrix index for the attribute values
-                        [indexRow,indexColumn] = attr.CPD.indexingCPD(currentRow)
-                        #update the loglik with the log prob of the instance that we have seen
-                        loglik += attr.CPD.cpdLogMatrix[indexRow,indexColumn] 
+                    #the counted assignments of the aggregated data for attribute
+                    counts = self.datasetCounts(attr,dsi,aggregate=True)
+                    #update the loglik with the log prob of the instances that we have seen
+                    seen = counts.nonzero()
+                    loglik += (attr.CPD.cpdLogMatrix.flat[seen] * counts[seen]).sum()
                         
                     
         return loglik
@@ -0,0 +1,522 @@
+'''
+The :class:`.GBNGraph` is a dictionary of :class:`.GBNvertex` instances that are linked by dictionaries of parents and children. This representation is convenient while unrolling the ground Bayesian network and for debugging, but the samplers spend most of their time traversing dictionaries and building lists. After :meth:`inference.engine.unrollGBN` the object graph is therefore compiled into a :class:`.CompiledGBN`, an integer indexed representation based on `numpy` arrays:
+
+* The values of all vertices are stored as domain indices in :attr:`.CompiledGBN.values`
+* The parents of every vertex are stored in compressed sparse row (CSR) form, one CSR structure for every :class:`.Dependency`
+* The children of every vertex are stored in CSR form, grouped by the attribute of the child
+* The CPD row strides (see :attr:`.CPDTabular.indexingMultiplier`) are precomputed for every attribute
+
+The object graph remains the construction and debugging view of the network. The values of the two representations are synchronized using :meth:`.CompiledGBN.readValues` and :meth:`.CompiledGBN.writeValues`.
+'''
+
+import numpy as N
+
+from network.vertices import ReferenceVertex,NOEDGES
+
+import data.aggregation as aggregation
+
+
+aggregationKinds = aggregation.runtime_kinds
+'''
+Maps the runtime aggregation methods of :mod:`data.aggregation` to the vectorized aggregations implemented by :meth:`.CompiledGBN.parentIndices`
+'''
+
+
+class CompiledGBN():
+    '''
+    A :class:`.CompiledGBN` is an array based copy of a :class:`.GBNGraph`. Every :class:`.GBNvertex` is identified by an integer index `v`, i.e. its position in :attr:`.vertices`, and every attribute class by an integer index `a`, i.e. its position in :attr:`.attributes`.
+
+    The full conditional distribution of a vertex is computed the same way as in :meth:`inference.mcmc.gibbs.sampleFullConditional`, but the conditional likelihood of all children of the same attribute is computed in one vectorized operation. Instead of the :class:`.CLF` matrices, the rows of the child's CPD are accessed directly: the row of the child's CPD with the parent slot of the sampled vertex removed is computed once, and the entries for all values of the sampled vertex are `multiplier` rows apart.
+
+    Note that the structure is static. The edges of :class:`.ReferenceVertex` instances change during inference, all vertices whose Markov blanket can change are flagged in :attr:`.dynamic` and have to be sampled using the object graph.
+    '''
+
+    def __init__(self, gbn):
+        '''
+        Compiles `gbn`
+
+        :arg gbn: :class:`.GBNGraph` instance
+        '''
+
+        self.vertices = gbn.values()
+        '''List of all :class:`.GBNvertex` instances, the position in the list is the index of the vertex
+        '''
+        self.nVertices = len(self.vertices)
+        '''Number of vertices
+        '''
+        self.index = {}
+        '''
+        Dictionary mapping the `ID` of a vertex to its index, {key = :attr:`.GBNvertex.ID` : value = `int`}
+        '''
+        for v,gbnV in enumerate(self.vertices):
+            self.index[gbnV.ID] = v
+
+        self.attributes = []
+        '''List of all :class:`.Attribute` instances present in the ground Bayesian network
+        '''
+        self.attrIndex = {}
+        '''
+        Dictionary mapping an :class:`.Attribute` instance to its index in :attr:`.attributes`
+        '''
+        for gbnV in self.vertices:
+            if gbnV.attr not in self.attrIndex:
+                self.attrIndex[gbnV.attr] = len(self.attributes)
+                self.attributes.append(gbnV.attr)
+            for dep in gbnV.attr.dependenciesChild:
+                if dep.parent not in self.attrIndex:
+                    self.attrIndex[dep.parent] = len(self.attributes)
+                    self.attributes.append(dep.parent)
+
+        self.vattr = N.array([self.attrIndex[gbnV.attr] for gbnV in self.vertices],dtype=N.intp)
+        '''Attribute index of every vertex
+        '''
+
+        self.compileAttributes()
+        self.compileParents()
+        self.compileChildren()
+
+        self.values = N.empty(self.nVertices,dtype=N.intp)
+        '''
+        The current value of every vertex as index into the domain of its attribute, `-1` if the vertex doesn't have a value yet
+        '''
+        self.readValues()
+
+        self.sampling = N.array([not gbnV.fixed for gbnV in self.vertices],dtype=bool)
+        '''Boolean mask of the sampling vertices
+        '''
+
+        self.samplingByAttribute = {}
+        '''
+        The sampling vertices grouped by attribute, {key = :class:`.Attribute` : value = `numpy.array` of vertex indices}. The order is the same as in :attr:`.GBNGraph.samplingVerticesByAttribute`
+        '''
+        for attr,gbnVs in gbn.samplingVerticesByAttribute.items():
+            self.samplingByAttribute[attr] = N.array([self.index[gbnV.ID] for gbnV in gbnVs],dtype=N.intp)
+
+        self.dynamic = N.zeros(self.nVertices,dtype=bool)
+        '''
+        Boolean mask of the vertices whose Markov blanket can change during inference (reference uncertainty). The compiled structure of these vertices is not valid and they have to be sampled using the object graph.
+        '''
+        self.computeDynamic(gbn)
+
+        self.colours = None
+        '''
+        Colour of every sampling vertex (`-1` for the other vertices), computed by :meth:`.colour`
+        '''
+        self.chromaticSchedule = None
+        '''
+        List of batches (see :meth:`.batch`), one per colour and attribute, computed by :meth:`.colour`. A sweep over all batches samples every sampling vertex once.
+        '''
+        self.blockSchedule = None
+        '''
+        The batches of :attr:`.chromaticSchedule` grouped by attribute, {key = :class:`.Attribute` : value = list of batches}. Sampling all batches of an attribute is a block Gibbs step, see :attr:`inference.mcmc.gibbs.BLOCKGIBBS`.
+        '''
+
+
+    def compileAttributes(self):
+        '''
+        Precomputes the per attribute information: cardinality, domain, CPD matrix, CPD row strides and the parent slots.
+        '''
+        self.cardinality = []
+        '''Cardinality of every attribute
+        '''
+        self.cpd = []
+        '''The `cpdMatrix` of every attribute (`None` if the attribute has no CPD)
+        '''
+        self.logcpd = []
+        '''The log of the `cpdMatrix` of every attribute, used by :meth:`.sampleBatch`
+        '''
+        self.multipliers = []
+        '''The CPD row strides of every attribute, i.e. :attr:`.CPDTabular.indexingMultiplier`
+        '''
+        self.slots = []
+        '''
+        For every attribute a list of tuples `(dependency, aggregation kind)`, one for each parent slot of the CPD in the order of `attr.dependenciesChild`
+        '''
+        self.domainOffset = []
+        '''Offset of the domain of every attribute in :attr:`.flatDomain`
+        '''
+        self.domainSorter = []
+        '''Permutation that sorts the domain of every attribute, used by :meth:`.valueIndices`
+        '''
+        domains = []
+        offset = 0
+        for attr in self.attributes:
+            self.cardinality.append(attr.cardinality)
+            self.domainOffset.append(offset)
+            domain = N.array(attr.domain)
+            domains.append(domain)
+            self.domainSorter.append(N.argsort(domain))
+            offset += len(domain)
+
+            if attr.CPD is not None:
+                self.cpd.append(attr.CPD.cpdMatrix)
+                self.logcpd.append(N.log(attr.CPD.cpdMatrix))
+                self.multipliers.append(list(attr.CPD.indexingMultiplier))
+            else:
+                self.cpd.append(None)
+                self.logcpd.append(None)
+                self.multipliers.append([])
+
+            slots = []
+            for dep in attr.dependenciesChild:
+                kind = None
+                if dep.aggregator is not None:
+                    kind = aggregationKinds[dep.aggregator('runtime')]
+                slots.append((dep,kind))
+            self.slots.append(slots)
+
+        self.flatDomain = N.concatenate(domains)
+        '''The domains of all attributes concatenated in one array
+        '''
+        self.domains = domains
+        '''The domain of every attribute as `numpy.array`
+        '''
+
+    def compileParents(self):
+        '''
+        Builds the CSR structures of the parents, one for every dependency: the parent indices of vertex `v` are `parentIdx[dep][parentPtr[dep][v]:parentPtr[dep][v+1]]`. Vertices that are not of type `dep.child` have no entries.
+        '''
+        self.parentPtr = {}
+        '''CSR row pointers, {key = :class:`.Dependency` : value = `numpy.array` of length `nVertices+1`}
+        '''
+        self.parentIdx = {}
+        '''CSR column indices, {key = :class:`.Dependency` : value = `numpy.array` of parent vertex indices}
+        '''
+        for slots in self.slots:
+            for (dep,kind) in slots:
+                if dep in self.parentPtr:
+                    continue
+                ptr = N.zeros(self.nVertices+1,dtype=N.intp)
+                idx = []
+                for v,gbnV in enumerate(self.vertices):
+                    if gbnV.attr is dep.child:
+                        idx.extend([self.index[paV.ID] for paV in gbnV.parents.get(dep.parent,NOEDGES).values()])
+                    ptr[v+1] = len(idx)
+                self.parentPtr[dep] = ptr
+                self.parentIdx[dep] = N.array(idx,dtype=N.intp)
+
+    def compileChildren(self):
+        '''
+        Builds the CSR structure of the children. The children of a vertex are grouped by attribute; group `g` of vertex `v` with `groupPtr[v] <= g < groupPtr[v+1]` contains the children `childIdx[groupStart[g]:groupStart[g+1]]` of attribute `groupAttr[g]`, in which the vertex is the parent of slot `groupSlot[g]`.
+        '''
+        groupPtr = [0]
+        groupStart = [0]
+        groupAttr = []
+        groupSlot = []
+        childIdx = []
+        for gbnV in self.vertices:
+            for (childAttr,gbnVs) in gbnV.children.items():
+                if len(gbnVs) == 0:
+                    continue
+                # as in :meth:`inference.mcmc.gibbs.configure`, the last parent slot of `gbnV.attr` is used
+                slot = max([i for i,pa in enumerate(childAttr.parents) if pa is gbnV.attr])
+                childIdx.extend([self.index[childV.ID] for childV in gbnVs.values()])
+                groupStart.append(len(childIdx))
+                groupAttr.append(self.attrIndex[childAttr])
+                groupSlot.append(slot)
+            groupPtr.append(len(groupAttr))
+
+        self.groupPtr = N.array(groupPtr,dtype=N.intp)
+        '''CSR row pointers of the child groups of every vertex
+        '''
+        self.groupStart = N.array(groupStart,dtype=N.intp)
+        '''Start of every child group in :attr:`.childIdx`
+        '''
+        self.groupAttr = N.array(groupAttr,dtype=N.intp)
+        '''Attribute index of the children in every group
+        '''
+        self.groupSlot = N.array(groupSlot,dtype=N.intp)
+        '''Parent slot of the vertex in the CPD of the children in every group
+        '''
+        self.childIdx = N.array(childIdx,dtype=N.intp)
+        '''CSR column indices, the child vertex indices
+        '''
+
+    def computeDynamic(self, gbn):
+        '''
+        Flags all vertices whose Markov blanket can change when a :class:`.ReferenceVertex` replaces a reference (see :meth:`.ReferenceVertex.addReference`). These are the referencing vertices, all vertices of the `k`-side attribute and all vertices that have one of these as child.
+
+        :arg gbn: :class:`.GBNGraph` instance
+        '''
+        for gbnV in self.vertices:
+            if isinstance(gbnV,ReferenceVertex):
+                self.dynamic[self.index[gbnV.ID]] = True
+                self.dynamic[self.index[gbnV.refGBNvertex.ID]] = True
+                for kGbnV in gbn.allByAttribute.get(gbnV.dependency.kAttribute,[]):
+                    self.dynamic[self.index[kGbnV.ID]] = True
+
+        direct = self.dynamic.copy()
+        for v in N.flatnonzero(~direct):
+            for g in range(self.groupPtr[v],self.groupPtr[v+1]):
+                if direct[self.childIdx[self.groupStart[g]:self.groupStart[g+1]]].any():
+                    self.dynamic[v] = True
+                    break
+
+
+    def readValues(self):
+        '''
+        Copies the values of the :class:`.GBNvertex` instances into :attr:`.values`
+        '''
+        for v,gbnV in enumerate(self.vertices):
+            if gbnV.value is None or isinstance(gbnV,ReferenceVertex):
+                self.values[v] = -1
+            else:
+                self.values[v] = int(gbnV.attr.indexingValue(gbnV.value))
+
+    def writeValues(self, vs=None):
+        '''
+        Copies :attr:`.values` back into the :class:`.GBNvertex` instances, e.g. after a chain has been run.
+
+        :arg vs: Optional list of vertex indices, by default all sampling vertices are written
+        '''
+        if vs is None:
+            vs = N.flatnonzero(self.sampling & (self.values >= 0))
+        for v in vs:
+            gbnV = self.vertices[v]
+            gbnV.setValue(gbnV.attr.domain[self.values[v]])
+
+    def currentValues(self, vs):
+        '''
+        Returns the current values (not the domain indices) of the vertices `vs`
+
+        :arg vs: `numpy.array` of vertex indices
+        :returns: `numpy.array` of values
+        '''
+        offsets = N.array(self.domainOffset,dtype=N.intp)[self.vattr[vs]]
+        return self.flatDomain[offsets + self.values[vs]]
+
+    def indices(self, IDs):
+        '''
+        :arg IDs: List of :attr:`.GBNvertex.ID`
+        :returns: `numpy.array` of the corresponding vertex indices
+        '''
+        return N.array([self.index[ID] for ID in IDs],dtype=N.intp)
+
+
+    def valueIndices(self, a, values):
+        '''
+        Maps values of attribute `a` to domain indices (a vectorized :meth:`.Attribute.indexingValue`)
+
+        :arg a: Attribute index
+        :arg values: `numpy.array` of values
+        :returns: `numpy.array` of domain indices
+        '''
+        domain = self.domains[a]
+        sorter = self.domainSorter[a]
+        pos = N.searchsorted(domain,values,sorter=sorter).clip(0,len(domain)-1)
+        idx = sorter[pos]
+        if (domain[idx] != values).any():
+            raise Exception('Aggregated value not in the domain of %s'%self.attributes[a].fullname)
+        return idx
+
+    def parentIndices(self, cs, a, i):
+        '''
+        Returns the domain index of parent slot `i` for the vertices `cs` of attribute `a`, aggregating the parent values if the dependency requires it.
+
+        :arg cs: `numpy.array` of vertex indices, all of attribute `a`
+        :arg a: Attribute index
+        :arg i: Parent slot, the index of the dependency in `attr.dependenciesChild`
+        :returns: `numpy.array` of domain indices
+        '''
+        (dep,kind) = self.slots[a][i]
+        ptr = self.parentPtr[dep]
+        idx = self.parentIdx[dep]
+
+        if kind is None:
+            # there is only one parent (or the first one is used, see GBNvertex.parentAssignments)
+            if (ptr[cs+1] == ptr[cs]).any():
+                raise Exception('No parent vertex for %s'%dep.name)
+            return self.values[idx[ptr[cs]]]
+
+        # runtime aggregation of the parent values
+        starts = ptr[cs]
+        lengths = ptr[cs+1] - starts
+        if len(lengths) and lengths.min() == 0:
+            raise Exception('Aggregation for %s without parent vertices'%dep.name)
+        offsets = lengths.cumsum() - lengths
+        gather = N.repeat(starts - offsets, lengths) + N.arange(lengths.sum())
+
+        pa = self.attrIndex[dep.parent]
+        vals = self.domains[pa][self.values[idx[gather]]]
+
+        if kind == 'AVG':
+            # same rounding as the builtin round() used by `runtime_avg`
+            avg = N.add.reduceat(vals,offsets) * 1. / lengths
+            agg = (N.sign(avg) * N.floor(N.abs(avg) + 0.5)).astype(vals.dtype)
+        elif kind == 'MAX':
+            agg = N.maximum.reduceat(vals,offsets)
+        elif kind == 'MIN':
+            agg = N.minimum.reduceat(vals,offsets)
+        elif kind == 'MODE':
+            # same tie rule as `running_mode`, the smallest of the most frequent values
+            agg = aggregation.numpy_mode(vals,offsets)
+        else:
+            raise Exception('Aggregation %s not supported by the compiled GBN'%kind)
+
+        return self.valueIndices(pa,agg)
+
+    def conditionalRows(self, cs, a, exclude=None):
+        '''
+        Returns the CPD row indices of the vertices `cs` of attribute `a` given the current values of their parents, the vectorized equivalent of `attr.CPD.indexRow(gbnV.parentAss)`.
+
+        :arg cs: `numpy.array` of vertex indices, all of attribute `a`
+        :arg a: Attribute index
+        :arg exclude: Optional parent slot that is left out, i.e. the returned rows are the rows where the parent of that slot takes the first value of its domain
+        :returns: `numpy.array` of row indices
+        '''
+        rows = N.zeros(len(cs),dtype=N.intp)
+        for i,mult in enumerate(self.multipliers[a]):
+            if i != exclude:
+                rows += mult * self.parentIndices(cs,a,i)
+        return rows
+
+    def fullConditional(self, v):
+        '''
+        Computes the full conditional distribution of vertex `v` given the current values of its Markov blanket.
+
+        :arg v: Vertex index
+        :returns: `numpy.array` of length `cardinality`, the normalized full conditional
+        '''
+        a = self.vattr[v]
+        card = self.cardinality[a]
+
+        # the local distribution factor of the full conditional
+        fc = self.cpd[a][self.conditionalRows(N.array([v]),a)[0],:]
+
+        # the likelihood of all children, one attribute at a time
+        for g in range(self.groupPtr[v],self.groupPtr[v+1]):
+            cs = self.childIdx[self.groupStart[g]:self.groupStart[g+1]]
+            ca = self.groupAttr[g]
+            slot = self.groupSlot[g]
+
+            base = self.conditionalRows(cs,ca,exclude=slot)
+            rows = base[:,N.newaxis] + self.multipliers[ca][slot]*N.arange(card)[N.newaxis,:]
+            lik = self.cpd[ca][rows,self.values[cs][:,N.newaxis]]
+
+            fc = fc * lik.prod(axis=0)
+
+        return fc / fc.sum()
+
+    def sample(self, v):
+        '''
+        Samples a new value for vertex `v` from its full conditional distribution and stores the domain index in :attr:`.values`.
+
+        :arg v: Vertex index
+        :returns: The full conditional distribution that was sampled from
+        '''
+        fc = self.fullConditional(v)
+        i = N.searchsorted(fc.cumsum(),N.random.uniform())
+        self.values[v] = min(i,len(fc)-1)
+        return fc
+
+    def markovBlanket(self, v):
+        '''
+        Returns the Markov blanket of vertex `v`: its parents, its children and the other parents of its children. These are the vertices whose values are read by :meth:`.fullConditional`.
+
+        :arg v: Vertex index
+        :returns: Set of vertex indices
+        '''
+        blanket = set(self.parentsOf(v))
+        for g in range(self.groupPtr[v],self.groupPtr[v+1]):
+            for c in self.childIdx[self.groupStart[g]:self.groupStart[g+1]].tolist():
+                blanket.add(c)
+                blanket.update(self.parentsOf(c))
+        blanket.discard(v)
+        return blanket
+
+    def parentsOf(self, v):
+        '''
+        :arg v: Vertex index
+        :returns: List of the parent vertex indices of `v`, all parent slots
+        '''
+        parents = []
+        for (dep,kind) in self.slots[self.vattr[v]]:
+            ptr = self.parentPtr[dep]
+            parents.extend(self.parentIdx[dep][ptr[v]:ptr[v+1]].tolist())
+        return parents
+
+    def colour(self):
+        '''
+        Colours the Markov blanket graph of the sampling vertices greedily (largest degree first), such that no two vertices of the same colour are in each other's Markov blanket. The vertices of one colour are conditionally independent given all other vertices and can be sampled at the same time, see :meth:`.sampleBatch`.
+
+        The colouring is computed once, the batches of every colour are stored in :attr:`.chromaticSchedule` and, grouped by attribute, in :attr:`.blockSchedule`.
+        '''
+        if self.chromaticSchedule is not None:
+            return
+
+        samplingVs = N.flatnonzero(self.sampling)
+        blankets = {}
+        for v in samplingVs.tolist():
+            blankets[v] = [u for u in self.markovBlanket(v) if self.sampling[u]]
+
+        order = sorted(blankets.keys(),key=lambda v: -len(blankets[v]))
+        self.colours = -N.ones(self.nVertices,dtype=N.intp)
+        for v in order:
+            used = set(self.colours[blankets[v]].tolist())
+            c = 0
+            while c in used:
+                c += 1
+            self.colours[v] = c
+
+        self.chromaticSchedule = []
+        self.blockSchedule = {}
+        for c in range(self.colours.max()+1):
+            vs = N.flatnonzero(self.colours == c)
+            for a in N.unique(self.vattr[vs]).tolist():
+                batch = self.batch(vs[self.vattr[vs] == a])
+                self.chromaticSchedule.append(batch)
+                self.blockSchedule.setdefault(self.attributes[a],[]).append(batch)
+
+    def batch(self, vs):
+        '''
+        Precomputes the structure used by :meth:`.sampleBatch` for the vertices `vs`. The children of all vertices are grouped by attribute and parent slot, within a group the children are ordered by their parent in `vs`.
+
+        :arg vs: `numpy.array` of vertex indices, all of the same attribute and conditionally independent
+        :returns: Tuple `(a, vs, groups)`, where `groups` is a list of tuples `(ca, slot, cs, owners, offsets)`: children `cs` of attribute `ca`, the children of vertex `vs[owners[i]]` start at position `offsets[i]`
+        '''
+        a = self.vattr[vs[0]]
+        byGroup = {}
+        for (pos,v) in enumerate(vs.tolist()):
+            for g in range(self.groupPtr[v],self.groupPtr[v+1]):
+                key = (self.groupAttr[g],self.groupSlot[g])
+                cs = self.childIdx[self.groupStart[g]:self.groupStart[g+1]]
+                (csList,ownerList,offsetList) = byGroup.setdefault(key,([],[],[]))
+                ownerList.append(pos)
+                offsetList.append(len(csList))
+                csList.extend(cs.tolist())
+
+        groups = []
+        for ((ca,slot),(csList,ownerList,offsetList)) in byGroup.items():
+            groups.append((ca,slot,N.array(csList,dtype=N.intp),N.array(ownerList,dtype=N.intp),N.array(offsetList,dtype=N.intp)))
+        return (a,vs,groups)
+
+    def sampleBatch(self, batch):
+        '''
+        Samples new values for all vertices of a batch (see :meth:`.batch`) at the same time, the vectorized equivalent of calling :meth:`.sample` for every vertex. The vertices have to be conditionally independent given the other vertices.
+
+        The CPD rows of the vertices and the likelihood rows of all children are gathered with fancy indexing and summed per vertex in log space using `numpy.add.reduceat`. The new values are drawn from one uniform vector with a vectorized inverse CDF.
+
+        :arg batch: Tuple `(a, vs, groups)`
+        :returns: The normalized full conditional distributions that were sampled from, a `len(vs) x cardinality` array
+        '''
+        (a,vs,groups) = batch
+        card = self.cardinality[a]
+
+        # the local distribution factors of the full conditionals
+        logFC = self.logcpd[a][self.conditionalRows(vs,a),:]
+
+        # the likelihood of all children
+        for (ca,slot,cs,owners,offsets) in groups:
+            base = self.conditionalRows(cs,ca,exclude=slot)
+            rows = base[:,N.newaxis] + self.multipliers[ca][slot]*N.arange(card)[N.newaxis,:]
+            logFC[owners] += N.add.reduceat(self.logcpd[ca][rows,self.values[cs][:,N.newaxis]],offsets,axis=0)
+
+        fc = N.exp(logFC - logFC.max(axis=1)[:,N.newaxis])
+        cumFC = fc.cumsum(axis=1)
+        u = N.random.uniform(size=len(vs)) * cumFC[:,-1]
+        self.values[vs] = N.minimum((cumFC < u[:,N.newaxis]).sum(axis=1),card-1)
+
+        return fc / cumFC[:,-1:]
+
+    def __repr__(self):
+        return 'CompiledGBN (%s vertices, %s attributes, %s child edges)'%(self.nVertices,len(self.attributes),len(self.childIdx))
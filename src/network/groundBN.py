@@ -37,6 +37,30 @@ class GBNGraph(dict):
 
                 
     
+    def insertVertex(self,gbnV):
+        """
+        Adds an instantiated vertex to the graph and updates the corresponding GBN data structures. A vertex that isn't :attr:`~.GBNvertex.fixed` is a sampling vertex.
+        
+        :arg gbnV: :class:`!GBNvertex` instance, its edges are not changed
+        """
+        ID = gbnV.ID
+        attr = gbnV.attr
+        self[ID] = gbnV
+        
+        if not gbnV.fixed:
+            self.samplingVertices[ID] = gbnV
+            if attr in self.samplingVerticesByAttribute:
+                self.samplingVerticesByAttribute[attr].append(gbnV)
+            else:
+                self.samplingVerticesByAttribute[attr] = [gbnV]
+        
+        if attr in self.allByAttribute:
+            self.allByAttribute[attr].append(gbnV)
+        else:
+            self.allByAttribute[attr] = [gbnV]
+        
+        return ID
+    
     def addEvidenceVertex(self,ID,attr,obj,value):
         """
         Instantiates a new evidence :class:`!GBNvertex` and updates the corresponding GBN data structures.
@@ -47,13 +71,7 @@ class GBNGraph(dict):
         :arg value: Value of vertex
         """
 
-        self[ID] = GBNvertex(ID=ID,attr=attr,obj=obj,fixed=True,value=value)          
-        
-        if attr in self.allByAttribute:
-            self.allByAttribute[attr].append(self[ID])                
-        else:
-            self.allByAttribute[attr] = []
-            self.allByAttribute[attr].append(self[ID])
+        self.insertVertex(GBNvertex(ID=ID,attr=attr,obj=obj,fixed=True,value=value))
 
         return ID
 
@@ -67,21 +85,7 @@ class GBNGraph(dict):
         """
         
     
-        self[ID] = GBNvertex(ID=ID,attr=attr,obj=obj,fixed=False)     
-        
-        self.samplingVertices[ID] = self[ID]
-        
-        if attr in self.samplingVerticesByAttribute:
-            self.samplingVerticesByAttribute[attr].append(self[ID])                
-        else:
-            self.samplingVerticesByAttribute[attr] = []
-            self.samplingVerticesByAttribute[attr].append(self[ID])     
-        
-        if attr in self.allByAttribute:
-            self.allByAttribute[attr].append(self[ID])                
-        else:
-            self.allByAttribute[attr] = []
-            self.allByAttribute[attr].append(self[ID])
+        self.insertVertex(GBNvertex(ID=ID,attr=attr,obj=obj,fixed=False))
 
         return ID
             
@@ -102,25 +106,9 @@ class GBNGraph(dict):
         """
                 
         if ID not in self:            
-            self[ID] = GBNvertex(ID=ID,attr=attr,obj=obj,**args)
+            self.insertVertex(GBNvertex(ID=ID,attr=attr,obj=obj,**args))
             #print 'Added %s(E=%s) to GBN'%(ID,self[ID].fixed)
             
-            #also add references to the helper data structures
-            if not self[ID].fixed:
-                self.samplingVertices[ID] = self[ID]
-                if attr in self.samplingVerticesByAttribute:
-                    self.samplingVerticesByAttribute[attr].append(self[ID])                
-                else:
-                    self.samplingVerticesByAttribute[attr] = []
-                    self.samplingVerticesByAttribute[attr].append(self[ID])    
-                
-                            
-            if attr in self.allByAttribute:
-                self.allByAttribute[attr].append(self[ID])                
-            else:
-                self.allByAttribute[attr] = []
-                self.allByAttribute[attr].append(self[ID])    
-            
             return ID
         return False
         '''
@@ -4,40 +4,111 @@ The ground Bayesian network implemented in :mod:`network.groundBN` consists of d
 * Standard GBN vertex :class:`.GBNvertex`
 * Reference Vertex :class:`.ReferenceVertex`
 
+The vertices are identified by integer IDs that are interned by the :attr:`.registry`, e.g. the attribute object `Student.success.1` is identified by the integer that the :class:`.IDRegistry` assigned to `('Student.success',(1,))`. The readable name of an ID is returned by :meth:`.IDRegistry.name`.
+
 '''
 
 import logging
 from analytics.performance import time_analysis
 
+from data.aggregation import runtime_kinds,running_aggregators
+
+
+class IDRegistry():
+    '''
+    Interns the keys of the vertices and objects of the GBN into dense integer IDs, which are used as keys of the :class:`.GBNGraph`, of the `parents` and `children` dictionaries of the vertices, of the :attr:`.Query.objEvidenceLookup` and of the posterior indices. Compared to formatted string IDs they are cheaper to compute for every result row and use less memory per vertex.
+
+    A key is a tuple `(prefix,obj)`. If `obj` is a tuple of primary key values, the name of the ID is `prefix.pk1.pk2...` (e.g. `Student.success.1`), otherwise `obj` is another ID and the name is `prefix%name(obj)` (e.g. `RefV_Student.success.1`).
+
+    The IDs start at `1`, i.e. an ID is never confused with `False`. They are never reused, the registry grows with the number of distinct objects that have been unrolled.
+    '''
+    def __init__(self):
+        self.ids = {}
+        '''Dictionary `{ key : ID }`
+        '''
+        self.keys = [None]
+        '''List of the keys, the reverse map `ID -> key`
+        '''
+
+    def intern(self,key):
+        '''
+        Returns the ID of `key`, a new ID is assigned if the key hasn't been interned before
+
+        :arg key: Tuple `(prefix,obj)`
+        :returns: Integer ID
+        '''
+        ID = self.ids.get(key)
+        if ID is None:
+            ID = len(self.keys)
+            self.ids[key] = ID
+            self.keys.append(key)
+        return ID
+
+    def key(self,ID):
+        '''
+        :arg ID: Integer ID
+        :returns: Key `(prefix,obj)` of the ID
+        '''
+        return self.keys[ID]
+
+    def name(self,ID):
+        '''
+        Returns the readable name of an ID, used for display only
+
+        :arg ID: Integer ID
+        :returns: String, e.g. `Student.success.1`
+        '''
+        (prefix,obj) = self.keys[ID]
+        if isinstance(obj,tuple):
+            return '%s.%s'%(prefix,'.'.join([str(i) for i in obj]))
+        return prefix%self.name(obj)
+
+    def __len__(self):
+        return len(self.keys) - 1
+
+    def __repr__(self):
+        return 'IDRegistry (%s IDs)'%len(self)
+
+
+registry = IDRegistry()
+'''
+The :class:`.IDRegistry` of all vertex and object IDs
+'''
+
 
 def computeID(attr,obj):
     """A simple helper function that computes a unique ID from an `attr` and `obj`, the primary key of the attribute object which is part of the GBN.
     
     :arg attr: Subclass of :mod:`prm.attribute.Attribute`
     :arg obj: List of int values
-    :returns: A unique string ID for the attribute object
+    :returns: A unique integer ID for the attribute object (named e.g. `Student.success.1`, see :attr:`.registry`)
     """
-    return '%s.%s'%(attr.ID,'.'.join([str(i) for i in obj]))
+    return registry.intern((attr.ID,tuple(obj)))
 
 def computeRefID(gbnV):
     """A simple helper function that computes a unique reference ID from an `gbnV` vertex
 
     :arg gbnV: Instance of :class:`.GBNvertex`
-    :returns: A unique string ID for the reference vertex 
+    :returns: A unique integer ID for the reference vertex (named e.g. `RefV_Student.success.1`)
     """
-    return 'RefV_%s'%gbnV.ID
+    return registry.intern(('RefV_%s',gbnV.ID))
 
 def computeERID(er,obj):
     """A simple helper function that computes a unique ID from an object (e.g. a student). It allows to identify an object (e.g. `student.1`), rather than an attribute object (e.g. `student.success.1`) computed by :meth:`.computeID`.
     
     :arg er: Instance of :class:`.ERClass`
-    :returns: A unique string ID for the object
+    :returns: A unique integer ID for the object (named e.g. `Student.1`)
     """
-    return '%s.%s'%(er.name,'.'.join([str(i) for i in obj]))
+    return registry.intern((er.name,tuple(obj)))
         
 
+NOEDGES = {}
+'''
+Shared empty dictionary used as :attr:`.GBNvertex.parents` and :attr:`.GBNvertex.children` of the vertices without parents or children. It is never modified, a vertex creates its own dictionaries when the first edge is added (see :meth:`.GBNvertex.parentDict`).
+'''
+
 
-class GBNvertex():
+class GBNvertex(object):
     '''
     A `GBNvertex` represents a vertex in the Ground Bayes net. It is a variable in the GBN representing an attribute object whose CPD is distributed according to the CPD of the attribute class. E.g. all attribute objects of the same attribute class share the same CPD.     
     A `GBNvertex` instance can take on a value from the domain of the associated attribute.
@@ -48,7 +119,11 @@ class GBNvertex():
     
     * a GBNvertex for `rating` would have self.obj = (x,y) where x=`User.user_id` and y=`Item.item_id`
     * a GBNvertex for `gender` would have self.obj = (x) where x=`User.user_id`
+
+    The GBN of a large query consists of millions of vertices, the instances are kept compact: the attributes are declared as `__slots__` (there is no instance `__dict__`), the adjacency dictionaries are created when the first edge is added and the :attr:`.erID` is computed on demand.
     '''
+    __slots__ = ('attr','obj','ID','value','fixed','event','parents','children','parentAss','aggState','dirty')
+
     def __init__(self,attr,obj=None,ID=None,event=False,fixed=False,value=None,deterministic=False,aggregation=None): 
         
         
@@ -64,7 +139,7 @@ class GBNvertex():
         
         self.ID = None
         '''
-        An identifier for the unrolled :class:`.Attribute` object, e.g. Student.success.1
+        An integer identifier for the unrolled :class:`.Attribute` object, e.g. the ID of Student.success.1 (see :func:`.computeID`)
         '''
         # It could be computed at the time of instantiation, but usually is already computed to check whether the vertex is already present in the graph
         if ID is None:
@@ -72,18 +147,11 @@ class GBNvertex():
         else:
             self.ID = ID 
         
-        self.erID = None
-        """
-        An identifier for the unrolled :class:`.ERClass` object, e.g. Student.1
-        """
-        # self.erID is only possible if we have an object (i.e. not applicable for reference vertices)
-        if self.obj is not None:
-            self.erID = computeERID(self.attr.erClass,self.obj)
-        
+
 
         self.value = value
         """
-        Current value, must be in the domain of `attr`
+        Current value, must be in the domain of `attr`. During inference the value has to be changed using :meth:`.setValue`, otherwise the cached parent assignments of the children are not updated
         """
         self.fixed = fixed
         """
@@ -93,27 +161,63 @@ class GBNvertex():
         """
         Boolean. If True, we are interested in the posterior distribution of the vertex.
         """                
-        self.parents = {}
+        self.parents = NOEDGES
         """
-        The dictionary of parents attribute objects {key=`parent.attribute` : value= { key=`id` : value = `GBNvertex`}}. `parent.attribute` is of type :class:`~prm.attribute.Attribute` and the `gbnVertices` of type :class:`GBNvertex`
+        The dictionary of parents attribute objects {key=`parent.attribute` : value= { key=`id` : value = `GBNvertex`}}. `parent.attribute` is of type :class:`~prm.attribute.Attribute` and the `gbnVertices` of type :class:`GBNvertex`. An attribute is only a key once a parent of that attribute has been added, a vertex without parents shares the empty :attr:`.NOEDGES`.
         """        
-        self.parentAss = []
+        self.parentAss = [None]*len(self.attr.dependenciesChild)
         """
         The parent assignment of the parents of this node. The order of the parent values is the same as the `self.attr.parents` list. It can be updated using :meth:`parentAssignments`
         """
-        #init the parent dict 
-        for dep in self.attr.dependenciesChild:
-            self.parents[dep.parent] = {}                        
-            self.parentAss.append(None)
-            
-        self.children = {}
+        self.aggState = None
         """
-        The dictionary of children attribute objects {key=`child.attribute` :  value= { key=`id` : value = `GBNvertex`}}. `child.attribute` is of type :class:`~prm.attribute.Attribute` and the `gbnVertices` of type :class:`GBNvertex`
+        For every aggregated dependency the running aggregate of the parent values, in the same order as `self.parentAss`: `[sum,count]` for `AVG` and a counted multiset `{key = value : value = count}` for `MAX`, `MIN` and `MODE`. The entry is `None` if the dependency is not aggregated. The list is created by :meth:`parentAssignments` if the vertex has aggregated dependencies, `None` otherwise.
         """
-        # init the children dict 
-        for dep in self.attr.dependenciesParent:
-            self.children[dep.child] = {}
-        
+        self.dirty = True
+        """
+        Boolean. If `True` the cached :attr:`.parentAss` and :attr:`.aggState` are not valid (e.g. because the parents changed) and are recomputed by the next call of :meth:`parentAssignments`
+        """
+        self.children = NOEDGES
+        """
+        The dictionary of children attribute objects {key=`child.attribute` :  value= { key=`id` : value = `GBNvertex`}}. `child.attribute` is of type :class:`~prm.attribute.Attribute` and the `gbnVertices` of type :class:`GBNvertex`. As for :attr:`.parents`, an attribute is only a key once a child of that attribute has been added.
+        """
+
+    @property
+    def erID(self):
+        """
+        An integer identifier for the unrolled :class:`.ERClass` object, e.g. the ID of Student.1 (see :func:`.computeERID`). It is computed on demand, `None` if the vertex has no object (i.e. for reference vertices)
+        """
+        if self.obj is None:
+            return None
+        return computeERID(self.attr.erClass,self.obj)
+
+    def parentDict(self,attr):
+        '''
+        Returns the dictionary of the parents of attribute `attr`, the dictionaries are created if necessary
+
+        :arg attr: :class:`~prm.attribute.Attribute` of the parents
+        :returns: Dictionary { key=`id` : value = `GBNvertex`}
+        '''
+        if self.parents is NOEDGES:
+            self.parents = {}
+        parentVs = self.parents.get(attr)
+        if parentVs is None:
+            parentVs = self.parents[attr] = {}
+        return parentVs
+
+    def childDict(self,attr):
+        '''
+        Returns the dictionary of the children of attribute `attr`, the dictionaries are created if necessary
+
+        :arg attr: :class:`~prm.attribute.Attribute` of the children
+        :returns: Dictionary { key=`id` : value = `GBNvertex`}
+        '''
+        if self.children is NOEDGES:
+            self.children = {}
+        childVs = self.children.get(attr)
+        if childVs is None:
+            childVs = self.children[attr] = {}
+        return childVs
 
 
     def addParent(self,parentVertex):
@@ -124,13 +228,114 @@ class GBNvertex():
         
         :arg parentVertex: :class:`GBNvertex`
         '''
-        if parentVertex.ID not in self.parents[parentVertex.attr]:
-            self.parents[parentVertex.attr][parentVertex.ID] = parentVertex
+        parentVs = self.parentDict(parentVertex.attr)
+        if parentVertex.ID not in parentVs:
+            parentVs[parentVertex.ID] = parentVertex
+            self.dirty = True
         
         #adds child information to parent node
-        if self not in parentVertex.children[self.attr]:
-            parentVertex.children[self.attr][self.ID] = self
+        parentVertex.childDict(self.attr)[self.ID] = self
             
+    def addNewParent(self,parentVertex):
+        ''' 
+        Same as :meth:`.addParent`, but without checking whether the edge already exists. For efficiency reasons this is used when `parentVertex` has just been added to the GBN.
+        
+        :arg parentVertex: :class:`GBNvertex`
+        '''
+        #adds parent information to child node                    
+        self.parentDict(parentVertex.attr)[parentVertex.ID] = parentVertex
+        #adds child information to parent node
+        parentVertex.childDict(self.attr)[self.ID] = self
+        self.dirty = True
+
+    def removeParent(self,parentVertex):
+        ''' 
+        Removes the edge between `parentVertex` and this vertex.
+        
+        :arg parentVertex: :class:`GBNvertex`
+        '''
+        del self.parents[parentVertex.attr][parentVertex.ID] 
+        del parentVertex.children[self.attr][self.ID]
+        self.dirty = True
+
+    def detach(self):
+        '''
+        Removes all edges of this vertex, e.g. when it is no longer part of the GBN (see :meth:`inference.engine.updateGBN`).
+        '''
+        for parentVs in self.parents.itervalues():
+            for parentV in parentVs.itervalues():
+                parentV.children[self.attr].pop(self.ID,None)
+        for childVs in self.children.itervalues():
+            for childV in childVs.itervalues():
+                childV.parents[self.attr].pop(self.ID,None)
+                childV.dirty = True
+        self.parents = NOEDGES
+        self.children = NOEDGES
+        self.dirty = True
+
+    def restamp(self,event=False,fixed=False,value=None):
+        '''
+        Sets the flags and the value of a vertex that is reused for another query (see :meth:`inference.engine.updateGBN`). The cached parent assignments are invalidated.
+
+        :arg event: Boolean, see :attr:`.event`
+        :arg fixed: Boolean, see :attr:`.fixed`
+        :arg value: Value of an evidence vertex, `None` for a sampling vertex
+        '''
+        self.event = event
+        self.fixed = fixed
+        self.value = value
+        self.dirty = True
+
+    def setValue(self,value):
+        '''
+        Sets the value of the vertex and updates the cached parent assignments of all children (see :meth:`.parentChanged`).
+        
+        :arg value: New value, must be in the domain of `attr`
+        '''
+        old = self.value
+        self.value = value
+        if old == value:
+            return
+        for childVs in self.children.values():
+            for childV in childVs.itervalues():
+                childV.parentChanged(self,old,value)
+
+    def parentChanged(self,parentVertex,old,new):
+        '''
+        Updates the cached parent assignments after the value of `parentVertex` changed from `old` to `new`. The running aggregates are updated in constant time, i.e. independent of the number of parents.
+        
+        :arg parentVertex: :class:`GBNvertex`
+        :arg old: Previous value of `parentVertex`
+        :arg new: New value of `parentVertex`
+        '''
+        if self.dirty:
+            # everything is recomputed anyway
+            return
+        if old is None or new is None:
+            self.dirty = True
+            return
+        
+        for i,dep in enumerate(self.attr.dependenciesChild):
+            if dep.parent is not parentVertex.attr:
+                continue
+            state = None
+            if self.aggState is not None:
+                state = self.aggState[i]
+            if state is None:
+                #only the first parent is used without aggregation, see parentAssignments()
+                self.parentAss[i] = self.parents[dep.parent].itervalues().next().value
+            elif isinstance(state,list):
+                #running sum and count
+                state[0] += new - old
+                self.parentAss[i] = running_aggregators['AVG'](state)
+            else:
+                #counted multiset
+                state[old] -= 1
+                if state[old] == 0:
+                    del state[old]
+                state[new] = state.get(new,0) + 1
+                self.parentAss[i] = running_aggregators[runtime_kinds[dep.aggregator('runtime')]](state)
+
 
       
     def hasParents(self,paAttr):
@@ -140,7 +345,7 @@ class GBNvertex():
         
         :arg paAttr: :class:`~prm.attribute.Attribute`
         '''        
-        if len(self.parents[paAttr])>0:
+        if len(self.parents.get(paAttr,NOEDGES))>0:
             return True
         else:
             return False
@@ -166,7 +371,7 @@ class GBNvertex():
         if self.fixed:
             raise Exception('Why is a fixed GBN vertex being sampled?')
         self.parentAssignments();
-        self.value = self.attr.CPD.sample(self.parentAss)
+        self.setValue(self.attr.CPD.sample(self.parentAss))
         
     
     def conditionalDist(self):
@@ -186,11 +391,16 @@ class GBNvertex():
     def parentAssignments(self):
         '''
         Computes the values of the parents of that GBN vertex (using aggregation if necessary). Note that since there is an `GBNVertex` instance for every node in the GBN, the parent assignments are stored in the instance variable self.parentAss. In the case of the local distribution instance of an attribute, this is not the case as the distribution is shared among many attribute objects.
+
+        The parent assignments are cached, they are kept up to date by :meth:`.parentChanged` when a parent value is set using :meth:`.setValue`. They are only recomputed if the vertex is :attr:`.dirty`, e.g. after its parents changed.
         '''
+        if not self.dirty:
+            return
+
         for i,dep in enumerate(self.attr.dependenciesChild):
             if dep.aggregator is None:
                 #there should be only one parent value in this case
-                paVal = self.parents[dep.parent].values()   
+                paVal = self.parents.get(dep.parent,NOEDGES).values()   
                 
                 # Just for debugging, when the model is proper that should never happen: comment out for performance
                 # if len(paVal) != 1:    
@@ -199,7 +409,7 @@ class GBNvertex():
                 self.parentAss[i] = paVal[0].value           
             else:
                 #we perform a runtime aggregation
-                paVals = [gbnV.value for gbnV in self.parents[dep.parent].values()]
+                paVals = [gbnV.value for gbnV in self.parents.get(dep.parent,NOEDGES).values()]
                 agg_func = dep.aggregator('runtime')
                 
                 # logging.info('aggregation for %s'%self.ID)
@@ -209,6 +419,20 @@ class GBNvertex():
                 paAgg = agg_func(paVals)                
                 
                 self.parentAss[i] = paAgg
+
+                #the running aggregate used by parentChanged()
+                if self.aggState is None:
+                    self.aggState = [None]*len(self.parentAss)
+                if runtime_kinds[agg_func] == 'AVG':
+                    self.aggState[i] = [sum(paVals),len(paVals)]
+                else:
+                    counts = {}
+                    for paVal in paVals:
+                        counts[paVal] = counts.get(paVal,0) + 1
+                    self.aggState[i] = counts
+
+        # the cache is only valid if all parent values are known
+        self.dirty = None in self.parentAss
                 
             
     def outdegree(self,attr=None):
@@ -221,7 +445,7 @@ class GBNvertex():
         if attr is None:
             return sum([len(vs) for (a,vs) in self.parents.items()])
         else:
-            return len(self.parents[attr])
+            return len(self.parents.get(attr,NOEDGES))
 
     def indegree(self,attr=None):
         ''' 
@@ -233,7 +457,7 @@ class GBNvertex():
         if attr is None:
             return sum([len(vs) for (a,vs) in self.children.items()])
         else:
-            return len(self.children[attr])
+            return len(self.children.get(attr,NOEDGES))
 
 
     def __repr__(self):
@@ -241,12 +465,13 @@ class GBNvertex():
         if len(self.parents)>0:
             painfo = ' | '.join(['%s(%s)'%(a.name,len(vs)) for (a,vs) in self.parents.items()]) 
                        
+        name = registry.name(self.ID)
         if self.fixed:   #['%s'%(v.ID) for v in self.parents]
-            r = '%s (Evidence,Value=%s,#Pa=[%s])'%(self.ID,self.value,painfo)
+            r = '%s (Evidence,Value=%s,#Pa=[%s])'%(name,self.value,painfo)
         elif self.event:
-            r = '%s (Event,Value=%s,#Pa:[%s])'%(self.ID,self.value,painfo)
+            r = '%s (Event,Value=%s,#Pa:[%s])'%(name,self.value,painfo)
         else:
-            r = '%s (Value=%s,#Pa=[%s])'%(self.ID,self.value,painfo)
+            r = '%s (Value=%s,#Pa=[%s])'%(name,self.value,painfo)
         return r
 
 
@@ -289,8 +514,7 @@ class ReferenceVertex(GBNvertex):
 
         
     '''
-
-    
+    __slots__ = ('dependency','relationship','refGBNvertex','k','references','existParents')
 
     def __init__(self, ID, gbnV ,dep):
                        
@@ -348,12 +572,10 @@ class ReferenceVertex(GBNvertex):
             # objects. If `nIsParent()` is `True` for involved dependency, the added reference k attribute is
             # the child and we can add the edges in the GBN accordingly
 
-            del self.refGBNvertex.children[gbnV_old.attr][gbnV_old.ID] 
-            del gbnV_old.parents[self.refGBNvertex.attr][self.refGBNvertex.ID]
+            gbnV_old.removeParent(self.refGBNvertex)
 
         else:
-            del self.refGBNvertex.parents[gbnV_old.attr][gbnV_old.ID] 
-            del gbnV_old.children[self.refGBNvertex.attr][self.refGBNvertex.ID]
+            self.refGBNvertex.removeParent(gbnV_old)
             
 
         del self.references[k_ent_ID]
@@ -380,11 +602,10 @@ class ReferenceVertex(GBNvertex):
             # the child and we can add the edges in the GBN accordingly
             
 
-            logging.info('adding %s as parent of %s'%(self.refGBNvertex.ID,gbnV_new.ID))
+            logging.info('adding %s as parent of %s'%(registry.name(self.refGBNvertex.ID),registry.name(gbnV_new.ID)))
 
 
-            self.refGBNvertex.children[gbnV_new.attr][gbnV_new.ID] = gbnV_new
-            gbnV_new.parents[self.refGBNvertex.attr][self.refGBNvertex.ID] = self.refGBNvertex
+            gbnV_new.addNewParent(self.refGBNvertex)
 
         else:
             
@@ -397,8 +618,7 @@ class ReferenceVertex(GBNvertex):
             # logging.info( 'parents of %s : %s'%(self.refGBNvertex.ID,[v.ID for pas in self.refGBNvertex.parents.values() for v in pas.values()]))
             # logging.info( 'adding %s as parent of %s'%(gbnV_new.ID,self.refGBNvertex.ID))
 
-            self.refGBNvertex.parents[gbnV_new.attr][gbnV_new.ID] = gbnV_new
-            gbnV_new.children[self.refGBNvertex.attr][self.refGBNvertex.ID] = self.refGBNvertex
+            self.refGBNvertex.addNewParent(gbnV_new)
 
 
 
@@ -458,7 +678,7 @@ class ReferenceVertex(GBNvertex):
 
     def __repr__(self):
     
-        r = '%s (Rel:%s , exist:%s)'%(self.ID, self.relationship.name,self.relationship.existAttribute.fullname)
+        r = '%s (Rel:%s , exist:%s)'%(registry.name(self.ID), self.relationship.name,self.relationship.existAttribute.fullname)
         return r
 
 
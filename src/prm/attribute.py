@@ -13,6 +13,8 @@ All attributes are instantiated by calling the :meth:`~prm.attribute.attributeFa
 
 '''
 
+import numpy as N
+
  
 def attributeFactory(name, er, type, attrDef, probabilistic=True, hidden=False ):          
     '''
@@ -106,6 +108,11 @@ class Attribute():
         """
         Boolean. If `True` then there is not a corresponding data field (latent variable)
         """
+
+        self.sortedDomain = None
+        """
+        Tuple `(sorted domain values, domain indices)` of :class:`numpy.array` instances, the lookup table of :meth:`.indexingValues`
+        """
     
     def indexingValue(self,value):
         '''
@@ -115,7 +122,28 @@ class Attribute():
         
         :arg value: Value that is in the `domain`
         '''
-        raise Exception("indexing not implemented for attribute class")  
+        raise Exception("indexing not implemented for attribute class")
+
+    def indexingValues(self,values):
+        '''
+        Vectorized version of :meth:`.indexingValue`, returns the indices of the `domain` list given an array of attribute `values`. The values are looked up in the sorted domain using `numpy.searchsorted`, values that are not integers (e.g. strings or floats) are converted to integers first, as :meth:`.indexingValue` does.
+
+        :arg values: :class:`numpy.array` of values that are in the `domain`
+        :returns: :class:`numpy.array` of indices
+        '''
+        if self.sortedDomain is None:
+            domain = N.array(self.domain)
+            order = N.argsort(domain)
+            self.sortedDomain = (domain[order],order)
+        (sortedValues,order) = self.sortedDomain
+
+        values = N.asarray(values)
+        if values.dtype.kind not in 'biu':
+            values = values.astype(int)
+        positions = N.minimum(N.searchsorted(sortedValues,values),len(sortedValues)-1)
+        if not (sortedValues[positions] == values).all():
+            raise Exception("values of %s not in the domain %s"%(self.fullname,self.domain))
+        return order[positions]  
     
     @property    
     def type(self):
@@ -12,6 +12,7 @@ import numpy as N
 from itertools import izip,count,product 
 
 from analytics.performance import time_analysis
+from network.vertices import NOEDGES
 
 
 
@@ -144,6 +145,18 @@ class CPDTabular(CPD):
         :returns: Tuple [`indexRow`,`indexColumn`]
         '''
         return [self.indexRow(currentRow[1:]),self.indexColumn(currentRow[0]) ]
+
+    def indexingCPDs(self,columns):
+        '''
+        Vectorized version of :meth:`.indexingCPD` for many full assignments. The parent and attribute values are mapped to domain indices using :meth:`.Attribute.indexingValues`, the indices are combined using `numpy.ravel_multi_index` (the row index is computed with the same multipliers as :meth:`.indexRow`).
+
+        :arg columns: List of :class:`numpy.array` instances, [`attributeValues`,`parentValues1`,`parentValues2`,....]
+        :returns: :class:`numpy.array` of indices into the flattened `cpdMatrix`, i.e. `indexRow * |V(attr)| + indexColumn`
+        '''
+        indices = [pa.indexingValues(values) for (pa,values) in izip(self.attr.parents,columns[1:])]
+        indices.append(self.attr.indexingValues(columns[0]))
+        dims = [pa.cardinality for pa in self.attr.parents] + [self.attr.cardinality]
+        return N.ravel_multi_index(indices,dims)
      
     #@time_analysis    
     def indexRow(self,parentAssignment):
@@ -179,7 +192,7 @@ class CPDTabular(CPD):
         #  a list of lists
         #  every sublist contains all gbnVs of a parent attribute.
         #  the list is in the correct order (according to gbnV.attr.parents)
-        sparse_exist =  [ [gbnPa.value for gbnPa in gbnV.parents[dep.parent].values()]  for dep in gbnV.attr.dependenciesChild ]
+        sparse_exist =  [ [gbnPa.value for gbnPa in gbnV.parents.get(dep.parent,NOEDGES).values()]  for dep in gbnV.attr.dependenciesChild ]
         
 
         spase_iter = product(*sparse_exist)
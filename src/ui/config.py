@@ -60,7 +60,15 @@ def loadDI(diSpec):
     
 	"""
 	logging.info("DataInterface Factory: create DataInterface from %s"%(diSpec.split('/')[-1]))
-	return DataInterfaceParser().parseDataInterface(diSpec)		
+	di = DataInterfaceParser().parseDataInterface(diSpec)		
+
+	# the data interface is configured for the PRM, if it has been loaded already
+	import prm.prm as PRM
+	import data.datainterface as DI
+	if PRM.dependencies is not None:
+		DI.configure(PRM)
+
+	return di
 
 def loadLearner(learnerType):
     """
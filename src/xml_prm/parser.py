@@ -81,6 +81,7 @@ crossValEl = 'Crossvalidation'
 dsEl = 'Dataset'
 dsEl_type = 'type'
 dsEl_path = 'path'
+dsEl_mode = 'mode'
 
 class PRMparser:
     """
@@ -650,8 +651,9 @@ class DataInterfaceParser:
     
     **Dataset**
         
-        * `type` : Type of database the interface is connecting to. Currently only `SQLite` is supported, :class:`SQLiteDI`.
-        * `path` : The path to the database file
+        * `type` : Type of database the interface is connecting to. Currently only `SQLite` is supported, :class:`SQLiteDI`. The type `Memory` connects to a SQLite database as well, the tables needed to unroll Ground Bayesian Networks are kept in memory (:class:`.MemoryDI`). The type `Numpy` reads a directory of memory mapped `NumPy` column files exported from a SQLite database (:class:`.NumpyDI`).
+        * `path` : The path to the database file (the dataset directory of the type `Numpy`)
+        * `mode` : Optional, comma separated list of load modes: `memory` (copy the database into memory), `mmap` (memory mapped I/O) and/or `readonly` (read-only tuning), see :attr:`data.sqliteinterface.MODES` and :attr:`data.npyinterface.MODES`
     
     '''
     def __init__(self):
@@ -670,6 +672,7 @@ class DataInterfaceParser:
         dsEl = 'Dataset'
         dsEl_type = 'type'
         dsEl_path = 'path'
+        dsEl_mode = 'mode'
         '''
         
         # the instance of the datainterface
@@ -706,7 +709,9 @@ class DataInterfaceParser:
     def dataset(self):
         path = self.attrs[dsEl_path]
         ditype = self.attrs[dsEl_type]
-        dsi = datasetinterfaceFactory(path,ditype)
+        # optional load mode, e.g. mode='memory'
+        mode = self.attrs.get(dsEl_mode)
+        dsi = datasetinterfaceFactory(path,ditype,mode)
         
         self.DSI.append(dsi)
             
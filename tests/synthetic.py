@@ -0,0 +1,158 @@
+'''
+Synthetic Student-Professor dataset used by the tests. Every student has one advisor, the fame of a professor is a parent of its funding and of the success of its students, the rating of a professor is the average success of its students (see `model/synthPRM.xml`).
+
+The datasets are generated deterministically into a temporary directory as SQLite databases (see :meth:`.createDatabase`) and exported as `Numpy` datasets, the data interface specifications are written next to them (see :meth:`.writeDI`).
+'''
+import os
+import random
+import sqlite3
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),'..'))
+
+sys.path.insert(0,os.path.join(ROOT,'src'))
+
+PRM_SPEC = os.path.join(ROOT,'tests','model','synthPRM.xml')
+'''
+The PRM specification of the synthetic dataset
+'''
+
+
+def createDatabase(path, nProfessors=12, nStudents=80, seed=1):
+    '''
+    Creates a synthetic SQLite database
+
+    :arg path: Path of the database file, an existing file is replaced
+    :arg nProfessors: Number of professors
+    :arg nStudents: Number of students
+    :arg seed: Random seed
+    '''
+    rnd = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    con = sqlite3.connect(path)
+    con.execute('CREATE TABLE Student (student_id INTEGER PRIMARY KEY, success INTEGER NOT NULL, grade INTEGER NOT NULL)')
+    con.execute('CREATE TABLE Professor (professor_id INTEGER PRIMARY KEY, fame INTEGER NOT NULL, funding INTEGER NOT NULL, rating INTEGER NOT NULL)')
+    con.execute('CREATE TABLE advisor (student_id INTEGER NOT NULL, professor_id INTEGER NOT NULL, PRIMARY KEY (student_id, professor_id))')
+
+    fame = {}
+    for p in range(1,nProfessors+1):
+        fame[p] = int(rnd.random() < 0.4)
+        funding = int(rnd.random() < (fame[p] and 0.8 or 0.3))
+        con.execute('INSERT INTO Professor VALUES (?,?,?,?)',(p,fame[p],funding,0))
+
+    successes = dict([(p,[]) for p in fame])
+    for s in range(1,nStudents+1):
+        p = rnd.randint(1,nProfessors)
+        success = int(rnd.random() < (fame[p] and 0.7 or 0.3))
+        grade = success and rnd.choice([1,2,3]) or rnd.choice([1,1,2])
+        successes[p].append(success)
+        con.execute('INSERT INTO Student VALUES (?,?,?)',(s,success,grade))
+        con.execute('INSERT INTO advisor VALUES (?,?)',(s,p))
+
+    for (p,values) in successes.items():
+        rating = values and int(round(sum(values)*1./len(values))) or 0
+        con.execute('UPDATE Professor SET rating=? WHERE professor_id=?',(rating,p))
+
+    con.commit()
+    con.close()
+
+
+def createDatasets(directory, n=1):
+    '''
+    Creates `n` synthetic databases (with different seeds) and their `Numpy` exports in `directory`
+
+    :arg directory: Existing directory
+    :arg n: Number of datasets
+    :returns: List of tuples `(sqlitePath,numpyPath)`
+    '''
+    from data.npyinterface import exportSQLite
+
+    paths = []
+    for i in range(n):
+        sqlitePath = os.path.join(directory,'synth%s.sqlite'%i)
+        numpyPath = os.path.join(directory,'synth%s'%i)
+        createDatabase(sqlitePath,seed=i+1)
+        exportSQLite(sqlitePath,numpyPath)
+        paths.append((sqlitePath,numpyPath))
+    return paths
+
+
+def writeDI(path, datasets):
+    '''
+    Writes a data interface specification
+
+    :arg path: Path of the specification file
+    :arg datasets: List of tuples `(type,path)`, e.g. `('SQLite','./synth0.sqlite')`
+    :returns: `path`
+    '''
+    lines = ['<?xml version="1.0" encoding="UTF-8" ?>',
+             '<DataInterface name="SyntheticDI">',
+             "\t<Crossvalidation folds='%s'>"%len(datasets)]
+    for (ditype,datasetPath) in datasets:
+        lines.append("\t\t<Dataset type='%s' path='%s'/>"%(ditype,datasetPath))
+    lines.extend(['\t</Crossvalidation>','</DataInterface>'])
+
+    f = open(path,'w')
+    f.write('\n'.join(lines))
+    f.close()
+    return path
+
+
+def load(diSpec, algorithm='GIBBS'):
+    '''
+    Loads the synthetic PRM and the data interface `diSpec`, learns the CPDs from all datasets and loads the inference algorithm
+
+    :arg diSpec: Path of the data interface specification
+    :arg algorithm: Inference algorithm, e.g. `GIBBS` or `MH`
+    :returns: The :class:`.CPDTabularLearner`
+    '''
+    import probrem
+    from ui import config
+
+    config.loadPRM(PRM_SPEC)
+    config.loadDI(diSpec)
+    probrem.DI.computeTrainingSets()
+    learner = config.loadLearner('CPDTabularLearner')
+    learner.learnCPDsFull(forceLearning=True)
+    config.loadInferenceAlgorithm(algorithm)
+    return learner
+
+
+def query(students, hiddenGrades=[]):
+    '''
+    Returns a query for the success of `students` given the funding and rating of all professors, the grades of all students except `hiddenGrades` and the success of the other students
+
+    :arg students: List of student IDs
+    :arg hiddenGrades: Optional list of student IDs whose grade is not observed
+    :returns: :class:`.Query` instance
+    '''
+    from inference.query import Query,createQvar
+
+    ids = [(s,) for s in students]
+    event = [createQvar(attrName='Student.success', objsConstraint='incl', objsPkValues=ids)]
+    evidence = [createQvar(attrName='Professor.funding', objsConstraint='excl', objsPkValues=[]),
+                createQvar(attrName='Student.grade', objsConstraint='excl', objsPkValues=[(s,) for s in hiddenGrades]),
+                createQvar(attrName='Professor.rating', objsConstraint='excl', objsPkValues=[]),
+                createQvar(attrName='Student.success', objsConstraint='excl', objsPkValues=ids)]
+    return Query(event,evidence)
+
+
+def snapshot(GBN):
+    '''
+    Returns a representation of the structure of a GBN that doesn't depend on the vertex instances or on the order in which they were added: for every vertex (by name) its flags, its value if it is fixed and the names of its parents and children
+
+    :arg GBN: :class:`.GBNGraph` instance
+    :returns: Dictionary `{ vertex name : (fixed,event,value,parents,children) }`
+    '''
+    from network.vertices import registry
+
+    names = lambda adjacency: sorted([registry.name(gbnV.ID) for gbnVs in adjacency.values() for gbnV in gbnVs.values()])
+    structure = {}
+    for gbnV in GBN.values():
+        value = None
+        if gbnV.fixed:
+            value = gbnV.value
+        structure[registry.name(gbnV.ID)] = (gbnV.fixed,gbnV.event,value,names(gbnV.parents),names(gbnV.children))
+    return structure
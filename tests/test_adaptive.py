@@ -0,0 +1,92 @@
+'''
+Tests of :mod:`inference.mcmc.adaptive` on the Student-Professor example (`examples/studentprof`)
+'''
+import os
+import sys
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),'..'))
+EXAMPLE = os.path.join(ROOT,'examples','studentprof')
+
+sys.path.insert(0,os.path.join(ROOT,'src'))
+
+
+class AdaptiveReferenceEventTest(unittest.TestCase):
+    '''
+    A :class:`.ReferenceVertex` event vertex sampled with the compiled Metropolis Hastings sampler and `ADAPTIVE=True`. The :class:`.CompiledGBN` stores `-1` for reference vertices, the convergence monitor has to use the current references instead.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        # the paths of the PRM and DI specifications are relative to the example folder
+        cls.cwd = os.getcwd()
+        os.chdir(EXAMPLE)
+
+        import probrem
+        from ui import config
+        from data.datainterface import datasetinterfaceFactory
+
+        config.loadPRM('./model/studentprofPRM.xml')
+        config.loadDI('./model/studentprofDI.xml')
+        # the dataset with several students and professors
+        probrem.DI.DSI = [datasetinterfaceFactory('./data/sqlite/studentprof.sqlite','SQLite')]
+        probrem.DI.computeTrainingSets()
+        probrem.DI.configure(probrem.PRM)
+        config.loadInferenceAlgorithm('MH')
+
+        cls.probrem = probrem
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def test_reference_event_values(self):
+        from inference.query import Query,createQvar
+        from inference.mcmc import adaptive
+        from network.vertices import ReferenceVertex
+
+        engine = self.probrem.engine
+        mh = engine.inferenceAlgo
+
+        settings = (mh.COMPILED,mh.ADAPTIVE,mh.BURNIN,mh.ITER,mh.CHAINS,adaptive.WINDOW)
+        mh.COMPILED = True
+        mh.ADAPTIVE = True
+        mh.BURNIN = 20
+        mh.ITER = 40
+        mh.CHAINS = 2
+        adaptive.WINDOW = 10
+
+        try:
+            event = [createQvar(attrName='Student.success', objsConstraint='excl', objsPkValues=[])]
+            evidence = [createQvar(attrName='Professor.funding', objsConstraint='excl', objsPkValues=[]),
+                        createQvar(attrName='Professor.fame', objsConstraint='excl', objsPkValues=[])]
+            engine.query = Query(event,evidence)
+            engine.reset()
+            engine.unrollGBN()
+
+            # the reference vertices are never event vertices when unrolled, one is added explicitly
+            refVs = [gbnV for gbnV in engine.GBN.samplingVertices.values() if isinstance(gbnV,ReferenceVertex)]
+            self.assertTrue(refVs)
+            refV = refVs[0]
+            refV.event = True
+            engine.GBN.eventVertices[refV.ID] = refV
+
+            engine.compileGBN()
+            mh.run()
+
+            # the monitored value of the reference vertex is the referenced professor
+            professors = set([gbnV.obj[0] for gbnV in engine.GBN.allByAttribute[refV.dependency.kAttribute]])
+            column = engine.GBN.eventVertices.keys().index(refV.ID)
+
+            values = adaptive.eventValuesFunction(mh)()
+            self.assertEqual(values[column],refV.references.values()[0].obj[0])
+            self.assertTrue(values[column] in professors)
+            for chainID in adaptive.monitor.chainIDs:
+                self.assertTrue(adaptive.monitor.mean[chainID][column] >= min(professors))
+
+        finally:
+            (mh.COMPILED,mh.ADAPTIVE,mh.BURNIN,mh.ITER,mh.CHAINS,adaptive.WINDOW) = settings
+
+
+if __name__ == '__main__':
+    unittest.main()
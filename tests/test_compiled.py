@@ -0,0 +1,146 @@
+'''
+Tests of :class:`.CompiledGBN` on the synthetic dataset (see `synthetic.py`): the compiled full conditionals, batches and CPD rows are compared to the object graph (:meth:`inference.mcmc.gibbs.fullConditional`)
+'''
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import synthetic
+
+import numpy as N
+
+
+class CompiledGBNTest(unittest.TestCase):
+    '''
+    A GBN with unobserved successes and grades of the students, the rating of the professors is the average success of their students (`AVG` aggregation)
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        [(sqlitePath,numpyPath)] = synthetic.createDatasets(cls.tmp)
+        synthetic.load(synthetic.writeDI(os.path.join(cls.tmp,'DI.xml'),[('SQLite',sqlitePath)]))
+
+        import probrem
+        from inference.mcmc import gibbs
+        cls.probrem = probrem
+        cls.gibbs = gibbs
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def query(self):
+        return synthetic.query(range(1,30),hiddenGrades=range(1,80,3))
+
+    def compile(self):
+        engine = self.probrem.engine
+        engine.query = self.query()
+        engine.reset()
+        engine.unrollGBN()
+        engine.compileGBN()
+        return engine.compiledGBN
+
+    def randomState(self, cg, seed):
+        '''
+        Assigns random values to all sampling vertices of the object graph and copies them to `cg`
+        '''
+        rnd = N.random.RandomState(seed)
+        for gbnV in self.probrem.engine.GBN.samplingVertices.values():
+            gbnV.setValue(gbnV.attr.domain[rnd.randint(gbnV.attr.cardinality)])
+        cg.readValues()
+
+    def assertFullConditionals(self, cg):
+        GBN = self.probrem.engine.GBN
+        self.assertTrue(GBN.samplingVertices)
+        for seed in range(5):
+            self.randomState(cg,seed)
+            for gbnV in GBN.samplingVertices.values():
+                expected = self.gibbs.fullConditional(gbnV)[0]
+                self.assertTrue(N.allclose(cg.fullConditional(cg.index[gbnV.ID]),expected),gbnV.ID)
+
+    def assertConditionalRows(self, cg):
+        for seed in range(3):
+            self.randomState(cg,seed)
+            for gbnV in self.probrem.engine.GBN.values():
+                if not gbnV.attr.dependenciesChild:
+                    continue
+                v = cg.index[gbnV.ID]
+                gbnV.parentAssignments()
+                row = cg.conditionalRows(N.array([v]),cg.vattr[v])[0]
+                self.assertEqual(row,gbnV.attr.CPD.indexRow(gbnV.parentAss))
+
+    def test_full_conditional(self):
+        cg = self.compile()
+        self.assertFullConditionals(cg)
+
+    def test_conditional_rows(self):
+        cg = self.compile()
+        self.assertConditionalRows(cg)
+
+    def test_batches(self):
+        cg = self.compile()
+        cg.colour()
+        self.randomState(cg,0)
+
+        batches = list(cg.chromaticSchedule)
+        for attrBatches in cg.blockSchedule.values():
+            batches.extend(attrBatches)
+        self.assertTrue(batches)
+
+        sampled = set()
+        for batch in cg.chromaticSchedule:
+            sampled.update(batch[1].tolist())
+        self.assertEqual(sampled,set(N.flatnonzero(cg.sampling).tolist()))
+
+        for batch in batches:
+            (a,vs,groups) = batch
+            values = cg.values.copy()
+            expected = N.array([cg.fullConditional(v) for v in vs])
+            fc = cg.sampleBatch(batch)
+            self.assertTrue(N.allclose(fc,expected))
+            # only the vertices of the batch are sampled
+            changed = N.flatnonzero(cg.values != values)
+            self.assertTrue(set(changed.tolist()) <= set(vs.tolist()))
+            cg.values[:] = values
+
+    def test_mode_aggregation(self):
+        from data import aggregation
+
+        dep = self.probrem.PRM.dependencies['rating_success']
+        aggregator = dep.aggregator
+        dep.aggregator = aggregation.agg_mode
+        try:
+            cg = self.compile()
+            self.assertConditionalRows(cg)
+            self.assertFullConditionals(cg)
+        finally:
+            dep.aggregator = aggregator
+
+    def test_posterior_mean(self):
+        '''
+        The compiled and the object Gibbs sampler estimate the same posterior
+        '''
+        gibbs = self.gibbs
+        from inference.mcmc import posterior
+
+        settings = (gibbs.COMPILED,gibbs.BURNIN,gibbs.ITER,gibbs.CHAINS)
+        (gibbs.BURNIN,gibbs.ITER,gibbs.CHAINS) = (50,2000,1)
+        means = []
+        try:
+            for compiled in (False,True):
+                gibbs.COMPILED = compiled
+                random.seed(1)
+                N.random.seed(1)
+                self.probrem.engine.infer(self.query())
+                means.append(posterior.mean())
+        finally:
+            (gibbs.COMPILED,gibbs.BURNIN,gibbs.ITER,gibbs.CHAINS) = settings
+
+        self.assertTrue(N.abs(N.array(means[0]) - N.array(means[1])).max() < 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+'''
+Tests of the data interfaces on the synthetic dataset (see `synthetic.py`): the same dataset read with the `SQLite`, `Memory` (:class:`.MemoryDI`) and `Numpy` (:class:`.NumpyDI`) backends gives the same CPDs and the same unrolled GBN
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import synthetic
+
+import numpy as N
+
+
+BACKENDS = ['SQLite','Memory','Numpy']
+'''
+The data interface types that are compared, the first one is the reference
+'''
+
+
+class DataInterfaceTest(unittest.TestCase):
+    '''
+    For every backend the PRM is learned from the dataset and the GBNs of several queries are unrolled, once serially without cache and once with the pipelined and cached unrolling
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        [(sqlitePath,numpyPath)] = synthetic.createDatasets(cls.tmp)
+        paths = {'SQLite':sqlitePath,'Memory':sqlitePath,'Numpy':numpyPath}
+
+        import probrem
+        engine = probrem.engine
+
+        settings = (engine.PIPELINE,engine.CACHE)
+        cls.cpds = {}
+        cls.structures = {}
+        cls.cacheHits = {}
+        try:
+            for ditype in BACKENDS:
+                synthetic.load(synthetic.writeDI(os.path.join(cls.tmp,'%sDI.xml'%ditype),[(ditype,paths[ditype])]))
+                # the query variables are bound to the attributes of the loaded PRM
+                queries = [synthetic.query(range(1,30),hiddenGrades=range(1,80,3)),
+                           synthetic.query([5,17,60]),
+                           synthetic.query(range(40,80,2),hiddenGrades=range(40,80))]
+                cls.cpds[ditype] = dict([(attr.fullname,attr.CPD.cpdMatrix.copy()) for attr in probrem.PRM.attributes.values() if attr.CPD is not None])
+
+                cls.structures[ditype] = []
+                for (pipeline,cache) in [(False,False),(True,True),(True,True)]:
+                    (engine.PIPELINE,engine.CACHE) = (pipeline,cache)
+                    for query in queries:
+                        engine.query = query
+                        engine.reset()
+                        engine.unrollGBN()
+                        cls.structures[ditype].append(synthetic.snapshot(engine.GBN))
+                cls.cacheHits[ditype] = engine.neighbourhoodCache.hits
+        finally:
+            (engine.PIPELINE,engine.CACHE) = settings
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_cpds(self):
+        reference = self.cpds[BACKENDS[0]]
+        self.assertTrue(reference)
+        for ditype in BACKENDS[1:]:
+            self.assertEqual(sorted(self.cpds[ditype].keys()),sorted(reference.keys()))
+            for (name,cpd) in reference.items():
+                self.assertTrue(N.allclose(self.cpds[ditype][name],cpd),'%s %s'%(ditype,name))
+
+    def test_unrolled_gbn(self):
+        reference = self.structures[BACKENDS[0]]
+        self.assertEqual(len([structure for structure in reference if structure]),len(reference))
+        for ditype in BACKENDS:
+            # the last round of queries is unrolled from the neighbourhood cache
+            self.assertTrue(self.cacheHits[ditype] > 0,ditype)
+            for (i,structure) in enumerate(self.structures[ditype]):
+                self.assertEqual(structure,reference[i % 3],'%s %s'%(ditype,i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+'''
+Tests of :class:`.CPDTabularLearner` on three synthetic datasets (see `synthetic.py`): the CPDs learned from the cached counts are the same as the CPDs learned by scanning the data with :meth:`.CPDTabularLearner.learnCPDsFull`
+'''
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import synthetic
+
+import numpy as N
+
+
+class CPDTabularLearnerTest(unittest.TestCase):
+    '''
+    A data interface with three `SQLite` datasets, i.e. three cross validation folds
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        datasets = synthetic.createDatasets(cls.tmp,n=3)
+        cls.sqlitePaths = [sqlitePath for (sqlitePath,numpyPath) in datasets]
+        synthetic.load(synthetic.writeDI(os.path.join(cls.tmp,'DI.xml'),[('SQLite',sqlitePath) for sqlitePath in cls.sqlitePaths]))
+
+        import probrem
+        cls.probrem = probrem
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def cpds(self):
+        return dict([(attr.fullname,attr.CPD.cpdMatrix.copy()) for attr in self.probrem.PRM.attributes.values() if attr.probabilistic])
+
+    def learnFull(self, dsis):
+        '''
+        Learns the CPDs from the datasets `dsis` with a new learner that scans the data
+
+        :returns: Dictionary `{ attribute name : cpdMatrix }`
+        '''
+        from learners.cpdlearners import CPDTabularLearner
+
+        DI = self.probrem.DI
+        allDSI = DI.DSI
+        DI.DSI = dsis
+        try:
+            CPDTabularLearner().learnCPDsFull(forceLearning=True)
+        finally:
+            DI.DSI = allDSI
+        return self.cpds()
+
+    def assertCPDs(self, cpds, expected):
+        self.assertEqual(sorted(cpds.keys()),sorted(expected.keys()))
+        for (name,cpd) in expected.items():
+            self.assertTrue(N.allclose(cpds[name],cpd),name)
+
+    def test_fold(self):
+        from learners.cpdlearners import CPDTabularLearner
+
+        DI = self.probrem.DI
+        self.assertEqual(len(DI.DSI),3)
+
+        learner = CPDTabularLearner()
+        for testSet in DI.DSI:
+            learner.learnCPDsFold(testSet)
+            cpds = self.cpds()
+            self.assertCPDs(cpds,self.learnFull(DI.trainingSets[testSet]))
+
+        # all datasets
+        learner.learnCPDsFold()
+        self.assertCPDs(self.cpds(),self.learnFull(DI.DSI))
+
+    def test_count(self):
+        from learners.cpdlearners import CPDTabularLearner
+
+        CPDTabularLearner().learnCPDsCount(forceLearning=True)
+        self.assertCPDs(self.cpds(),self.learnFull(self.probrem.DI.DSI))
+
+    def test_data_change(self):
+        '''
+        The cached counts are loaded again if another connection changes the data
+        '''
+        from learners.cpdlearners import CPDTabularLearner
+
+        DI = self.probrem.DI
+        testSet = DI.DSI[0]
+        learner = CPDTabularLearner()
+        learner.learnCPDsFold(testSet)
+        before = self.cpds()
+
+        con = sqlite3.connect(self.sqlitePaths[1])
+        (grade,) = con.execute('SELECT grade FROM Student WHERE student_id=1').fetchone()
+        con.execute('UPDATE Student SET grade=? WHERE student_id=1',(grade % 3 + 1,))
+        con.commit()
+        try:
+            learner.learnCPDsFold(testSet)
+            cpds = self.cpds()
+            self.assertFalse(N.allclose(cpds['Student.grade'],before['Student.grade']))
+            self.assertCPDs(cpds,self.learnFull(DI.trainingSets[testSet]))
+        finally:
+            con.execute('UPDATE Student SET grade=? WHERE student_id=1',(grade,))
+            con.commit()
+            con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
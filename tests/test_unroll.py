@@ -0,0 +1,114 @@
+'''
+Tests of the unrolling of the GBN (:mod:`inference.engine`) on the synthetic dataset (see `synthetic.py`): the pipelined, cached and incremental unrolling give the same GBN as a serial :meth:`.unrollGBN` from scratch
+'''
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import synthetic
+
+
+class UnrollTest(unittest.TestCase):
+    '''
+    A sequence of overlapping queries on a `SQLite` dataset
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        [(cls.sqlitePath,numpyPath)] = synthetic.createDatasets(cls.tmp)
+        synthetic.load(synthetic.writeDI(os.path.join(cls.tmp,'DI.xml'),[('SQLite',cls.sqlitePath)]))
+
+        import probrem
+        cls.engine = probrem.engine
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        engine = self.engine
+        self.settings = (engine.PIPELINE,engine.CACHE,engine.INCREMENTAL)
+        self.queries = [synthetic.query(range(1,30),hiddenGrades=range(1,80,3)),
+                        synthetic.query(range(10,40)),
+                        synthetic.query([5,17,60],hiddenGrades=[5,6,7]),
+                        synthetic.query(range(1,30),hiddenGrades=range(1,80,3)),
+                        synthetic.query(range(40,80,2),hiddenGrades=range(40,80))]
+
+    def tearDown(self):
+        engine = self.engine
+        (engine.PIPELINE,engine.CACHE,engine.INCREMENTAL) = self.settings
+        engine.reset()
+
+    def unroll(self, query, pipeline=False, cache=False):
+        '''
+        Unrolls the GBN of `query` from scratch
+
+        :returns: The :meth:`synthetic.snapshot` of the GBN
+        '''
+        engine = self.engine
+        (engine.PIPELINE,engine.CACHE) = (pipeline,cache)
+        if not cache:
+            engine.neighbourhoodCache = None
+        engine.query = query
+        engine.reset()
+        engine.unrollGBN()
+        return synthetic.snapshot(engine.GBN)
+
+    def update(self, query):
+        '''
+        Updates the GBN of the previous query for `query`
+
+        :returns: The :meth:`synthetic.snapshot` of the GBN
+        '''
+        engine = self.engine
+        engine.query = query
+        engine.updateGBN()
+        return synthetic.snapshot(engine.GBN)
+
+    def test_pipelined_and_cached(self):
+        expected = [self.unroll(query) for query in self.queries]
+        self.assertEqual(len([structure for structure in expected if structure]),len(expected))
+
+        # the second round is unrolled from the neighbourhood cache
+        for cacheRound in range(2):
+            for (query,structure) in zip(self.queries,expected):
+                self.assertEqual(self.unroll(query,pipeline=True,cache=True),structure)
+        self.assertTrue(self.engine.neighbourhoodCache.hits > 0)
+
+    def test_incremental(self):
+        expected = [self.unroll(query) for query in self.queries]
+
+        self.engine.INCREMENTAL = True
+        self.engine.reset()
+        for (query,structure) in zip(self.queries,expected):
+            self.assertEqual(self.update(query),structure)
+        # the vertices of the previous queries are reused
+        self.assertTrue(self.engine.neighbours)
+
+    def test_incremental_data_change(self):
+        '''
+        The neighbourhoods loaded by :meth:`.updateGBN` are discarded if another connection changes the data
+        '''
+        query = self.queries[0]
+        self.engine.reset()
+        before = self.update(query)
+
+        con = sqlite3.connect(self.sqlitePath)
+        (professor,) = con.execute('SELECT professor_id FROM advisor WHERE student_id=5').fetchone()
+        con.execute('UPDATE advisor SET professor_id=? WHERE student_id=5',(professor % 12 + 1,))
+        con.commit()
+        try:
+            updated = self.update(query)
+            self.assertNotEqual(updated,before)
+            self.assertEqual(updated,self.unroll(query))
+        finally:
+            con.execute('UPDATE advisor SET professor_id=? WHERE student_id=5',(professor,))
+            con.commit()
+            con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()